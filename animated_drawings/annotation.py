@@ -0,0 +1,394 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Annotation of drawn characters: detection, segmentation, and pose estimation, using the models served by torchserve.
+image_to_annotations() writes the character files used by examples/annotations_to_animation.py,
+and images_to_annotations() does so for many images, sending them to torchserve in batches.
+image_to_character() returns an in-memory character config instead, which can be rendered without touching the disk.
+"""
+
+import json
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from animated_drawings.content_store import ContentStore
+from animated_drawings.pipeline_cache import cached, get_pipeline_cache, get_stage_key
+from animated_drawings.torchserve_client import DEFAULT_TORCHSERVE_URL, DETECTOR_MODEL, POSE_ESTIMATOR_MODEL, TorchserveClient, get_client
+
+
+def image_to_annotations(img_fn: str,
+                         out_dir: str,
+                         torchserve_url: str = DEFAULT_TORCHSERVE_URL,
+                         client: Optional[TorchserveClient] = None
+                         ) -> None:
+    """
+    Given the RGB image located at img_fn, runs detection, segmentation, and pose estimation for drawn character within it.
+    Crops the image and saves texture, mask, and character config files necessary for animation. Writes to out_dir.
+
+    Params:
+        img_fn: path to RGB image
+        out_dir: directory where outputs will be saved
+        torchserve_url: base url of the torchserve inference api
+        client: client used to send requests to torchserve. Defaults to the shared client for torchserve_url
+    """
+    img = _read_image(img_fn)
+    _write_annotations(img, annotate_image(img, torchserve_url, client), out_dir)
+
+
+def images_to_annotations(img_fns: Sequence[str],
+                          out_dirs: Sequence[str],
+                          torchserve_url: str = DEFAULT_TORCHSERVE_URL,
+                          client: Optional[TorchserveClient] = None
+                          ) -> List[str]:
+    """
+    As image_to_annotations(), for each image in img_fns and corresponding directory in out_dirs.
+    Images are annotated in batches of up to client.pool_size, whose requests are sent to torchserve concurrently.
+    An image that can't be annotated, e.g. because no character was detected in it, is logged and skipped.
+    Returns the images that were skipped, in the order given.
+    """
+    if len(img_fns) != len(out_dirs):
+        msg = f'got {len(img_fns)} images but {len(out_dirs)} output directories'
+        logging.critical(msg)
+        assert False, msg
+
+    if client is None:
+        client = get_client(torchserve_url)
+
+    failed_fns: Set[str] = set()
+    for start in range(0, len(img_fns), client.pool_size):
+        batch = []
+        for img_fn, out_dir in zip(img_fns[start:start + client.pool_size], out_dirs[start:start + client.pool_size]):
+            try:
+                batch.append((img_fn, out_dir, _read_image(img_fn)))
+            except Exception as e:
+                logging.error(f'Skipping {img_fn}, which could not be annotated: {e}')
+                failed_fns.add(img_fn)
+
+        results = _annotate_images([img for _, _, img in batch], torchserve_url, client)
+        for (img_fn, out_dir, img), result in zip(batch, results):
+            try:
+                if isinstance(result, Exception):
+                    raise result
+                _write_annotations(img, result, out_dir)
+            except Exception as e:
+                logging.error(f'Skipping {img_fn}, which could not be annotated: {e}')
+                failed_fns.add(img_fn)
+    return [img_fn for img_fn in img_fns if img_fn in failed_fns]
+
+
+def _read_image(img_fn: str) -> npt.NDArray[np.uint8]:
+    import cv2
+
+    img = cv2.imread(img_fn)
+    if img is None:
+        msg = f'could not read image: {img_fn}'
+        logging.critical(msg)
+        assert False, msg
+    return img
+
+
+def _write_annotations(img: npt.NDArray[np.uint8], annotations: Dict[str, Any], out_dir: str) -> None:
+    """ Writes the image, and the annotations returned by annotate_image() for it, to out_dir. """
+    import cv2
+    import yaml
+
+    # create output directory
+    outdir = Path(out_dir)
+    outdir.mkdir(exist_ok=True)
+
+    # copy the original image into the output_dir
+    cv2.imwrite(str(outdir/'image.png'), img)
+
+    # dump the bounding box results to file
+    with open(str(outdir/'bounding_box.yaml'), 'w') as f:
+        yaml.dump(annotations['bounding_box'], f)
+
+    # save texture and mask
+    cv2.imwrite(str(outdir/'texture.png'), annotations['texture'])
+    cv2.imwrite(str(outdir/'mask.png'), annotations['mask'])
+
+    # dump character config to yaml
+    with open(str(outdir/'char_cfg.yaml'), 'w') as f:
+        yaml.dump(annotations['char_cfg'], f)
+
+    # create joint viz overlay for inspection purposes
+    joint_overlay = annotations['texture'].copy()
+    for joint in annotations['char_cfg']['skeleton']:
+        x, y = joint['loc']
+        name = joint['name']
+        cv2.circle(joint_overlay, (int(x), int(y)), 5, (0, 0, 0), 5)
+        cv2.putText(joint_overlay, name, (int(x), int(y+15)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, 2)
+    cv2.imwrite(str(outdir/'joint_overlay.png'), joint_overlay)
+
+
+def image_to_character(img: npt.NDArray[np.uint8],
+                       torchserve_url: str = DEFAULT_TORCHSERVE_URL,
+                       client: Optional[TorchserveClient] = None
+                       ) -> Dict[str, Any]:
+    """
+    Given a BGR image, as read by cv2, annotates the drawn character within it.
+    Returns a character config dict, including the texture and mask images, as accepted by CharacterConfig.
+    """
+    import cv2
+
+    annotations = annotate_image(img, torchserve_url, client)
+    return {
+        **annotations['char_cfg'],
+        'texture': cv2.cvtColor(annotations['texture'], cv2.COLOR_BGRA2RGBA),
+        'mask': annotations['mask'],
+    }
+
+
+def annotate_image(img: npt.NDArray[np.uint8],
+                   torchserve_url: str = DEFAULT_TORCHSERVE_URL,
+                   client: Optional[TorchserveClient] = None
+                   ) -> Dict[str, Any]:
+    """
+    Given a BGR image, as read by cv2, runs detection, segmentation, and pose estimation for the drawn character within it.
+    Returns a dict with:
+        'bounding_box': the character's bounding box within the (resized) image
+        'char_cfg': the character config, without texture and mask
+        'texture': the cropped character, BGRA
+        'mask': the character's segmentation mask
+    """
+    return annotate_images([img], torchserve_url, client)[0]
+
+
+def annotate_images(imgs: Sequence[npt.NDArray[np.uint8]],
+                    torchserve_url: str = DEFAULT_TORCHSERVE_URL,
+                    client: Optional[TorchserveClient] = None
+                    ) -> List[Dict[str, Any]]:
+    """
+    As annotate_image(), for each of imgs. All images are sent to the detector at once, so torchserve can batch them.
+    Each character is sent to the pose estimator as soon as it's detected, and segmented while waiting for the result.
+    If any image can't be annotated, raises the Exception raised for it. images_to_annotations() skips such images instead.
+    """
+    annotations: List[Dict[str, Any]] = []
+    for result in _annotate_images(imgs, torchserve_url, client):
+        if isinstance(result, Exception):
+            raise result
+        annotations.append(result)
+    return annotations
+
+
+def _annotate_images(imgs: Sequence[npt.NDArray[np.uint8]],
+                     torchserve_url: str = DEFAULT_TORCHSERVE_URL,
+                     client: Optional[TorchserveClient] = None
+                     ) -> List[Union[Dict[str, Any], Exception]]:
+    """ As annotate_images(), but the result of an image that can't be annotated is the Exception raised for it, and other images are unaffected. """
+    import cv2
+
+    if client is None:
+        client = get_client(torchserve_url)
+    cache = get_pipeline_cache()
+
+    def detect_and_estimate_pose(img: npt.NDArray[np.uint8]) -> Tuple[npt.NDArray[np.uint8], List[int], 'Future[Any]']:
+        img = _prepare_image(img)
+        detection_results = _predict(client, cache, DETECTOR_MODEL, img, "Failed to get bounding box, please check if the 'docker_torchserve' is running and healthy")
+        l, t, r, b = _select_detection(detection_results)
+
+        # crop the image
+        cropped = img[t:b, l:r]
+
+        # send cropped image to pose estimator as soon as it's detected, however far the main thread is with segmentation
+        pose_future = executor.submit(_predict, client, cache, POSE_ESTIMATOR_MODEL, cropped,
+                                      "Failed to get skeletons, please check if the 'docker_torchserve' is running and healthy")
+        return cropped, [l, t, r, b], pose_future
+
+    results: List[Union[Dict[str, Any], Exception]] = []
+    with ThreadPoolExecutor(max_workers=client.pool_size) as executor:
+        # send to torchserve, unless these images were already processed
+        detection_futures = [executor.submit(detect_and_estimate_pose, img) for img in imgs]
+
+        pose_futures: List[Optional['Future[Any]']] = []
+        for detection_future in detection_futures:
+            try:
+                cropped, (l, t, r, b), pose_future = detection_future.result()
+
+                # get segmentation mask, while the pose estimator runs. segment() spends most of its time in OpenCV, which releases the GIL
+                mask_b = cached(cache, get_stage_key('segment', cropped), lambda: cv2.imencode('.png', segment(cropped))[1].tobytes())
+                mask = cv2.imdecode(np.frombuffer(mask_b, np.uint8), cv2.IMREAD_GRAYSCALE)
+            except Exception as e:
+                results.append(e)
+                pose_futures.append(None)
+                continue
+
+            results.append({
+                'bounding_box': {'left': l, 'top': t, 'right': r, 'bottom': b},
+                'texture': cv2.cvtColor(cropped, cv2.COLOR_BGR2BGRA),
+                'mask': mask,
+            })
+            pose_futures.append(pose_future)
+
+        for idx, (annotation, pose_future) in enumerate(zip(results, pose_futures)):
+            if isinstance(annotation, Exception) or pose_future is None:
+                continue
+            try:
+                # create the character config dictionary
+                height, width = annotation['texture'].shape[:2]
+                annotation['char_cfg'] = {'skeleton': keypoints_to_skeleton(_select_keypoints(pose_future.result())), 'height': height, 'width': width}
+            except Exception as e:
+                results[idx] = e
+
+    return results
+
+
+def _prepare_image(img: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+    """ Checks the image is BGR and resizes it, if needed, to the size the models expect. """
+    import cv2
+
+    # ensure it's rgb
+    if len(img.shape) != 3:
+        msg = f'image must have 3 channels (rgb). Found {len(img.shape)}'
+        logging.critical(msg)
+        assert False, msg
+
+    # resize if needed
+    if np.max(img.shape) > 1000:
+        scale = 1000 / np.max(img.shape)
+        img = cv2.resize(img, (round(scale * img.shape[1]), round(scale * img.shape[0])))
+    return img
+
+
+def _predict(client: TorchserveClient, cache: Optional[ContentStore], model_name: str, img: npt.NDArray[np.uint8], error_msg: str) -> Any:
+    """
+    Returns the decoded response of model_name to img, from the pipeline cache if it's there, otherwise from torchserve.
+    Only successful responses are cached. If the request fails, raises an Exception starting with error_msg.
+    """
+    def predict() -> bytes:
+        try:
+            return client.predict(model_name, img)
+        except Exception as e:
+            raise Exception(f'{error_msg}, {e}') from e
+
+    return json.loads(cached(cache, get_stage_key(model_name, client.encoding, img), predict))
+
+
+def _select_detection(detection_results: Any) -> List[int]:
+    """ Returns the left, top, right, and bottom of the highest scoring detection's bounding box. """
+    # error check detection_results
+    if isinstance(detection_results, dict) and 'code' in detection_results.keys() and detection_results['code'] == 404:
+        assert False, f'Error performing detection. Check that drawn_humanoid_detector.mar was properly downloaded. Response: {detection_results}'
+
+    # order results by score, descending
+    detection_results.sort(key=lambda x: x['score'], reverse=True)
+
+    # if no drawn humanoids detected, abort
+    if len(detection_results) == 0:
+        msg = 'Could not detect any drawn humanoids in the image. Aborting'
+        logging.critical(msg)
+        assert False, msg
+
+    # otherwise, report # detected and score of highest.
+    msg = f'Detected {len(detection_results)} humanoids in image. Using detection with highest score {detection_results[0]["score"]}.'
+    logging.info(msg)
+
+    # calculate the coordinates of the character bounding box
+    bbox = np.array(detection_results[0]['bbox'])
+    return [round(x) for x in bbox]
+
+
+def _select_keypoints(pose_results: Any) -> npt.NDArray[np.float64]:
+    """ Returns the x y coordinates of the joint keypoints of the single skeleton detected. """
+    # error check pose_results
+    if isinstance(pose_results, dict) and 'code' in pose_results.keys() and pose_results['code'] == 404:
+        assert False, f'Error performing pose estimation. Check that drawn_humanoid_pose_estimator.mar was properly downloaded. Response: {pose_results}'
+
+    # if no skeleton detected, abort
+    if len(pose_results) == 0:
+        msg = 'Could not detect any skeletons within the character bounding box. Expected exactly 1. Aborting.'
+        logging.critical(msg)
+        assert False, msg
+
+    # if more than one skeleton detected,
+    if 1 < len(pose_results):
+        msg = f'Detected {len(pose_results)} skeletons with the character bounding box. Expected exactly 1. Aborting.'
+        logging.critical(msg)
+        assert False, msg
+
+    # get x y coordinates of detection joint keypoints
+    return np.array(pose_results[0]['keypoints'])[:, :2]
+
+
+def keypoints_to_skeleton(kpts: npt.NDArray[np.float64]) -> list:
+    """ Given the [17, 2] array of COCO keypoint locations output by the pose estimator, returns the character's skeleton rig. """
+    skeleton = []
+    skeleton.append({'loc' : [round(x) for x in (kpts[11]+kpts[12])/2], 'name': 'root'          , 'parent': None})
+    skeleton.append({'loc' : [round(x) for x in (kpts[11]+kpts[12])/2], 'name': 'hip'           , 'parent': 'root'})
+    skeleton.append({'loc' : [round(x) for x in (kpts[5]+kpts[6])/2  ], 'name': 'torso'         , 'parent': 'hip'})
+    skeleton.append({'loc' : [round(x) for x in  kpts[0]             ], 'name': 'neck'          , 'parent': 'torso'})
+    skeleton.append({'loc' : [round(x) for x in  kpts[6]             ], 'name': 'right_shoulder', 'parent': 'torso'})
+    skeleton.append({'loc' : [round(x) for x in  kpts[8]             ], 'name': 'right_elbow'   , 'parent': 'right_shoulder'})
+    skeleton.append({'loc' : [round(x) for x in  kpts[10]            ], 'name': 'right_hand'    , 'parent': 'right_elbow'})
+    skeleton.append({'loc' : [round(x) for x in  kpts[5]             ], 'name': 'left_shoulder' , 'parent': 'torso'})
+    skeleton.append({'loc' : [round(x) for x in  kpts[7]             ], 'name': 'left_elbow'    , 'parent': 'left_shoulder'})
+    skeleton.append({'loc' : [round(x) for x in  kpts[9]             ], 'name': 'left_hand'     , 'parent': 'left_elbow'})
+    skeleton.append({'loc' : [round(x) for x in  kpts[12]            ], 'name': 'right_hip'     , 'parent': 'root'})
+    skeleton.append({'loc' : [round(x) for x in  kpts[14]            ], 'name': 'right_knee'    , 'parent': 'right_hip'})
+    skeleton.append({'loc' : [round(x) for x in  kpts[16]            ], 'name': 'right_foot'    , 'parent': 'right_knee'})
+    skeleton.append({'loc' : [round(x) for x in  kpts[11]            ], 'name': 'left_hip'      , 'parent': 'root'})
+    skeleton.append({'loc' : [round(x) for x in  kpts[13]            ], 'name': 'left_knee'     , 'parent': 'left_hip'})
+    skeleton.append({'loc' : [round(x) for x in  kpts[15]            ], 'name': 'left_foot'     , 'parent': 'left_knee'})
+    return skeleton
+
+
+def segment(img: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+    """ Given a BGR image of a drawn character, returns its segmentation mask. """
+    import cv2
+    from scipy import ndimage
+
+    """ threshold """
+    img = np.min(img, axis=2)
+    img = cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 115, 8)
+    img = cv2.bitwise_not(img)
+
+    """ morphops """
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    img = cv2.morphologyEx(img, cv2.MORPH_CLOSE, kernel, iterations=2)
+    img = cv2.morphologyEx(img, cv2.MORPH_DILATE, kernel, iterations=2)
+
+    """ floodfill """
+    mask = np.zeros([img.shape[0]+2, img.shape[1]+2], np.uint8)
+    mask[1:-1, 1:-1] = img.copy()
+
+    # im_floodfill is results of floodfill. Starts off all white
+    im_floodfill = np.full(img.shape, 255, np.uint8)
+
+    # choose 10 points along each image side. use as seed for floodfill.
+    h, w = img.shape[:2]
+    for x in range(0, w-1, 10):
+        cv2.floodFill(im_floodfill, mask, (x, 0), 0)
+        cv2.floodFill(im_floodfill, mask, (x, h-1), 0)
+    for y in range(0, h-1, 10):
+        cv2.floodFill(im_floodfill, mask, (0, y), 0)
+        cv2.floodFill(im_floodfill, mask, (w-1, y), 0)
+
+    # make sure edges aren't character. necessary for contour finding
+    im_floodfill[0, :] = 0
+    im_floodfill[-1, :] = 0
+    im_floodfill[:, 0] = 0
+    im_floodfill[:, -1] = 0
+
+    """ retain largest component """
+    # the character and its holes are the pixels the floodfill didn't reach. Label them once, rather than filling each contour in turn.
+    # 8-connectivity matches the contours of the background's complement, which were previously traced to find the components
+    label_count, labels, stats, _ = cv2.connectedComponentsWithStats((im_floodfill != 0).astype(np.uint8), connectivity=8)
+
+    if label_count < 2:
+        msg = 'Found no contours within image'
+        logging.critical(msg)
+        assert False, msg
+
+    # label 0 is the background
+    biggest = 1 + np.argmax(stats[1:, cv2.CC_STAT_AREA])
+    mask = ndimage.binary_fill_holes(labels == biggest)
+    mask = 255 * mask.astype(np.uint8)
+
+    return mask
@@ -3,27 +3,128 @@
 # LICENSE file in the root directory of this source tree.
 
 from __future__ import annotations
+import copy
 import logging
 from collections import defaultdict
+from dataclasses import FrozenInstanceError
+from functools import lru_cache
 from pathlib import Path
-from typing import Union, List, Tuple, Dict, TypedDict, Optional
+from typing import Any, NoReturn, Type, TypeVar, Union, List, Tuple, Dict, TypedDict, Optional
 import yaml
-from pkg_resources import resource_filename
-from animated_drawings.utils import resolve_ad_filepath
+import numpy as np
+import numpy.typing as npt
+from animated_drawings.utils import resolve_ad_filepath, resolve_package_path
+
+
+def _load_yaml(cfg_p: Path) -> Dict[str, Any]:
+    with open(str(cfg_p), 'r') as f:
+        return yaml.load(f, Loader=yaml.FullLoader) or {}  # pyright: ignore[reportUnknownMemberType]
+
+
+@lru_cache(maxsize=None)
+def _load_base_mvc_cfg() -> Dict[str, Any]:
+    """ The base mvc config never changes, so it is only parsed once per process. Callers must not modify the returned dict. """
+    return _load_yaml(resolve_package_path("mvc_base_cfg.yaml"))
+
+
+class FrozenDict(dict):
+    """ A dict that cannot be modified. Unlike types.MappingProxyType, it can be pickled, so configs holding it can be sent to worker processes. """
+
+    def _immutable(self, *args: Any, **kwargs: Any) -> NoReturn:
+        raise TypeError('FrozenDict cannot be modified')
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _immutable  # type: ignore
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def _frozen_copy(value: Any) -> Any:
+    """ Returns an immutable copy of value, with lists converted to tuples and dicts to FrozenDicts. """
+    if isinstance(value, dict):
+        return FrozenDict({key: _frozen_copy(val) for key, val in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_frozen_copy(val) for val in value)
+    if isinstance(value, np.ndarray):
+        value = value.view()
+        value.flags.writeable = False
+    return value
+
+
+_FrozenConfigT = TypeVar('_FrozenConfigT', bound='_FrozenConfig')
+
+# number of parsed config files kept. Long-lived processes, like the render service's workers, see many config files
+MAX_PARSED_CFGS = 256
+
+
+@lru_cache(maxsize=MAX_PARSED_CFGS)
+def _parse_cfg_file(cls: type, cfg_p: Path, mtime: int) -> _FrozenConfig:
+    """ Parses the config file at cfg_p. mtime, its modification time, is only used to key the cache, so modified files are parsed again. """
+    return cls(str(cfg_p))
+
+
+class _FrozenConfig():
+    """
+    Base of the character, motion, and retarget configs, which cannot be modified once constructed.
+    So one config can safely be shared between characters, renders, and threads, and parsed config files can be cached.
+    To change values, use replace(), which returns a modified copy.
+    """
+
+    _frozen: bool = False
+
+    def _freeze(self) -> None:
+        """ Called at the end of __init__() to make the config immutable. """
+        for name, value in vars(self).items():
+            object.__setattr__(self, name, _frozen_copy(value))
+        object.__setattr__(self, '_frozen', True)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if self._frozen:
+            raise FrozenInstanceError(f'cannot assign to field {name!r} of {type(self).__name__}')
+        super().__setattr__(name, value)
+
+    def __delattr__(self, name: str) -> None:
+        if self._frozen:
+            raise FrozenInstanceError(f'cannot delete field {name!r} of {type(self).__name__}')
+        super().__delattr__(name)
+
+    def replace(self: _FrozenConfigT, **changes: Any) -> _FrozenConfigT:
+        """ Returns a copy of this config with the given fields replaced, like dataclasses.replace(). """
+        cfg = copy.copy(self)
+        for name, value in changes.items():
+            if name not in vars(self):
+                msg = f'{type(self).__name__} has no field {name}'
+                logging.critical(msg)
+                assert False, msg
+            object.__setattr__(cfg, name, _frozen_copy(value))
+        return cfg
+
+    @classmethod
+    def from_file(cls: Type[_FrozenConfigT], cfg_fn: str) -> _FrozenConfigT:
+        """ Returns the config parsed from cfg_fn. Recently used files are only parsed once per process, unless they are modified. """
+        cfg_p: Path = resolve_ad_filepath(cfg_fn, f'{cls.__name__} file').resolve()
+        cfg = _parse_cfg_file(cls, cfg_p, cfg_p.stat().st_mtime_ns)
+        assert isinstance(cfg, cls)  # for static analysis
+        return cfg
 
 
 class Config():
 
-    def __init__(self, user_mvc_cfg_fn: str) -> None:
+    def __init__(self, user_mvc_cfg: Union[str, Dict[str, Any]]) -> None:
+        """
+        user_mvc_cfg is either the filepath of an mvc config file or a dict with the same contents, e.g. {'scene': {...}, 'controller': {...}}.
+        Options not specified are taken from mvc_base_cfg.yaml.
+        """
         # get the base mvc config
-        with open(resource_filename(__name__, "mvc_base_cfg.yaml"), 'r') as f:
-            base_cfg = defaultdict(dict, yaml.load(f, Loader=yaml.FullLoader) or {})  # pyright: ignore[reportUnknownMemberType])
+        base_cfg = defaultdict(dict, copy.deepcopy(_load_base_mvc_cfg()))
 
         # search for the user-specified mvc config
-        user_mvc_cfg_p: Path = resolve_ad_filepath(user_mvc_cfg_fn, 'user mvc config')
-        logging.info(f'Using user-specified mvc config file located at {user_mvc_cfg_p.resolve()}')
-        with open(str(user_mvc_cfg_p), 'r') as f:
-            user_cfg = defaultdict(dict, yaml.load(f, Loader=yaml.FullLoader) or {})  # pyright: ignore[reportUnknownMemberType]
+        if isinstance(user_mvc_cfg, dict):
+            user_cfg = defaultdict(dict, user_mvc_cfg)
+        else:
+            user_mvc_cfg_p: Path = resolve_ad_filepath(user_mvc_cfg, 'user mvc config')
+            logging.info(f'Using user-specified mvc config file located at {user_mvc_cfg_p.resolve()}')
+            user_cfg = defaultdict(dict, _load_yaml(user_mvc_cfg_p))
 
         # overlay user specified mvc options onto base mvc, use to generate subconfig classes
         self.view: ViewConfig = ViewConfig({**base_cfg['view'], **user_cfg['view']})
@@ -48,6 +149,15 @@ class Config():
                 logging.critical(msg)
                 assert False, msg
 
+        # mesh export path must be set for mesh export controller
+        if self.controller.mode == 'mesh_export':
+            try:
+                assert self.controller.mesh_export_path is not None, 'mesh_export_path must be set when using mesh_export controller'
+            except AssertionError as e:
+                msg = f'Config error: {e}'
+                logging.critical(msg)
+                assert False, msg
+
         # output video codec must be set for render controller with .mp4 output filetype
         if self.controller.mode == 'video_render' and self.controller.output_video_path is not None and self.controller.output_video_path.endswith('.mp4'):
             try:
@@ -80,21 +190,40 @@ class SceneConfig():
             logging.critical(msg)
             assert False, msg
 
-        # config files for characters, driving motions, and retargeting
+        # store the scene's transforms in flattened arrays and update them in batches
+        try:
+            self.use_transform_store: bool = scene_cfg['USE_TRANSFORM_STORE']
+            assert isinstance(self.use_transform_store, bool), 'is not bool'
+        except (AssertionError, ValueError) as e:
+            msg = f'Error in USE_TRANSFORM_STORE config parameter: {e}'
+            logging.critical(msg)
+            assert False, msg
+
+        # config files for characters, driving motions, and retargeting. Each may also be given as a dict or an already constructed config
         self.animated_characters: List[Tuple[CharacterConfig, RetargetConfig, MotionConfig]] = []
 
-        each: Dict[str, str]
+        each: Dict[str, Any]
         for each in scene_cfg['ANIMATED_CHARACTERS']:
-            char_cfg_fn: str = each['character_cfg']
-            motion_cfg_fn: str = each['motion_cfg']
-            retarget_cfg_fn: str = each['retarget_cfg']
+            char_cfg = each['character_cfg']
+            motion_cfg = each['motion_cfg']
+            retarget_cfg = each['retarget_cfg']
             self.animated_characters.append((
-                CharacterConfig(char_cfg_fn),
-                RetargetConfig(retarget_cfg_fn),
-                MotionConfig(motion_cfg_fn)
+                _get_config(CharacterConfig, char_cfg),
+                _get_config(RetargetConfig, retarget_cfg),
+                _get_config(MotionConfig, motion_cfg),
             ))
 
 
+def _get_config(cfg_cls: Type[_FrozenConfigT], cfg: Union[str, Dict[str, Any], _FrozenConfigT]) -> _FrozenConfigT:
+    """ Returns a config given as a filepath, parsing it only if not cached, a dict, or an already constructed config. """
+    if isinstance(cfg, cfg_cls):
+        return cfg
+    if isinstance(cfg, dict):
+        return cfg_cls(cfg)  # type: ignore
+    assert isinstance(cfg, str)  # for static analysis
+    return cfg_cls.from_file(cfg)
+
+
 class ViewConfig():
 
     def __init__(self, view_cfg: dict) -> None:  # noqa: C901
@@ -209,7 +338,7 @@ class ControllerConfig():
         try:
             self.mode: str = controller_cfg["MODE"]
             assert isinstance(self.mode, str), 'is not str'
-            assert self.mode in ('interactive', 'video_render'), 'mode not interactive or video_render'
+            assert self.mode in ('interactive', 'video_render', 'benchmark', 'mesh_export'), 'mode not interactive, video_render, benchmark, or mesh_export'
         except (AssertionError, ValueError) as e:
             msg = f'Error in MODE config parameter: {e}'
             logging.critical(msg)
@@ -245,18 +374,115 @@ class ControllerConfig():
             logging.critical(msg)
             assert False, msg
 
+        # set number of processes used to render video (only used in video_render mode with a mesa view)
+        try:
+            self.render_workers: Union[None, int] = controller_cfg['RENDER_WORKERS']
+            assert isinstance(self.render_workers, (NoneType, int)), 'type is not None or int'
+            if isinstance(self.render_workers, int):
+                assert self.render_workers > 0, 'must be > 0'
+        except (AssertionError, ValueError) as e:
+            msg = f'Error in RENDER_WORKERS config parameter: {e}'
+            logging.critical(msg)
+            assert False, msg
+
+        # set whether to compute character deformations for all frames before rendering (only used in video_render mode)
+        try:
+            self.precompute_deformation: bool = controller_cfg['PRECOMPUTE_DEFORMATION']
+            assert isinstance(self.precompute_deformation, bool), 'type is not bool'
+        except (AssertionError, ValueError) as e:
+            msg = f'Error in PRECOMPUTE_DEFORMATION config parameter: {e}'
+            logging.critical(msg)
+            assert False, msg
+
+        # set number of frames to render per benchmark iteration (only used in benchmark mode)
+        try:
+            self.benchmark_frames: Union[None, int] = controller_cfg['BENCHMARK_FRAMES']
+            assert isinstance(self.benchmark_frames, (NoneType, int)), 'type is not None or int'
+            if isinstance(self.benchmark_frames, int):
+                assert self.benchmark_frames > 0, 'must be > 0'
+        except (AssertionError, ValueError) as e:
+            msg = f'Error in BENCHMARK_FRAMES config parameter: {e}'
+            logging.critical(msg)
+            assert False, msg
+
+        # set number of benchmark iterations (only used in benchmark mode)
+        try:
+            self.benchmark_iterations: int = controller_cfg['BENCHMARK_ITERATIONS']
+            assert isinstance(self.benchmark_iterations, int), 'type is not int'
+            assert self.benchmark_iterations > 0, 'must be > 0'
+        except (AssertionError, ValueError) as e:
+            msg = f'Error in BENCHMARK_ITERATIONS config parameter: {e}'
+            logging.critical(msg)
+            assert False, msg
+
+        # set path of benchmark results file (only used in benchmark mode)
+        try:
+            self.benchmark_output_path: Union[None, str] = controller_cfg['BENCHMARK_OUTPUT_PATH']
+            assert isinstance(self.benchmark_output_path, (NoneType, str)), 'type is not None or str'
+        except (AssertionError, ValueError) as e:
+            msg = f'Error in BENCHMARK_OUTPUT_PATH config parameter: {e}'
+            logging.critical(msg)
+            assert False, msg
+
+        # set path of the chrome trace event file recording where time was spent
+        try:
+            self.trace_output_path: Union[None, str] = controller_cfg['TRACE_OUTPUT_PATH']
+            assert isinstance(self.trace_output_path, (NoneType, str)), 'type is not None or str'
+        except (AssertionError, ValueError) as e:
+            msg = f'Error in TRACE_OUTPUT_PATH config parameter: {e}'
+            logging.critical(msg)
+            assert False, msg
+
+        # set path of the mesh archive (only used in mesh_export mode)
+        try:
+            self.mesh_export_path: Union[None, str] = controller_cfg['MESH_EXPORT_PATH']
+            assert isinstance(self.mesh_export_path, (NoneType, str)), 'type is not None or str'
+            if isinstance(self.mesh_export_path, str):
+                assert Path(self.mesh_export_path).suffix == '.npz', 'mesh export extension not .npz'
+        except (AssertionError, ValueError) as e:
+            msg = f'Error in MESH_EXPORT_PATH config parameter: {e}'
+            logging.critical(msg)
+            assert False, msg
+
+        # set precision of the exported vertex positions (only used in mesh_export mode)
+        try:
+            self.mesh_export_dtype: str = controller_cfg['MESH_EXPORT_DTYPE']
+            assert self.mesh_export_dtype in ('float32', 'float16'), 'must be float32 or float16'
+        except (AssertionError, ValueError) as e:
+            msg = f'Error in MESH_EXPORT_DTYPE config parameter: {e}'
+            logging.critical(msg)
+            assert False, msg
+
+        # set how exported vertex positions are stored (only used in mesh_export mode)
+        try:
+            self.mesh_export_format: str = controller_cfg['MESH_EXPORT_FORMAT']
+            assert self.mesh_export_format in ('raw', 'quantized'), 'must be raw or quantized'
+        except (AssertionError, ValueError) as e:
+            msg = f'Error in MESH_EXPORT_FORMAT config parameter: {e}'
+            logging.critical(msg)
+            assert False, msg
 
-class CharacterConfig():
+
+class CharacterConfig(_FrozenConfig):
 
     class JointDict(TypedDict):
         loc: List[float]
         name: str
         parent: Union[None, str]
 
-    def __init__(self, char_cfg_fn: str) -> None:  # noqa: C901
-        character_cfg_p = resolve_ad_filepath(char_cfg_fn, 'character cfg')
-        with open(str(character_cfg_p), 'r') as f:
-            char_cfg = yaml.load(f, Loader=yaml.FullLoader)
+    def __init__(self, char_cfg_src: Union[str, Dict[str, Any]]) -> None:  # noqa: C901
+        """
+        char_cfg_src is either the filepath of a character config file or a dict with the same contents.
+        A config file's texture.png and mask.png are loaded from its directory.
+        A dict must also contain the images themselves, as 'texture' (an RGBA uint8 array) and 'mask' (a single-channel uint8 array),
+        so characters can be created without any files on disk.
+        """
+        character_cfg_p: Optional[Path] = None
+        if isinstance(char_cfg_src, dict):
+            char_cfg = char_cfg_src
+        else:
+            character_cfg_p = resolve_ad_filepath(char_cfg_src, 'character cfg')
+            char_cfg = _load_yaml(character_cfg_p)
 
         # validate image height
         try:
@@ -322,24 +548,38 @@ class CharacterConfig():
             logging.critical(msg)
             assert False, msg
 
-        # validate mask and texture files
+        # validate mask and texture, either in-memory images or files next to the config file
+        self.mask: Optional[npt.NDArray[np.uint8]] = None
+        self.txtr: Optional[npt.NDArray[np.uint8]] = None
+        self.mask_p: Optional[Path] = None
+        self.txtr_p: Optional[Path] = None
         try:
-            self.mask_p: Path = character_cfg_p.parent / 'mask.png'
-            self.txtr_p: Path = character_cfg_p.parent / 'texture.png'
-            assert self.mask_p.exists(), f'cannot find character mask: {self.mask_p}'
-            assert self.txtr_p.exists(), f'cannot find character texture: {self.txtr_p}'
+            if character_cfg_p is None:
+                self.mask = char_cfg.get('mask')
+                self.txtr = char_cfg.get('texture')
+                assert self.mask is not None and self.mask.ndim == 2, 'mask must be a single-channel image'
+                assert self.txtr is not None and self.txtr.ndim == 3 and self.txtr.shape[2] == 4, 'texture must be an RGBA image'
+            else:
+                self.mask_p = character_cfg_p.parent / 'mask.png'
+                self.txtr_p = character_cfg_p.parent / 'texture.png'
+                assert self.mask_p.exists(), f'cannot find character mask: {self.mask_p}'
+                assert self.txtr_p.exists(), f'cannot find character texture: {self.txtr_p}'
         except AssertionError as e:
             msg = f'Error validating character files: {e}'
             logging.critical(msg)
             assert False, msg
 
+        self._freeze()
+
 
-class MotionConfig():
+class MotionConfig(_FrozenConfig):
 
-    def __init__(self, motion_cfg_fn: str) -> None:  # noqa: C901
-        motion_cfg_p = resolve_ad_filepath(motion_cfg_fn, 'motion cfg')
-        with open(str(motion_cfg_p), 'r') as f:
-            motion_cfg = yaml.load(f, Loader=yaml.FullLoader)
+    def __init__(self, motion_cfg_src: Union[str, Dict[str, Any]]) -> None:  # noqa: C901
+        """ motion_cfg_src is either the filepath of a motion config file or a dict with the same contents. """
+        if isinstance(motion_cfg_src, dict):
+            motion_cfg = motion_cfg_src
+        else:
+            motion_cfg = _load_yaml(resolve_ad_filepath(motion_cfg_src, 'motion cfg'))
 
         # validate start_frame_idx
         try:
@@ -418,6 +658,8 @@ class MotionConfig():
             logging.critical(msg)
             assert False, msg
 
+        self._freeze()
+
     def validate_bvh(self, bvh_joint_names: List[str]) -> None:
         """ Performs all the validation steps that depend upon knowing the BVH joint names. This should be called once the BVH had been loaded."""
         try:
@@ -430,7 +672,7 @@ class MotionConfig():
             assert False, msg
 
 
-class RetargetConfig():
+class RetargetConfig(_FrozenConfig):
 
     class BvhProjectionBodypartGroup(TypedDict):
         bvh_joint_names: List[str]
@@ -446,10 +688,12 @@ class RetargetConfig():
         bvh_joints: List[List[str]]
         char_joints: List[List[str]]
 
-    def __init__(self, retarget_cfg_fn: str) -> None:  # noqa: C901
-        retarget_cfg_p = resolve_ad_filepath(retarget_cfg_fn, 'retarget cfg')
-        with open(str(retarget_cfg_p), 'r') as f:
-            retarget_cfg = yaml.load(f, Loader=yaml.FullLoader)
+    def __init__(self, retarget_cfg_src: Union[str, Dict[str, Any]]) -> None:  # noqa: C901
+        """ retarget_cfg_src is either the filepath of a retarget config file or a dict with the same contents. """
+        if isinstance(retarget_cfg_src, dict):
+            retarget_cfg = retarget_cfg_src
+        else:
+            retarget_cfg = _load_yaml(resolve_ad_filepath(retarget_cfg_src, 'retarget cfg'))
 
         # validate character starting location
         try:
@@ -539,6 +783,8 @@ class RetargetConfig():
             logging.critical(msg)
             assert False, msg
 
+        self._freeze()
+
     def validate_char_and_bvh_joint_names(self, char_joint_names: List[str], bvh_joint_names: List[str]) -> None:  # noqa: C901
 
         # validate bvh_projection_bodypart_groups
@@ -615,5 +861,18 @@ class RetargetConfig():
             logging.critical(msg)
             assert False, msg
 
+    def get_bvh_joint_names(self) -> List[str]:
+        """ Returns the names of every BVH joint this config refers to. A motion can only be retargeted with this config if its BVH has all of them. """
+        names: List[str] = []
+        for group in self.bvh_projection_bodypart_groups:
+            names.extend(group['bvh_joint_names'])
+        for group in self.char_bodypart_groups:
+            names.extend(group['bvh_depth_drivers'])
+        for bvh_joint_name_group in self.char_bvh_root_offset['bvh_joints']:
+            names.extend(bvh_joint_name_group)
+        for bvh_prox_joint_name, bvh_dist_joint_name in self.char_joint_bvh_joints_mapping.values():
+            names.extend([bvh_prox_joint_name, bvh_dist_joint_name])
+        return sorted(set(names))
+
 
 NoneType = type(None)  # needed for type checking
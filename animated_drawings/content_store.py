@@ -0,0 +1,153 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+
+class ContentStore():
+    """
+    Content-addressed, on-disk cache of byte blobs.
+    Blobs are stored under the hex digest of the inputs that produced them (see ContentStore.key()).
+    Writes are atomic, so multiple processes may share a store directory.
+    When the total size of the store exceeds max_bytes, the least recently used blobs are evicted.
+    The total is found by scanning the store once, then kept up to date as blobs are written and evicted, so that writes don't each scan it.
+    Blobs written by other processes are only counted when the store is next scanned, so a shared store may briefly exceed max_bytes.
+    """
+
+    def __init__(self, root_dir: Union[str, Path], max_bytes: int) -> None:
+        self.root_dir: Path = Path(root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes: int = max_bytes
+
+        self._total_bytes: Optional[int] = None  # not yet scanned
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts: Union[str, bytes]) -> str:
+        """ Returns a key uniquely identifying the ordered parts. """
+        h = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode('utf-8')
+            h.update(len(part).to_bytes(8, 'little'))  # length prefix, so that part boundaries matter
+            h.update(part)
+        return h.hexdigest()
+
+    def _get_path(self, key: str) -> Path:
+        return self.root_dir / key[:2] / key
+
+    def get(self, key: str) -> Optional[bytes]:
+        """ Returns the blob stored under key, or None if there isn't one. """
+        p = self._get_path(key)
+        try:
+            data = p.read_bytes()
+        except OSError:
+            return None
+
+        # mark as recently used
+        try:
+            os.utime(p)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """ Stores data under key, then evicts least recently used blobs if the store is too large. """
+        p = self._get_path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_fn = tempfile.mkstemp(dir=str(p.parent), prefix='.tmp_')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            try:
+                replaced_bytes = p.stat().st_size
+            except OSError:
+                replaced_bytes = 0
+            os.replace(tmp_fn, str(p))
+        except OSError as e:
+            logging.warning(f'Could not write {p} to content store: {e}')
+            if os.path.exists(tmp_fn):
+                os.remove(tmp_fn)
+            return
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._scan())
+            else:
+                self._total_bytes += len(data) - replaced_bytes
+            over_limit = self._total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def __contains__(self, key: str) -> bool:
+        return self._get_path(key).exists()
+
+    def _scan(self) -> List[Tuple[float, int, Path]]:
+        """ Returns the modification time, size, and path of every blob in the store. """
+        entries = []
+        for p in self.root_dir.glob('*/*'):
+            if p.name.startswith('.tmp_'):
+                continue
+            try:
+                stat = p.stat()
+            except OSError:  # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, p))
+        return entries
+
+    def evict(self) -> None:
+        """ Scans the store, then removes least recently used blobs until total size is at most max_bytes. """
+        with self._lock:
+            entries = self._scan()
+            total_bytes = sum(size for _, size, _ in entries)
+
+            if total_bytes > self.max_bytes:
+                for _, size, p in sorted(entries, key=lambda x: x[0]):
+                    try:
+                        p.unlink()
+                    except OSError:
+                        continue
+                    logging.info(f'Evicted {p} from content store')
+                    total_bytes -= size
+                    if total_bytes <= self.max_bytes:
+                        break
+
+            self._total_bytes = total_bytes
+
+
+_stores: Dict[Tuple[str, int], ContentStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_content_store_from_env(name: str, default_max_bytes: int) -> Optional[ContentStore]:
+    """
+    Returns the store of the on-disk cache called name, or None if the cache is disabled.
+    Each of the pipeline's caches (see pipeline_cache.py, model/retarget_cache.py, and model/character_cache.py) is configured by environment variables:
+        AD_{name}_DIR: directory of the cache. If unset, the cache is disabled
+        AD_{name}_MAX_BYTES: size above which least recently used entries are evicted. Defaults to default_max_bytes
+    Each cache's keys include its version, which is bumped whenever what it stores changes, so that existing entries are no longer used.
+    """
+    cache_dir = os.environ.get(f'AD_{name}_DIR')
+    if not cache_dir:
+        return None
+
+    try:
+        max_bytes = int(os.environ.get(f'AD_{name}_MAX_BYTES', default_max_bytes))
+    except ValueError as e:
+        msg = f'Error in AD_{name}_MAX_BYTES environment variable: {e}'
+        logging.critical(msg)
+        assert False, msg
+
+    # shared by all callers within the process, so the store is only scanned once
+    with _stores_lock:
+        if (cache_dir, max_bytes) not in _stores:
+            _stores[(cache_dir, max_bytes)] = ContentStore(cache_dir, max_bytes)
+        return _stores[(cache_dir, max_bytes)]
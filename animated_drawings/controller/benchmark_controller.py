@@ -0,0 +1,114 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+""" Benchmark Controller Class Module """
+
+from __future__ import annotations
+import json
+import time
+import logging
+import tempfile
+from typing import Any, Dict, Optional
+from pathlib import Path
+
+from animated_drawings.controller.video_render_controller import VideoRenderController, VideoWriter
+from animated_drawings.model.scene import Scene
+from animated_drawings.model.animated_drawing import AnimatedDrawing
+from animated_drawings.view.view import View
+from animated_drawings.config import ControllerConfig
+from animated_drawings import profiling
+
+
+class BenchmarkController(VideoRenderController):
+    """
+    Benchmark Controller runs the video render loop for a number of iterations and reports how long each stage took.
+    Frames are encoded as they would be for the video file specified by OUTPUT_VIDEO_PATH, but the video is discarded.
+    Results are reported as JSON. For each stage, the count, mean, max and percentiles of its duration are given.
+    If stage_timer is given and was registered before the scene was constructed, character initialization stages are reported too.
+    Otherwise, the controller times the run loop with its own StageTimer, which is only registered while the controller runs.
+    """
+
+    def __init__(self, cfg: ControllerConfig, scene: Scene, view: View, stage_timer: Optional[profiling.StageTimer] = None) -> None:
+        self.output_dir = tempfile.TemporaryDirectory(prefix='ad_benchmark_')
+
+        super().__init__(cfg, scene, view)
+
+        # character initialization has already happened, so only available if the caller timed the scene's creation
+        self.owns_stage_timer: bool = stage_timer is None
+        self.stage_timer: profiling.StageTimer = stage_timer or profiling.StageTimer()
+        self.character_init_stats = self.stage_timer.get_all_stats('character_init/')
+
+        self.frames_per_iteration: int = self.cfg.benchmark_frames or self.frames_left_to_render
+        self.iterations_left: int = self.cfg.benchmark_iterations
+        self.frames_left_to_render = self.frames_per_iteration
+        self.progress_bar.reset(total=self.frames_per_iteration * self.iterations_left)
+
+    def run(self) -> None:
+        if not self.owns_stage_timer:
+            super().run()
+            return
+
+        profiling.add_recorder(self.stage_timer)
+        try:
+            super().run()
+        finally:
+            profiling.remove_recorder(self.stage_timer)
+
+    def _get_output_video_path(self) -> Optional[str]:
+        """ Encode to a temporary file using the format of OUTPUT_VIDEO_PATH. """
+        suffix = Path(self.cfg.output_video_path).suffix if self.cfg.output_video_path else '.mp4'
+        return str(Path(self.output_dir.name) / f'benchmark{suffix}')
+
+    def _get_render_worker_count(self) -> int:
+        """ Stages are timed within this process, so it must render every frame. """
+        return 1
+
+    def _prep_for_run_loop(self) -> None:
+        super()._prep_for_run_loop()
+
+        # only time the run loop
+        self.stage_timer.clear()
+        self.run_loop_start_time = time.time()
+
+    def _finish_run_loop_iteration(self) -> None:
+        super()._finish_run_loop_iteration()
+
+        if self.frames_left_to_render > 0:
+            return
+
+        # finish this iteration's video, then start the next iteration from the beginning
+        with profiling.span('encode_finalize'):
+            self.video_writer.cleanup()
+        self.iterations_left -= 1
+        if self.iterations_left > 0:
+            self.frames_left_to_render = self.frames_per_iteration
+            self.scene.seek(0.0)
+            self.video_writer = VideoWriter.create_video_writer(self)
+
+    def _cleanup_after_run_loop(self) -> None:
+        run_loop_seconds = time.time() - self.run_loop_start_time
+        self.progress_bar.close()
+        self.view.cleanup()
+        self.output_dir.cleanup()
+
+        results: Dict[str, Any] = {
+            'frames_per_iteration': self.frames_per_iteration,
+            'iterations': self.cfg.benchmark_iterations,
+            'frames_rendered': self.frames_rendered,
+            'frame_size': [self.video_width, self.video_height],
+            'characters': sum(isinstance(child, AnimatedDrawing) for child in self.scene.get_children()),
+            'run_loop_seconds': run_loop_seconds,
+            'frames_per_second': self.frames_rendered / run_loop_seconds if run_loop_seconds > 0 else None,
+            'character_init': self.character_init_stats,
+            'stages': self.stage_timer.get_all_stats(),
+        }
+        results_json = json.dumps(results, indent=2)
+
+        if self.cfg.benchmark_output_path is None:
+            print(results_json)
+        else:
+            output_p = Path(self.cfg.benchmark_output_path)
+            output_p.parent.mkdir(exist_ok=True, parents=True)
+            output_p.write_text(results_json)
+            logging.info(f'Wrote benchmark results to {output_p.resolve()}')
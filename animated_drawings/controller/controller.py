@@ -5,13 +5,14 @@
 """ Controller Abstract Base Class Module """
 
 from __future__ import annotations
-from typing import Optional
+from typing import BinaryIO, Optional
 from abc import abstractmethod
 import logging
 
 from animated_drawings.model.scene import Scene
 from animated_drawings.view.view import View
 from animated_drawings.config import ControllerConfig
+from animated_drawings import profiling
 
 
 class Controller():
@@ -76,23 +77,48 @@ class Controller():
     def run(self) -> None:
         """ The run loop. Subclassed controllers should overload and define functionality for each step in this function."""
 
-        self._prep_for_run_loop()
+        with profiling.span('prep_for_run_loop'):
+            self._prep_for_run_loop()
         while not self._is_run_over():
-            self._start_run_loop_iteration()
-            self._update()
-            self._render()
-            self._tick()
-            self._handle_user_input()
-            self._finish_run_loop_iteration()
+            with profiling.span('frame'):
+                self._start_run_loop_iteration()
+                self._update()
+                self._render()
+                self._tick()
+                self._handle_user_input()
+                self._finish_run_loop_iteration()
 
-        self._cleanup_after_run_loop()
+        with profiling.span('cleanup_after_run_loop'):
+            self._cleanup_after_run_loop()
 
     @staticmethod
-    def create_controller(controller_cfg: ControllerConfig, scene: Scene, view: View) -> Controller:
-        """ Takes in a controller dictionary from mvc config file, scene, and view. Constructs and return appropriate controller."""
+    def create_controller(controller_cfg: ControllerConfig,
+                          scene: Scene,
+                          view: Optional[View],
+                          output_file: Optional[BinaryIO] = None,
+                          stage_timer: Optional[profiling.StageTimer] = None
+                          ) -> Controller:
+        """
+        Takes in a controller dictionary from mvc config file, scene, and view. Constructs and return appropriate controller.
+        view may only be None if the controller doesn't render, i.e. in mesh_export mode.
+        In video_render mode, the video is written to output_file, if specified, instead of to OUTPUT_VIDEO_PATH.
+        In benchmark mode, stage_timer, if specified, is used to time the run loop and should hold the timings of the scene's creation.
+        """
+        if controller_cfg.mode == 'mesh_export':
+            from animated_drawings.controller.mesh_export_controller import MeshExportController
+            return MeshExportController(controller_cfg, scene)
+
+        if view is None:
+            msg = f'A view is required by controller mode: {controller_cfg.mode}'
+            logging.critical(msg)
+            assert False, msg
+
         if controller_cfg.mode == 'video_render':
             from animated_drawings.controller.video_render_controller import VideoRenderController
-            return VideoRenderController(controller_cfg, scene, view,)
+            return VideoRenderController(controller_cfg, scene, view, output_file)
+        elif controller_cfg.mode == 'benchmark':
+            from animated_drawings.controller.benchmark_controller import BenchmarkController
+            return BenchmarkController(controller_cfg, scene, view, stage_timer)
         elif controller_cfg.mode == 'interactive':
             from animated_drawings.controller.interactive_controller import InteractiveController
             from animated_drawings.view.window_view import WindowView
@@ -0,0 +1,71 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+""" Mesh Export Controller Class Module """
+
+from __future__ import annotations
+import os
+import time
+import logging
+from typing import List
+
+from animated_drawings.controller.controller import Controller
+from animated_drawings.model.scene import Scene
+from animated_drawings.model.animated_drawing import AnimatedDrawing
+from animated_drawings.mesh_export import MeshSequence, save_mesh_archive
+from animated_drawings.config import ControllerConfig
+from animated_drawings import profiling
+
+
+class MeshExportController(Controller):
+    """
+    Mesh Export Controller computes the deformed mesh of every character, for every frame of its motion, and saves them to an archive.
+    Nothing is rendered, so no view or OpenGL context is needed. See animated_drawings/mesh_export.py for the archive contents.
+    Each iteration of the run loop exports one character.
+    """
+
+    def __init__(self, cfg: ControllerConfig, scene: Scene) -> None:
+        super().__init__(cfg, scene)
+
+        self.characters: List[AnimatedDrawing] = [c for c in self.scene.get_children() if isinstance(c, AnimatedDrawing)]
+        self.sequences: List[MeshSequence] = []
+
+        # frames are computed in parallel, using the same number of processes as a render would
+        self.processes: int = self.cfg.render_workers or os.cpu_count() or 1
+
+    def _prep_for_run_loop(self) -> None:
+        self.run_loop_start_time = time.time()
+
+    def _is_run_over(self) -> bool:
+        return len(self.sequences) == len(self.characters)
+
+    def _start_run_loop_iteration(self) -> None:
+        """ nothing to clear, as nothing is rendered """
+
+    def _update(self) -> None:
+        ad = self.characters[len(self.sequences)]
+        with profiling.span('precompute_frames'):
+            ad.precompute_frames(self.processes)
+        self.sequences.append(MeshSequence(ad))
+
+    def _render(self) -> None:
+        """ nothing is rendered """
+
+    def _tick(self) -> None:
+        """ every frame is computed within _update(), so there's no need to progress time """
+
+    def _handle_user_input(self) -> None:
+        """ ignore all user input when exporting meshes """
+
+    def _finish_run_loop_iteration(self) -> None:
+        """ nothing to do after each character is exported """
+
+    def _cleanup_after_run_loop(self) -> None:
+        logging.info(f'Computed meshes of {len(self.sequences)} characters in {time.time()-self.run_loop_start_time} seconds.')
+
+        assert isinstance(self.cfg.mesh_export_path, str)  # for static analysis
+        _time = time.time()
+        with profiling.span('save_mesh_archive'):
+            save_mesh_archive(self.cfg.mesh_export_path, self.sequences, self.cfg.mesh_export_dtype, self.cfg.mesh_export_format)
+        logging.info(f'Wrote meshes to {self.cfg.mesh_export_path} in {time.time()-_time} seconds.')
@@ -5,32 +5,43 @@
 """ Video Render Controller Class Module """
 
 from __future__ import annotations
+import os
 import time
+import pickle
 import logging
-from typing import List
+import tempfile
+import shutil
+from typing import TYPE_CHECKING, BinaryIO, List, Optional, Tuple
 from pathlib import Path
 from abc import abstractmethod
 import numpy as np
 import numpy.typing as npt
-import cv2
 from OpenGL import GL
-from tqdm import tqdm
 
 from animated_drawings.controller.controller import Controller
 from animated_drawings.model.scene import Scene
 from animated_drawings.model.animated_drawing import AnimatedDrawing
 from animated_drawings.view.view import View
-from animated_drawings.config import ControllerConfig
+from animated_drawings.config import ControllerConfig, ViewConfig
+from animated_drawings import profiling
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ProcessPoolExecutor
 
 NoneType = type(None)  # for type checking below
 
 
 class VideoRenderController(Controller):
-    """ Video Render Controller is used to non-interactively generate a video file """
+    """
+    Video Render Controller is used to non-interactively generate a video file.
+    If output_file is specified, the video is written to it instead of to OUTPUT_VIDEO_PATH, whose extension still determines the video format.
+    """
 
-    def __init__(self, cfg: ControllerConfig, scene: Scene, view: View) -> None:
+    def __init__(self, cfg: ControllerConfig, scene: Scene, view: View, output_file: Optional[BinaryIO] = None) -> None:
         super().__init__(cfg, scene)
 
+        self.output_file: Optional[BinaryIO] = output_file
+
         self.view: View = view
 
         self.scene: Scene = scene
@@ -39,6 +50,11 @@ class VideoRenderController(Controller):
         self.delta_t: float              # amount of time to progress scene between renders
         self._set_frames_left_to_render_and_delta_t()
 
+        # frame ranges rendered by worker processes, in order, with the futures of the processes rendering them
+        self.shards: List[Tuple[int, int, Future[None]]] = []
+        self.shard_dir: Optional[tempfile.TemporaryDirectory[str]] = None
+        self.shard_executor: Optional[ProcessPoolExecutor] = None
+
         self.render_start_time: float  # track when we started to render frames (for performance stats)
         self.frames_rendered: int = 0  # track how many frames we've rendered
 
@@ -46,10 +62,12 @@ class VideoRenderController(Controller):
         self.video_height: int
         self.video_width, self.video_height = self.view.get_framebuffer_size()
 
+        self.output_video_path: Optional[str] = self._get_output_video_path()
         self.video_writer: VideoWriter = VideoWriter.create_video_writer(self)
 
         self.frame_data = np.empty([self.video_height, self.video_width, 4], dtype='uint8')  # 4 for RGBA
 
+        from tqdm import tqdm  # imported here to keep import time of this module low
         self.progress_bar = tqdm(total=self.frames_left_to_render)
 
     def _set_frames_left_to_render_and_delta_t(self) -> None:
@@ -64,8 +82,8 @@ class VideoRenderController(Controller):
         for child in self.scene.get_children():
             if not isinstance(child, AnimatedDrawing):
                 continue
-            max_frames = max(max_frames, child.retargeter.bvh.frame_max_num)
-            frame_time.append(child.retargeter.bvh.frame_time)
+            max_frames = max(max_frames, child.retargeter.frame_max_num)
+            frame_time.append(child.retargeter.frame_time)
 
         if not all(x == frame_time[0] for x in frame_time):
             msg = f'frame time of BVH files don\'t match. Using first value: {frame_time[0]}'
@@ -74,9 +92,110 @@ class VideoRenderController(Controller):
         self.frames_left_to_render = max_frames
         self.delta_t = frame_time[0]
 
+    def _get_output_video_path(self) -> Optional[str]:
+        """ Path the video will be written to. """
+        return self.cfg.output_video_path
+
+    def _precompute_deformations(self) -> None:
+        """ Compute every character's per-frame vertices and draw order up front, using all available processes. """
+        processes = self.cfg.render_workers or os.cpu_count() or 1
+
+        _time = time.time()
+        for child in self.scene.get_children():
+            if not isinstance(child, AnimatedDrawing):
+                continue
+            child.precompute_frames(processes)
+        logging.info(f'Precomputed character deformations in {time.time()-_time} seconds.')
+
+    def _get_render_worker_count(self) -> int:
+        """ Number of processes, including this one, that will render frames. """
+        if not self.view.cfg.use_mesa:
+            logging.info('Sharded rendering requires USE_MESA. Rendering all frames in one process.')
+            return 1
+
+        workers = self.cfg.render_workers or os.cpu_count() or 1
+        return max(1, min(workers, self.frames_left_to_render))
+
+    def _start_render_workers(self, worker_count: int) -> None:
+        """
+        Split the frames into contiguous ranges, one per process.
+        This process keeps the first range and renders it in the run loop, as usual.
+        The remaining ranges are rendered by spawned worker processes, each with its own headless view,
+        using a pickled copy of the scene so that characters don't have to be rebuilt.
+        """
+        frame_count = self.frames_left_to_render
+        bounds = [round(idx * frame_count / worker_count) for idx in range(worker_count + 1)]
+
+        self.shard_dir = tempfile.TemporaryDirectory(prefix='ad_render_')
+        scene_fn = os.path.join(self.shard_dir.name, 'scene.pkl')
+        with open(scene_fn, 'wb') as f:
+            pickle.dump(self.scene, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # imported here to keep import time of this module low
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        self.shard_executor = ProcessPoolExecutor(max_workers=worker_count - 1, mp_context=multiprocessing.get_context('spawn'))
+        for start, end in zip(bounds[1:-1], bounds[2:]):
+            frames_fn = os.path.join(self.shard_dir.name, f'frames_{start}.npy')
+            future = self.shard_executor.submit(render_frame_range, self.view.cfg, scene_fn, start, end, self.delta_t, frames_fn)
+            self.shards.append((start, end, future))
+
+        self.frames_left_to_render = bounds[1]
+        logging.info(f'Rendering {frame_count} frames with {worker_count} processes')
+
+    def _stop_render_workers(self) -> None:
+        """ Cancel any frame ranges not yet started, wait for the worker processes to exit, and remove their frames. Safe to call more than once. """
+        if self.shard_executor is not None:
+            for _, _, future in self.shards:
+                future.cancel()
+            self.shard_executor.shutdown()
+            self.shard_executor = None
+        if self.shard_dir is not None:
+            self.shard_dir.cleanup()
+            self.shard_dir = None
+
+    def _write_shards(self) -> None:
+        """ Wait for each worker process, in order, and send its frames to the video writer. """
+        assert self.shard_dir is not None  # for static analysis
+
+        for start, end, future in self.shards:
+            try:
+                future.result()
+            except Exception as e:
+                msg = f'Render worker failed to render frames {start} to {end}: {e}'
+                logging.critical(msg)
+                assert False, msg
+
+            frames_fn = os.path.join(self.shard_dir.name, f'frames_{start}.npy')
+            frames: npt.NDArray[np.uint8] = np.load(frames_fn, mmap_mode='r')
+            for frame in frames:
+                self.video_writer.process_frame(np.array(frame))
+                self.frames_rendered += 1
+                self.progress_bar.update(1)
+            del frames
+            os.remove(frames_fn)
+
+        self._stop_render_workers()
+
+    def run(self) -> None:
+        """ Runs the render loop. Render worker processes are shut down even if rendering fails. """
+        try:
+            super().run()
+        finally:
+            self._stop_render_workers()
+
     def _prep_for_run_loop(self) -> None:
         self.run_loop_start_time = time.time()
 
+        if self.cfg.precompute_deformation:
+            with profiling.span('precompute_deformations'):
+                self._precompute_deformations()
+
+        worker_count = self._get_render_worker_count()
+        if worker_count > 1:
+            with profiling.span('start_render_workers'):
+                self._start_render_workers(worker_count)
+
     def _is_run_over(self) -> bool:
         return self.frames_left_to_render == 0
 
@@ -84,22 +203,26 @@ class VideoRenderController(Controller):
         self.view.clear_window()
 
     def _update(self) -> None:
-        self.scene.update_transforms()
+        with profiling.span('update_transforms'):
+            self.scene.update_transforms()
 
     def _render(self) -> None:
-        self.view.render(self.scene)
+        with profiling.span('render'):
+            self.view.render(self.scene)
 
     def _tick(self) -> None:
-        self.scene.progress_time(self.delta_t)
+        with profiling.span('tick'):
+            self.scene.progress_time(self.delta_t)
 
     def _handle_user_input(self) -> None:
         """ ignore all user input when rendering video file """
 
     def _finish_run_loop_iteration(self) -> None:
         # get pixel values from the frame buffer, send them to the video writer
-        GL.glBindFramebuffer(GL.GL_READ_FRAMEBUFFER, 0)
-        GL.glReadPixels(0, 0, self.video_width, self.video_height, GL.GL_BGRA, GL.GL_UNSIGNED_BYTE, self.frame_data)
-        self.video_writer.process_frame(self.frame_data[::-1, :, :].copy())
+        with profiling.span('readback'):
+            read_frame(self.video_width, self.video_height, self.frame_data)
+        with profiling.span('encode'):
+            self.video_writer.process_frame(self.frame_data[::-1, :, :].copy())
 
         # update our counts and progress_bar
         self.frames_left_to_render -= 1
@@ -107,14 +230,54 @@ class VideoRenderController(Controller):
         self.progress_bar.update(1)
 
     def _cleanup_after_run_loop(self) -> None:
+        if self.shards:
+            with profiling.span('write_shards'):
+                self._write_shards()
+
         logging.info(f'Rendered {self.frames_rendered} frames in {time.time()-self.run_loop_start_time} seconds.')
         self.view.cleanup()
 
         _time = time.time()
-        self.video_writer.cleanup()
+        with profiling.span('encode_finalize'):
+            self.video_writer.cleanup()
         logging.info(f'Wrote video to file in in {time.time()-_time} seconds.')
 
 
+def read_frame(width: int, height: int, frame_data: npt.NDArray[np.uint8], pixel_format: int = GL.GL_BGRA) -> None:
+    """ Read the pixel values of the default framebuffer, BGRA unless otherwise specified, into frame_data. Rows are ordered bottom to top. """
+    GL.glBindFramebuffer(GL.GL_READ_FRAMEBUFFER, 0)
+    GL.glReadPixels(0, 0, width, height, pixel_format, GL.GL_UNSIGNED_BYTE, frame_data)
+
+
+def render_frame_range(view_cfg: ViewConfig, scene_fn: str, start: int, end: int, delta_t: float, frames_fn: str) -> None:
+    """
+    Entry point of render worker processes.
+    Loads the pickled scene, seeks it to the time of frame start, and renders frames [start, end) with a new headless view.
+    Frames are saved to frames_fn as an [end-start, height, width, 4] BGRA array, rows ordered top to bottom.
+    """
+    from animated_drawings.view.mesa_view import MesaView
+    view = MesaView(view_cfg)
+
+    with open(scene_fn, 'rb') as f:
+        scene: Scene = pickle.load(f)
+    scene.seek(start * delta_t)
+
+    width, height = view.get_framebuffer_size()
+    frame_data = np.empty([height, width, 4], dtype='uint8')
+    frames = np.lib.format.open_memmap(frames_fn, mode='w+', dtype=np.uint8, shape=(end - start, height, width, 4))
+    for idx in range(end - start):
+        view.clear_window()
+        scene.update_transforms()
+        view.render(scene)
+        scene.progress_time(delta_t)
+        read_frame(width, height, frame_data)
+        frames[idx] = frame_data[::-1, :, :]
+
+    frames.flush()
+    del frames
+    view.cleanup()
+
+
 class VideoWriter():
     """ Wrapper to abstract the different backends necessary for writing different video filetypes """
 
@@ -134,14 +297,15 @@ class VideoWriter():
     @staticmethod
     def create_video_writer(controller: VideoRenderController) -> VideoWriter:
 
-        assert isinstance(controller.cfg.output_video_path, str)  # for static analysis
+        assert isinstance(controller.output_video_path, str)  # for static analysis
 
-        output_p = Path(controller.cfg.output_video_path)
-        output_p.parent.mkdir(exist_ok=True, parents=True)
+        output_p = Path(controller.output_video_path)
+        if controller.output_file is None:
+            output_p.parent.mkdir(exist_ok=True, parents=True)
 
-        msg = f' Writing video to: {output_p.resolve()}'
-        logging.info(msg)
-        print(msg)
+            msg = f' Writing video to: {output_p.resolve()}'
+            logging.info(msg)
+            print(msg)
 
         if output_p.suffix == '.gif':
             return GIFWriter(controller)
@@ -157,8 +321,9 @@ class GIFWriter(VideoWriter):
     """ Video writer for creating transparent, animated GIFs with Pillow """
 
     def __init__(self, controller: VideoRenderController) -> None:
-        assert isinstance(controller.cfg.output_video_path, str)  # for static analysis
-        self.output_p = Path(controller.cfg.output_video_path)
+        assert isinstance(controller.output_video_path, str)  # for static analysis
+        self.output_p = Path(controller.output_video_path)
+        self.output_file: Optional[BinaryIO] = controller.output_file
 
         self.duration = int(controller.delta_t*1000)
         if self.duration < 20:
@@ -170,15 +335,16 @@ class GIFWriter(VideoWriter):
 
     def process_frame(self, frame: npt.NDArray[np.uint8]) -> None:
         """ Reorder channels and save frames as they arrive"""
-        self.frames.append(cv2.cvtColor(frame, cv2.COLOR_BGRA2RGBA).astype(np.uint8))
+        self.frames.append(frame[:, :, [2, 1, 0, 3]].astype(np.uint8))  # BGRA to RGBA
 
     def cleanup(self) -> None:
         """ Write all frames to output path specified."""
         from PIL import Image
-        self.output_p.parent.mkdir(exist_ok=True, parents=True)
-        logging.info(f'VideoWriter will write to {self.output_p.resolve()}')
+        if self.output_file is None:
+            self.output_p.parent.mkdir(exist_ok=True, parents=True)
+            logging.info(f'VideoWriter will write to {self.output_p.resolve()}')
         ims = [Image.fromarray(a_frame) for a_frame in self.frames]
-        ims[0].save(self.output_p, save_all=True, append_images=ims[1:], duration=self.duration, disposal=2, loop=0)
+        ims[0].save(self.output_file or self.output_p, format='GIF', save_all=True, append_images=ims[1:], duration=self.duration, disposal=2, loop=0)
 
 
 class MP4Writer(VideoWriter):
@@ -186,19 +352,28 @@ class MP4Writer(VideoWriter):
     def __init__(self, controller: VideoRenderController) -> None:
 
         # validate and prep output path
-        if isinstance(controller.cfg.output_video_path, NoneType):
+        if isinstance(controller.output_video_path, NoneType):
             msg = 'output video path not specified for mp4 video writer'
             logging.critical(msg)
             assert False, msg
-        output_p = Path(controller.cfg.output_video_path)
-        output_p.parent.mkdir(exist_ok=True, parents=True)
-        logging.info(f'VideoWriter will write to {output_p.resolve()}')
+        # cv2.VideoWriter can only write to files, so video for an output file is written to a temporary file first
+        self.output_file: Optional[BinaryIO] = controller.output_file
+        self.temp_dir: Optional[tempfile.TemporaryDirectory[str]] = None
+        if self.output_file is not None:
+            self.temp_dir = tempfile.TemporaryDirectory(prefix='ad_video_')
+            output_p = Path(self.temp_dir.name, 'video.mp4')
+        else:
+            output_p = Path(controller.output_video_path)
+            output_p.parent.mkdir(exist_ok=True, parents=True)
+            logging.info(f'VideoWriter will write to {output_p.resolve()}')
+        self.output_p: Path = output_p
 
         # validate and prep codec
         if isinstance(controller.cfg.output_video_codec, NoneType):
             msg = 'output video codec not specified for mp4 video writer'
             logging.critical(msg)
             assert False, msg
+        import cv2
         fourcc = cv2.VideoWriter_fourcc(*controller.cfg.output_video_codec)
         logging.info(f'Using codec {controller.cfg.output_video_codec}')
 
@@ -214,3 +389,12 @@ class MP4Writer(VideoWriter):
 
     def cleanup(self) -> None:
         self.video_writer.release()
+
+        if self.output_file is not None and self.temp_dir is not None:
+            if not self.output_p.exists():
+                msg = 'No video was written. Check that OUTPUT_VIDEO_CODEC is supported by this OpenCV build'
+                logging.critical(msg)
+                assert False, msg
+            with open(self.output_p, 'rb') as f:
+                shutil.copyfileobj(f, self.output_file)
+            self.temp_dir.cleanup()
@@ -0,0 +1,138 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Export of deformed character meshes, for clients that render animations themselves.
+Instead of rendered frames, an archive contains everything needed to draw each character:
+its texture, mesh, and, for every motion frame, the positions of the mesh vertices and the order in which to draw its triangles.
+
+Triangles are grouped into segments, one per rig joint, as the draw order changes per segment rather than per triangle.
+The archive is an .npz file. For the i-th character, it contains the following arrays:
+    char{i}/texture_png       uint8 [B]           PNG-encoded RGBA texture
+    char{i}/uvs               float32 [V, 2]      texture coordinates of each vertex
+    char{i}/triangles         uint16|uint32 [T, 3] vertex indices of each triangle, grouped by segment
+    char{i}/segment_offsets   int32 [S+1]         triangles of segment s are triangles[segment_offsets[s]:segment_offsets[s+1]]
+    char{i}/segment_names     str [S]             name of the joint each segment belongs to
+    char{i}/positions         float32|float16 [F, V, 2]  xy position of each vertex in each frame (raw format only)
+    char{i}/positions_encoded uint8 [B]           positions encoded by vertex_animation.encode_vertex_animation() (quantized format only)
+    char{i}/depths            float32 [F]         z position of every vertex in each frame
+    char{i}/draw_orders       uint16 [F, D]       segments to draw in each frame, in order
+    char{i}/world_transform   float32 [4, 4]      transform from the character's space to world space
+    char{i}/frame_time        float32 []          seconds per frame
+
+Positions are stored raw, or, for web playback, in the much smaller quantized format described in animated_drawings/vertex_animation.py.
+load_mesh_archive() decodes quantized positions, so both formats load the same way.
+"""
+
+from __future__ import annotations
+import logging
+from pathlib import Path
+from typing import Dict, List, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from animated_drawings.model.animated_drawing import AnimatedDrawing
+from animated_drawings.vertex_animation import encode_vertex_animation, VertexAnimation
+
+MESH_EXPORT_DTYPES = ('float32', 'float16')
+MESH_EXPORT_FORMATS = ('raw', 'quantized')
+
+
+class MeshSequence():
+    """ The mesh, texture, and per-frame vertex positions and draw orders of a character, ready to be exported. """
+
+    def __init__(self, ad: AnimatedDrawing) -> None:
+        """ ad.precompute_frames() must have been called. """
+        vertices, _, draw_orders = ad.get_precomputed_frames()
+
+        # group triangles by segment
+        self.segment_names: List[str] = list(ad.joint_to_tri_v_idx.keys())
+        segment_triangles = [ad.joint_to_tri_v_idx[name].reshape([-1, 3]) for name in self.segment_names]
+        self.segment_offsets: npt.NDArray[np.int32] = np.cumsum([0] + [len(t) for t in segment_triangles]).astype(np.int32)
+        triangle_dtype = np.uint16 if len(ad.vertices) <= np.iinfo(np.uint16).max else np.uint32
+        self.triangles: npt.NDArray[np.uint32] = np.concatenate(segment_triangles).astype(triangle_dtype)
+
+        # only segments with triangles are drawn, so omit other joints from the draw orders
+        segment_name_to_idx: Dict[str, int] = {name: idx for idx, name in enumerate(self.segment_names)}
+        frame_segment_idxs = [[segment_name_to_idx[name] for name in draw_order if name in segment_name_to_idx] for draw_order in draw_orders]
+        if len(set(len(idxs) for idxs in frame_segment_idxs)) > 1:
+            msg = 'Number of segments drawn varies between frames, cannot export draw orders'
+            logging.critical(msg)
+            assert False, msg
+        self.draw_orders: npt.NDArray[np.uint16] = np.array(frame_segment_idxs, dtype=np.uint16)
+
+        self.positions: npt.NDArray[np.float32] = vertices[:, :, :2]
+        self.depths: npt.NDArray[np.float32] = vertices[:, 0, 2].copy()  # all vertices share the z position of the rig root
+
+        self.uvs: npt.NDArray[np.float32] = ad.vertices[:, 6:8].copy()
+        self.texture: npt.NDArray[np.uint8] = ad.txtr
+        self.world_transform: npt.NDArray[np.float32] = ad.get_world_transform().astype(np.float32)
+        self.frame_time: float = ad.retargeter.frame_time
+
+    def to_arrays(self, dtype: str = 'float32', position_format: str = 'raw') -> Dict[str, npt.NDArray]:
+        """
+        Returns the arrays stored in an archive for this character.
+        If position_format is raw, positions are stored as dtype, either float32 or float16. If position_format is quantized, dtype is ignored.
+        """
+        if dtype not in MESH_EXPORT_DTYPES:
+            msg = f'Unsupported mesh export dtype: {dtype}. Must be one of {MESH_EXPORT_DTYPES}'
+            logging.critical(msg)
+            assert False, msg
+        if position_format not in MESH_EXPORT_FORMATS:
+            msg = f'Unsupported mesh export format: {position_format}. Must be one of {MESH_EXPORT_FORMATS}'
+            logging.critical(msg)
+            assert False, msg
+
+        import cv2  # imported here to keep import time of this module low
+        success, texture_png = cv2.imencode('.png', cv2.cvtColor(np.ascontiguousarray(self.texture), cv2.COLOR_RGBA2BGRA))
+        if not success:
+            msg = 'Could not encode texture as PNG'
+            logging.critical(msg)
+            assert False, msg
+
+        arrays: Dict[str, npt.NDArray] = {
+            'texture_png': texture_png.reshape([-1]),
+            'uvs': self.uvs,
+            'triangles': self.triangles,
+            'segment_offsets': self.segment_offsets,
+            'segment_names': np.array(self.segment_names),
+            'depths': self.depths,
+            'draw_orders': self.draw_orders,
+            'world_transform': self.world_transform,
+            'frame_time': np.array(self.frame_time, dtype=np.float32),
+        }
+        if position_format == 'quantized':
+            encoded = encode_vertex_animation(self.positions, self.frame_time)
+            arrays['positions_encoded'] = np.frombuffer(encoded, dtype=np.uint8)
+        else:
+            arrays['positions'] = self.positions.astype(dtype)
+        return arrays
+
+
+def save_mesh_archive(output_path: Union[str, Path], sequences: List[MeshSequence], dtype: str = 'float32', position_format: str = 'raw') -> None:
+    """ Saves the mesh sequences of one or more characters to a compressed .npz archive. """
+    arrays: Dict[str, npt.NDArray] = {}
+    for char_idx, sequence in enumerate(sequences):
+        for name, array in sequence.to_arrays(dtype, position_format).items():
+            arrays[f'char{char_idx}/{name}'] = array
+
+    output_p = Path(output_path)
+    output_p.parent.mkdir(exist_ok=True, parents=True)
+    with open(output_p, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+
+
+def load_mesh_archive(archive_path: Union[str, Path]) -> List[Dict[str, npt.NDArray]]:
+    """ Returns the arrays of each character within an archive saved by save_mesh_archive(). Quantized positions are decoded. """
+    characters: Dict[int, Dict[str, npt.NDArray]] = {}
+    with np.load(archive_path) as archive:
+        for key in archive.files:
+            char_key, name = key.split('/', 1)
+            characters.setdefault(int(char_key[len('char'):]), {})[name] = archive[key]
+
+    for arrays in characters.values():
+        if 'positions_encoded' in arrays:
+            arrays['positions'] = VertexAnimation(arrays['positions_encoded'].tobytes()).decode()
+    return [characters[char_idx] for char_idx in sorted(characters)]
@@ -5,23 +5,26 @@
 import logging
 import ctypes
 import heapq
+import io
 import math
+import pickle
 import time
-from typing import Dict, List, Tuple, Optional, TypedDict, DefaultDict
+from typing import Dict, List, Tuple, Optional, TypedDict, DefaultDict, Union
 from collections import defaultdict
 from pathlib import Path
 
-import cv2
 import numpy as np
 import numpy.typing as npt
-from skimage import measure
-from shapely import geometry
 from OpenGL import GL
 
-from scipy.spatial import Delaunay
 from animated_drawings.model.transform import Transform
+from animated_drawings.view import gl_resources
 from animated_drawings.model.time_manager import TimeManager
 from animated_drawings.model.retargeter import Retargeter
+from animated_drawings.model.retarget_cache import get_retarget_cache, get_retarget_cache_key
+from animated_drawings.model.character_cache import get_character_cache, get_character_cache_key, compiled_character_to_bytes, compiled_character_from_bytes
+from animated_drawings.content_store import ContentStore
+from animated_drawings import profiling
 from animated_drawings.model.arap import ARAP
 from animated_drawings.model.joint import Joint
 from animated_drawings.model.quaternions import Quaternions
@@ -41,7 +44,6 @@ class AnimatedDrawingsJoint(Joint):
         super().__init__(name=name, offset=np.array([x, 1 - y, 0]))
 
         self.starting_theta: float
-        self.current_theta: float
 
 
 class AnimatedDrawingRig(Transform):
@@ -97,6 +99,35 @@ class AnimatedDrawingRig(Transform):
         # cache for later
         self.joint_count = joints_d['root'].joint_count()
 
+        # precompute what the planar FK kernel needs: joints in topological (depth-first) order, parent indices, and rest bone vectors
+        self.joint_names: List[str] = self.root_joint.get_chain_joint_names()
+        self._joints: List[AnimatedDrawingsJoint] = [joints_d[name] for name in self.joint_names]
+        self._joint_name_to_idx: Dict[str, int] = {name: idx for idx, name in enumerate(self.joint_names)}
+        self._parent_idxs: npt.NDArray[np.int32] = np.full(self.joint_count, -1, dtype=np.int32)
+        for joint_idx, joint in enumerate(self._joints):
+            parent = joint.get_parent()
+            if isinstance(parent, AnimatedDrawingsJoint):
+                self._parent_idxs[joint_idx] = self._joint_name_to_idx[str(parent.name)]
+        self._bone_vectors: npt.NDArray[np.float64] = np.array([joint.get_local_position()[:2] for joint in self._joints], dtype=np.float64)
+        self._bone_vectors[0] = 0.0  # root position is supplied separately
+        self._starting_thetas: npt.NDArray[np.float64] = np.array([joint.starting_theta for joint in self._joints], dtype=np.float64)
+
+        # path matrix: _chain_m[j, k] is 1 if joint k is joint j or one of its ancestors
+        self._chain_m: npt.NDArray[np.float64] = np.zeros([self.joint_count, self.joint_count], dtype=np.float64)
+        for j_idx in range(self.joint_count):
+            k_idx = j_idx
+            while k_idx != -1:
+                self._chain_m[j_idx, k_idx] = 1.0
+                k_idx = int(self._parent_idxs[k_idx])
+
+        # local rotation (radians CCW) of each joint, as set by its retargeted children, and the resulting 2D joint positions
+        self._local_thetas: npt.NDArray[np.float64] = np.zeros(self.joint_count, dtype=np.float64)
+        self._joint_positions: npt.NDArray[np.float32]
+        self._solve_fk(self.root_joint.get_local_position()[:2])
+
+        # joint transforms are only synced with the FK results when the rig is drawn
+        self._joint_transforms_dirty_bit: bool = False
+
         # set up buffer for visualizing vertices
         self.vertices = np.zeros([2 * (self.joint_count - 1), 6], np.float32)
 
@@ -104,14 +135,57 @@ class AnimatedDrawingRig(Transform):
         self._vertex_buffer_dirty_bit: bool = True
 
     def set_global_orientations(self, bvh_frame_orientations: Dict[str, float]) -> None:
-        """ Applies orientation from bvh_frame_orientation to the rig. """
+        """
+        Applies orientation from bvh_frame_orientation to the rig.
+        Each retargeted joint's orientation sets the rotation of its parent joint, relative to the parent's own orientation.
+        If multiple children of a joint are retargeted, the last one in depth-first order wins.
+        """
+        global_thetas: Dict[int, float] = {}
+        for joint_idx, joint_name in enumerate(self.joint_names):
+            if joint_name not in bvh_frame_orientations:
+                continue
+
+            parent_idx = int(self._parent_idxs[joint_idx])
+            if parent_idx == -1:
+                msg = f'Cannot retarget the rig root joint: {joint_name}'
+                logging.critical(msg)
+                assert False, msg
+
+            theta: float = math.radians(bvh_frame_orientations[joint_name] - self._starting_thetas[joint_idx])
+            global_thetas[joint_idx] = theta
+
+            self._local_thetas[parent_idx] = theta - global_thetas.get(parent_idx, 0.0)
 
-        self._set_global_orientations(self.root_joint, bvh_frame_orientations)
+        self._solve_fk(self.root_joint.get_local_position()[:2])
+        self._joint_transforms_dirty_bit = True
         self._vertex_buffer_dirty_bit = True
 
     def get_joints_2D_positions(self) -> npt.NDArray[np.float32]:
-        """ Returns array of 2D joints positions for rig.  """
-        return np.array(self.root_joint.get_chain_worldspace_positions()).reshape([-1, 3])[:, :2]
+        """ Returns array of 2D joints positions for rig, in depth-first order.  """
+        return self._joint_positions
+
+    def _solve_fk(self, root_xy: npt.NDArray[np.float32]) -> None:
+        """
+        Planar forward kinematics. Each joint's world angle is the sum of its own and its ancestors' local rotations.
+        Each bone vector is rotated by its parent's world angle and the positions are accumulated down the chain.
+        """
+        world_thetas = self._chain_m @ self._local_thetas
+        parent_thetas = world_thetas[np.maximum(self._parent_idxs, 0)]
+
+        cs, ss = np.cos(parent_thetas), np.sin(parent_thetas)
+        bone_xs, bone_ys = self._bone_vectors[:, 0], self._bone_vectors[:, 1]
+        rotated_bones = np.stack([cs * bone_xs - ss * bone_ys, ss * bone_xs + cs * bone_ys], axis=1)
+
+        self._joint_positions = (self._chain_m @ rotated_bones + root_xy).astype(np.float32)
+
+    def _sync_joint_transforms(self) -> None:
+        """ Copy the FK results into the joint transforms, so that they can be used to draw the rig. """
+        axes = Vectors.from_array_unchecked(np.tile(np.array([[0.0, 0.0, 1.0]]), [self.joint_count, 1]))
+        rotate_ms = Quaternions.from_angle_axis(self._local_thetas[:, np.newaxis], axes).to_rotation_matrices()
+        for joint, rotate_m in zip(self._joints, rotate_ms):
+            joint.set_rotation_matrix(rotate_m)
+        self.root_joint.update_transforms()
+        self._joint_transforms_dirty_bit = False
 
     def _compute_buffer_vertices(self, parent: Optional[Transform], pointer: List[int]) -> None:
         """ Recomputes values to pass to vertex buffer. Called recursively, pointer is List[int] to emulate pass-by-reference """
@@ -130,7 +204,7 @@ class AnimatedDrawingRig(Transform):
 
     def _initialize_opengl_resources(self):
         self.vao = GL.glGenVertexArrays(1)
-        self.vbo = GL.glGenBuffers(1)
+        self.vbo = gl_resources.gen_buffer()
 
         GL.glBindVertexArray(self.vao)
 
@@ -157,6 +231,9 @@ class AnimatedDrawingRig(Transform):
 
     def _compute_and_buffer_vertex_data(self):
 
+        if self._joint_transforms_dirty_bit:
+            self._sync_joint_transforms()
+
         self._compute_buffer_vertices(parent=self.root_joint, pointer=[0])
 
         GL.glBindVertexArray(self.vao)
@@ -167,26 +244,6 @@ class AnimatedDrawingRig(Transform):
 
         self._vertex_buffer_dirty_bit = False
 
-    def _set_global_orientations(self, joint: AnimatedDrawingsJoint, bvh_orientations: Dict[str, float]) -> None:
-        if joint.name in bvh_orientations.keys():
-
-            theta: float = bvh_orientations[str(joint.name)] - joint.starting_theta
-            theta = np.radians(theta)
-            joint.current_theta = theta
-
-            parent = joint.get_parent()
-            assert isinstance(parent, AnimatedDrawingsJoint)
-            if hasattr(parent, 'current_theta'):
-                theta = theta - parent.current_theta
-
-            rotation_q = Quaternions.from_angle_axis(np.array([theta]), axes=Vectors([0.0, 0.0, 1.0]))
-            parent.set_rotation(rotation_q)
-            parent.update_transforms()
-
-        for c in joint.get_children():
-            if isinstance(c, AnimatedDrawingsJoint):
-                self._set_global_orientations(c, bvh_orientations)
-
     def _draw(self, **kwargs):
         if not kwargs['viewer_cfg'].draw_ad_rig:
             return
@@ -221,7 +278,11 @@ class AnimatedDrawing(Transform, TimeManager):
     Afterwars, only the update() method needs to be called.
     """
 
-    def __init__(self, char_cfg: CharacterConfig, retarget_cfg: RetargetConfig, motion_cfg: MotionConfig):
+    def __init__(self, char_cfg: CharacterConfig, retarget_cfg: RetargetConfig, motion_cfg: MotionConfig, compiled_from: Optional['AnimatedDrawing'] = None):
+        """
+        If given, compiled_from is another AnimatedDrawing of the same char_cfg, e.g. driven by a different motion.
+        Its mask, texture, mesh, joint triangles, and ARAP solver, which don't depend upon the motion, are shared rather than rebuilt.
+        """
         super().__init__()
 
         self.char_cfg: CharacterConfig = char_cfg
@@ -230,32 +291,63 @@ class AnimatedDrawing(Transform, TimeManager):
 
         self.img_dim: int = self.char_cfg.img_dim
 
-        # load mask and pad to square
-        self.mask: npt.NDArray[np.uint8] = self._load_mask()
+        if compiled_from is not None and compiled_from.char_cfg is not char_cfg:
+            msg = 'compiled_from must be an AnimatedDrawing of the same character config'
+            logging.critical(msg)
+            assert False, msg
 
-        # load texture and pad to square
-        self.txtr: npt.NDArray[np.uint8] = self._load_txtr()
+        with profiling.span('character_init/mask_texture_load'):
+            # load mask and pad to square
+            self.mask: npt.NDArray[np.uint8] = self._load_mask() if compiled_from is None else compiled_from.mask
 
-        # generate the mesh
+            # load texture and pad to square
+            self.txtr: npt.NDArray[np.uint8] = self._load_txtr() if compiled_from is None else compiled_from.txtr
+
+        # if this character was previously compiled, use the cached mesh, joint triangles, and ARAP solver
         self.mesh: AnimatedDrawingMesh
-        self._generate_mesh()
+        self.joint_to_tri_v_idx:  Dict[str, npt.NDArray[np.int32]]
+        self.arap: ARAP
+        character_cache: Optional[ContentStore] = get_character_cache()
+        character_cache_key: str = ''
+        is_compiled: bool = False
+        if compiled_from is not None:
+            self.mesh, self.joint_to_tri_v_idx, self.arap = compiled_from.mesh, compiled_from.joint_to_tri_v_idx, compiled_from.arap
+            character_cache, is_compiled = None, True
+        elif character_cache is not None:
+            character_cache_key = get_character_cache_key(self.mask, self.char_cfg.skeleton, self.img_dim)
+            is_compiled = self._load_compiled_character(character_cache, character_cache_key)
+
+        # generate the mesh
+        if not is_compiled:
+            with profiling.span('character_init/mesh'):
+                self._generate_mesh()
 
-        self.rig = AnimatedDrawingRig(self.char_cfg)
-        self.add_child(self.rig)
+        with profiling.span('character_init/rig'):
+            self.rig = AnimatedDrawingRig(self.char_cfg)
+            self.add_child(self.rig)
 
         # perform runtime checks for character pose, modify retarget config accordingly
         self._modify_retargeting_cfg_for_character()
 
-        self.joint_to_tri_v_idx:  Dict[str, npt.NDArray[np.int32]]
-        self._initialize_joint_to_triangles_dict()
+        if not is_compiled:
+            with profiling.span('character_init/joint_to_triangles_bfs'):
+                self._initialize_joint_to_triangles_dict()
 
         self.indices: npt.NDArray[np.int32] = np.stack(self.mesh['triangles']).flatten()  # order in which to render triangles
+        self.draw_order: List[str] = []  # names of the joints whose triangles are rendered, in the order they are rendered
 
         self.retargeter: Retargeter
-        self._initialize_retargeter_bvh(motion_cfg, retarget_cfg)
+        with profiling.span('character_init/retarget'):
+            self._initialize_retargeter_bvh(motion_cfg, self.retarget_cfg)
 
         # initialize arap solver with original joint positions
-        self.arap = ARAP(self.rig.get_joints_2D_positions(), self.mesh['triangles'], self.mesh['vertices'])
+        if not is_compiled:
+            with profiling.span('character_init/arap'):
+                self.arap = ARAP(self.rig.get_joints_2D_positions(), self.mesh['triangles'], self.mesh['vertices'])
+
+            if character_cache is not None:
+                character_cache.put(character_cache_key,
+                                    compiled_character_to_bytes(self.mesh['vertices'], self.mesh['triangles'], self.joint_to_tri_v_idx, self.arap))
 
         self.vertices: npt.NDArray[np.float32]
         self._initialize_vertices()
@@ -263,14 +355,36 @@ class AnimatedDrawing(Transform, TimeManager):
         self._is_opengl_initialized: bool = False
         self._vertex_buffer_dirty_bit: bool = True
 
+        # vertex positions and triangle draw orders for each motion frame, if precompute_frames() was called
+        self._precomputed_vertices: Optional[npt.NDArray[np.float32]] = None
+        self._precomputed_indices: Optional[List[npt.NDArray[np.int32]]] = None
+        self._precomputed_draw_orders: Optional[List[List[str]]] = None
+
         # pose the animated drawing using the first frame of the bvh
         self.update()
 
+    def _load_compiled_character(self, character_cache: ContentStore, character_cache_key: str) -> bool:
+        """ Sets the mesh, joint_to_tri_v_idx, and ARAP solver from the character cache. Returns False if they aren't cached. """
+        cached_data: Optional[bytes] = character_cache.get(character_cache_key)
+        if cached_data is None:
+            return False
+        try:
+            with profiling.span('character_init/compiled_character_load'):
+                mesh_vertices, mesh_triangles, self.joint_to_tri_v_idx, self.arap = compiled_character_from_bytes(cached_data)
+        except Exception as e:
+            logging.warning(f'Could not use cached compiled character, compiling instead: {e}')
+            return False
+        self.mesh = {'vertices': mesh_vertices, 'triangles': mesh_triangles}
+        logging.info(f'Using cached compiled character: {character_cache_key}')
+        return True
+
     def _modify_retargeting_cfg_for_character(self):
         """
         If the character is drawn in particular poses, the orientation-matching retargeting framework produce poor results.
         Therefore, the retargeter config can specify a number of runtime checks and retargeting modifications to make if those checks fail.
+        Configs are shared between characters, so a modified copy of the retargeter config is made for this character.
         """
+        removed_joint_names: List[str] = []
         for position_test, target_joint_name, joint1_name, joint2_name in self.retarget_cfg.char_runtime_checks:
             if position_test == 'above':
                 """ Checks whether target_joint is 'above' the vector from joint1 to joint2. If it's below, removes it.
@@ -304,15 +418,33 @@ class AnimatedDrawing(Transform, TimeManager):
                 angle = math.atan2(test_vector[1], test_vector[0])
                 if (math.sin(-angle) * target_vector[0] + math.cos(-angle) * target_vector[1]) < 0:
                     logging.info(f'char_runtime_check failed, removing {target_joint_name} from retargeter :{target_joint_name, position_test, joint1_name, joint2_name}')
-                    del self.retarget_cfg.char_joint_bvh_joints_mapping[target_joint_name]
+                    removed_joint_names.append(target_joint_name)
             else:
                 msg = f'Unrecognized char_runtime_checks position_test: {position_test}'
                 logging.critical(msg)
                 assert False, msg
 
+        if removed_joint_names:
+            mapping = {name: joints for name, joints in self.retarget_cfg.char_joint_bvh_joints_mapping.items() if name not in removed_joint_names}
+            self.retarget_cfg = self.retarget_cfg.replace(char_joint_bvh_joints_mapping=mapping)
+
     def _initialize_retargeter_bvh(self, motion_cfg: MotionConfig, retarget_cfg: RetargetConfig):
         """ Initializes the retargeter used to drive the animated character.  """
 
+        # if retargeting results for this character and motion were previously cached, use them
+        retarget_cache: Optional[ContentStore] = get_retarget_cache()
+        retarget_cache_key: str = ''
+        if retarget_cache is not None:
+            retarget_cache_key = get_retarget_cache_key(motion_cfg, retarget_cfg, self.rig.joint_names, self.rig.get_joints_2D_positions())
+            cached_data: Optional[bytes] = retarget_cache.get(retarget_cache_key)
+            if cached_data is not None:
+                try:
+                    self.retargeter = Retargeter.from_bytes(motion_cfg, retarget_cfg, cached_data)
+                    logging.info(f'Using cached retargeting results: {retarget_cache_key}')
+                    return
+                except Exception as e:
+                    logging.warning(f'Could not use cached retargeting results, retargeting instead: {e}')
+
         # initialize retargeter
         self.retargeter = Retargeter(motion_cfg, retarget_cfg)
 
@@ -328,29 +460,21 @@ class AnimatedDrawing(Transform, TimeManager):
         # compute ratio of character's leg length to bvh skel leg length
         c_limb_length = 0
         c_joint_groups: List[List[str]] = char_bvh_root_offset['char_joints']
-        for b_joint_group in c_joint_groups:
-            while len(b_joint_group) >= 2:
-                c_dist_joint = self.rig.root_joint.get_transform_by_name(b_joint_group[1])
-                c_prox_joint = self.rig.root_joint.get_transform_by_name(b_joint_group[0])
+        for c_joint_group in c_joint_groups:
+            for c_prox_joint_name, c_dist_joint_name in zip(c_joint_group[:-1], c_joint_group[1:]):
+                c_dist_joint = self.rig.root_joint.get_transform_by_name(c_dist_joint_name)
+                c_prox_joint = self.rig.root_joint.get_transform_by_name(c_prox_joint_name)
                 assert isinstance(c_dist_joint, AnimatedDrawingsJoint)
                 assert isinstance(c_prox_joint, AnimatedDrawingsJoint)
                 c_dist_joint_pos = c_dist_joint.get_world_position()
                 c_prox_joint_pos = c_prox_joint.get_world_position()
                 c_limb_length += np.linalg.norm(np.subtract(c_dist_joint_pos, c_prox_joint_pos))
-                b_joint_group.pop(0)
 
         b_limb_length = 0
         b_joint_groups: List[List[str]] = char_bvh_root_offset['bvh_joints']
         for b_joint_group in b_joint_groups:
-            while len(b_joint_group) >= 2:
-                b_dist_joint = self.retargeter.bvh.root_joint.get_transform_by_name(b_joint_group[1])
-                b_prox_joint = self.retargeter.bvh.root_joint.get_transform_by_name(b_joint_group[0])
-                assert isinstance(b_dist_joint, Joint)
-                assert isinstance(b_prox_joint, Joint)
-                b_dist_joint_pos = b_dist_joint.get_world_position()
-                b_prox_joint_pos = b_prox_joint.get_world_position()
-                b_limb_length += np.linalg.norm(np.subtract(b_dist_joint_pos, b_prox_joint_pos))
-                b_joint_group.pop(0)
+            for b_prox_joint_name, b_dist_joint_name in zip(b_joint_group[:-1], b_joint_group[1:]):
+                b_limb_length += self.retargeter.get_bone_length(b_prox_joint_name, b_dist_joint_name)
 
         # compute character-bvh scale factor and send to retargeter
         scale_factor = float(c_limb_length / b_limb_length)
@@ -361,36 +485,124 @@ class AnimatedDrawing(Transform, TimeManager):
         for char_joint_name, (bvh_prox_joint_name, bvh_dist_joint_name) in self.retarget_cfg.char_joint_bvh_joints_mapping.items():
             self.retargeter.compute_orientations(bvh_prox_joint_name, bvh_dist_joint_name, char_joint_name)
 
+        if retarget_cache is not None:
+            retarget_cache.put(retarget_cache_key, self.retargeter.to_bytes())
+
     def update(self):
         """
         This method receives the delta t, the amount of time to progress the character's internal time keeper.
         This method passes its time to the retargeter, which returns bone orientations.
         Orientations are passed to rig to calculate new joint positions.
         The updated joint positions are passed into the ARAP module, which computes the new vertex locations.
+        If the vertex locations and draw order of the frame were precomputed, those are used instead.
         The new vertex locations are stored and the dirty bit is set.
         """
+        frame_idx: int = self.retargeter.get_frame_idx(self.get_time())
+
+        if self._precomputed_vertices is None or self._precomputed_indices is None:
+            self._compute_frame(frame_idx)
+        else:
+            # pose the rig, in case it is drawn, but skip the mesh deformation
+            self._pose_rig(frame_idx)
+            self.vertices[:, :3] = self._precomputed_vertices[frame_idx]
+            self.indices = self._precomputed_indices[frame_idx]
+
+        self._vertex_buffer_dirty_bit = True
+
+    def _pose_rig(self, frame_idx: int) -> Tuple[Dict[str, float], Dict[str, float], npt.NDArray[np.float32]]:
+        """ Poses the rig with the retargeted motion data of frame_idx, then returns that data. """
 
         # get retargeted motion data
         frame_orientations: Dict[str, float]
         joint_depths: Dict[str, float]
         root_position: npt.NDArray[np.float32]
-        frame_orientations, joint_depths, root_position = self.retargeter.get_retargeted_frame_data(self.get_time())
+        with profiling.span('retarget_lookup'):
+            frame_orientations, joint_depths, root_position = self.retargeter.get_frame_data(frame_idx)
 
         # update the rig's root position and reorient all of its joints
-        self.rig.root_joint.set_position(root_position)
-        self.rig.set_global_orientations(frame_orientations)
+        with profiling.span('rig_fk'):
+            self.rig.root_joint.set_position(root_position)
+            self.rig.set_global_orientations(frame_orientations)
+
+        return frame_orientations, joint_depths, root_position
+
+    def _compute_frame(self, frame_idx: int) -> None:
+        """ Poses the rig for frame_idx, deforms the mesh to match, and determines the draw order of its triangles. """
+        _, joint_depths, root_position = self._pose_rig(frame_idx)
 
         # using new joint positions, calculate new mesh vertex xy positions
         control_points: npt.NDArray[np.float32] = self.rig.get_joints_2D_positions() - root_position[:2]
-        self.vertices[:, :2] = self.arap.solve(control_points) + root_position[:2]
+        with profiling.span('arap_solve'):
+            self.vertices[:, :2] = self.arap.solve(control_points) + root_position[:2]
 
         # use the z position of the rig's root joint for all mesh vertices
-        self.vertices[:, 2] = self.rig.root_joint.get_world_position()[2]
-
-        self._vertex_buffer_dirty_bit = True
+        self.vertices[:, 2] = root_position[2]
 
         # using joint depths, determine the correct order in which to render the character
-        self._set_draw_indices(joint_depths)
+        with profiling.span('draw_order'):
+            self._set_draw_indices(joint_depths)
+
+    def _compute_frames(self, frame_idxs: List[int]) -> Tuple[npt.NDArray[np.float32], List[npt.NDArray[np.int32]], List[List[str]]]:
+        """ Returns the vertex positions, triangle draw order, and joint draw order of each frame in frame_idxs. """
+        vertices = np.empty([len(frame_idxs), self.vertices.shape[0], 3], dtype=np.float32)
+        indices: List[npt.NDArray[np.int32]] = []
+        draw_orders: List[List[str]] = []
+        for idx, frame_idx in enumerate(frame_idxs):
+            self._compute_frame(frame_idx)
+            vertices[idx] = self.vertices[:, :3]
+            indices.append(self.indices)
+            draw_orders.append(self.draw_order)
+        return vertices, indices, draw_orders
+
+    def precompute_frames(self, processes: int) -> None:
+        """
+        Computes the vertex positions and triangle draw order of every motion frame ahead of time, so update() only has to look them up.
+        Frames are independent of one another, so they are split across processes.
+        Processes are spawned, rather than forked, as this one may already have an OpenGL context and threads, such as a video writer's,
+        and each is sent a pickled copy of this character.
+        """
+        frame_num: int = self.retargeter.frame_max_num
+        processes = max(1, min(processes, frame_num))
+
+        # each process computes every processes-th frame, so frames that take longer than others are spread across the processes
+        frame_idxs: List[List[int]] = [list(range(idx, frame_num, processes)) for idx in range(processes)]
+
+        if processes == 1:
+            results = [self._compute_frames(frame_idxs[0])]
+        else:
+            # imported here to keep import time of this module low
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            buf = io.BytesIO()
+            _CharacterPickler(buf, self).dump(self)
+            with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+                results = list(executor.map(_compute_frames_of_pickled_character, [buf.getvalue()] * processes, frame_idxs))
+
+        self._precomputed_vertices = np.empty([frame_num, self.vertices.shape[0], 3], dtype=np.float32)
+        precomputed_indices: List[npt.NDArray[np.int32]] = [np.empty(0, dtype=np.int32)] * frame_num
+        precomputed_draw_orders: List[List[str]] = [[]] * frame_num
+        for process_frame_idxs, (vertices, indices, draw_orders) in zip(frame_idxs, results):
+            self._precomputed_vertices[process_frame_idxs] = vertices
+            for frame_idx, frame_indices, frame_draw_order in zip(process_frame_idxs, indices, draw_orders):
+                precomputed_indices[frame_idx] = frame_indices
+                precomputed_draw_orders[frame_idx] = frame_draw_order
+        self._precomputed_indices = precomputed_indices
+        self._precomputed_draw_orders = precomputed_draw_orders
+
+        # restore the pose of the current frame
+        self.update()
+
+    def get_precomputed_frames(self) -> Tuple[npt.NDArray[np.float32], List[npt.NDArray[np.int32]], List[List[str]]]:
+        """
+        Returns the results of precompute_frames(): for every motion frame, the xyz positions of the mesh vertices,
+        the triangle vertex indices in the order they're drawn, and the names of the joints whose triangles are drawn, in order.
+        """
+        if self._precomputed_vertices is None or self._precomputed_indices is None or self._precomputed_draw_orders is None:
+            msg = 'precompute_frames() must be called before get_precomputed_frames()'
+            logging.critical(msg)
+            assert False, msg
+        return self._precomputed_vertices, self._precomputed_indices, self._precomputed_draw_orders
 
     def _set_draw_indices(self, joint_depths: Dict[str, float]):
 
@@ -403,11 +615,14 @@ class AnimatedDrawing(Transform, TimeManager):
 
         # Add vertices belonging to joints in each segment group in the order they will be rendered
         indices: List[npt.NDArray[np.int32]] = []
+        draw_order: List[str] = []
         for idx, dist in _bodypart_render_order:
             intra_bodypart_render_order = 1 if dist > 0 else -1  # if depth driver is behind plane, render bodyparts in reverse order
             for joint_name in self.retarget_cfg.char_bodypart_groups[idx]['char_joints'][::intra_bodypart_render_order]:
                 indices.append(self.joint_to_tri_v_idx.get(joint_name, np.array([], dtype=np.int32)))
+                draw_order.append(joint_name)
         self.indices = np.hstack(indices)
+        self.draw_order = draw_order
 
     def _initialize_joint_to_triangles_dict(self) -> None:  # noqa: C901
         """
@@ -419,8 +634,8 @@ class AnimatedDrawing(Transform, TimeManager):
         # temp dictionary to help with seed generation
         joints_d: Dict[str, CharacterConfig.JointDict] = {}
         for joint in self.char_cfg.skeleton:
-            joints_d[joint['name']] = joint
-            joints_d[joint['name']]['loc'][1] = 1 - joints_d[joint['name']]['loc'][1]
+            loc_x, loc_y = joint['loc']
+            joints_d[joint['name']] = {'loc': [loc_x, 1 - loc_y], 'name': joint['name'], 'parent': joint['parent']}
 
         # store joint names and later reference by element location
         joint_name_to_idx: List[str] = [joint['name'] for joint in self.char_cfg.skeleton]
@@ -483,9 +698,13 @@ class AnimatedDrawing(Transform, TimeManager):
 
     def _load_mask(self) -> npt.NDArray[np.uint8]:
         """ Load and perform preprocessing upon the mask """
-        mask_p: Path = self.char_cfg.mask_p
+        import cv2
+        mask_p: Union[Path, str] = self.char_cfg.mask_p or 'in-memory mask'
         try:
-            _mask: npt.NDArray[np.uint8] = cv2.imread(str(mask_p), cv2.IMREAD_GRAYSCALE).astype(np.uint8)
+            if self.char_cfg.mask is not None:
+                _mask: npt.NDArray[np.uint8] = self.char_cfg.mask.astype(np.uint8)
+            else:
+                _mask = cv2.imread(str(mask_p), cv2.IMREAD_GRAYSCALE).astype(np.uint8)
             if _mask.shape[0] != self.char_cfg.img_height:
                 raise AssertionError('height in character config and mask height do not match')
             if _mask.shape[1] != self.char_cfg.img_width:
@@ -505,10 +724,14 @@ class AnimatedDrawing(Transform, TimeManager):
 
     def _load_txtr(self) -> npt.NDArray[np.uint8]:
         """ Load and perform preprocessing upon the drawing image """
-        txtr_p: Path = self.char_cfg.txtr_p
+        import cv2
+        txtr_p: Union[Path, str] = self.char_cfg.txtr_p or 'in-memory texture'
         try:
-            _txtr: npt.NDArray[np.uint8] = cv2.imread(str(txtr_p), cv2.IMREAD_IGNORE_ORIENTATION | cv2.IMREAD_UNCHANGED).astype(np.uint8)
-            _txtr = cv2.cvtColor(_txtr, cv2.COLOR_BGRA2RGBA).astype(np.uint8)
+            if self.char_cfg.txtr is not None:
+                _txtr: npt.NDArray[np.uint8] = self.char_cfg.txtr.astype(np.uint8)
+            else:
+                _txtr = cv2.imread(str(txtr_p), cv2.IMREAD_IGNORE_ORIENTATION | cv2.IMREAD_UNCHANGED).astype(np.uint8)
+                _txtr = cv2.cvtColor(_txtr, cv2.COLOR_BGRA2RGBA).astype(np.uint8)
             if _txtr.shape[-1] != 4:
                 raise AssertionError('texture must be RGBA')
             if _txtr.shape[0] != self.char_cfg.img_height:
@@ -531,6 +754,11 @@ class AnimatedDrawing(Transform, TimeManager):
         return txtr
 
     def _generate_mesh(self) -> None:
+        # only needed to generate the mesh, so imported here to keep import time of this module low
+        from skimage import measure
+        from shapely import geometry
+        from scipy.spatial import Delaunay
+
         try:
             contours: List[npt.NDArray[np.float64]] = measure.find_contours(self.mask, 128)
         except Exception as e:
@@ -607,7 +835,7 @@ class AnimatedDrawing(Transform, TimeManager):
         h, w, _ = self.txtr.shape
 
         # # initialize the texture
-        self.txtr_id = GL.glGenTextures(1)
+        self.txtr_id = gl_resources.gen_texture()
         GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 4)
         GL.glBindTexture(GL.GL_TEXTURE_2D, self.txtr_id)
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_BASE_LEVEL, 0)
@@ -616,8 +844,8 @@ class AnimatedDrawing(Transform, TimeManager):
                         0, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, self.txtr)
 
         self.vao = GL.glGenVertexArrays(1)
-        self.vbo = GL.glGenBuffers(1)
-        self.ebo = GL.glGenBuffers(1)
+        self.vbo = gl_resources.gen_buffer()
+        self.ebo = gl_resources.gen_buffer()
 
         GL.glBindVertexArray(self.vao)
 
@@ -670,7 +898,13 @@ class AnimatedDrawing(Transform, TimeManager):
             self._initialize_opengl_resources()
 
         if self._vertex_buffer_dirty_bit:
-            self._rebuffer_vertex_data()
+            with profiling.span('buffer_upload'):
+                self._rebuffer_vertex_data()
+
+        with profiling.span('draw_calls'):
+            self._draw_mesh(**kwargs)
+
+    def _draw_mesh(self, **kwargs):
 
         GL.glBindVertexArray(self.vao)
 
@@ -713,3 +947,33 @@ class AnimatedDrawing(Transform, TimeManager):
             GL.glEnable(GL.GL_DEPTH_TEST)
 
         GL.glBindVertexArray(0)
+
+
+class _CharacterPickler(pickle.Pickler):
+    """
+    Pickles a character without the scene it belongs to, or the scene's transform store, which would otherwise be pickled with it.
+    Computing a character's frames doesn't need them: its rig's forward kinematics and the ARAP solver are independent of its world transform.
+    """
+
+    def __init__(self, file: io.BytesIO, character: AnimatedDrawing) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.scene: Optional[Transform] = character.get_parent()
+
+    def persistent_id(self, obj: object) -> Optional[str]:
+        from animated_drawings.model.transform_store import TransformStore
+        if (self.scene is not None and obj is self.scene) or isinstance(obj, TransformStore):
+            return 'excluded'
+        return None
+
+
+class _CharacterUnpickler(pickle.Unpickler):
+    """ Unpickles a character pickled by _CharacterPickler, with no scene or transform store. """
+
+    def persistent_load(self, pid: str) -> None:
+        return None
+
+
+def _compute_frames_of_pickled_character(data: bytes, frame_idxs: List[int]) -> Tuple[npt.NDArray[np.float32], List[npt.NDArray[np.int32]], List[List[str]]]:
+    """ Entry point of the spawned processes within AnimatedDrawing.precompute_frames() """
+    character: AnimatedDrawing = _CharacterUnpickler(io.BytesIO(data)).load()
+    return character._compute_frames(frame_idxs)
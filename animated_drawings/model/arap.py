@@ -2,16 +2,18 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+import io
 import numpy as np
 import numpy.typing as npt
 from collections import defaultdict
 import logging
-from typing import List, Dict, Set, Tuple
-import scipy.sparse.linalg as spla
-import scipy.sparse as sp
+from typing import List, Dict, Set, Tuple, TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from scipy.sparse import csr_matrix
 
-csr_matrix = sp._csr.csr_matrix  # for typing  # pyright: ignore[reportPrivateUsage]
+# the sparse matrices used by ARAP.solve()
+_SOLVE_MATRICES = ('tA1', 'tA2', 'G', 'tA1xA1', 'tA2xA2')
 
 
 class ARAP():
@@ -47,6 +49,8 @@ class ARAP():
         triangles: ndarray [N, 3] triplets of vertex IDs that make up triangles comprising the mesh
         w: int the weights to use for control points in solve. Default value should work.
         """
+        import scipy.sparse as sp
+
         self.w = w
 
         self.vertices = np.copy(vertices)
@@ -143,9 +147,9 @@ class ARAP():
         self.A2: npt.NDArray[np.float32] = np.vstack([A2_top, A2_bot])
 
         # for speed, convert to sparse matrices and cache for later
-        self.tA1: csr_matrix = sp.csr_matrix(self.A1.transpose())
-        self.tA2: csr_matrix = sp.csr_matrix(self.A2.transpose())
-        self.G: csr_matrix = sp.csr_matrix(G)
+        self.tA1: 'csr_matrix' = sp.csr_matrix(self.A1.transpose())
+        self.tA2: 'csr_matrix' = sp.csr_matrix(self.A2.transpose())
+        self.G: 'csr_matrix' = sp.csr_matrix(G)
 
         # perturbing singular matrix and calling det can trigger overflow warning- ignore it
         old_settings = np.seterr(over='ignore')
@@ -155,14 +159,14 @@ class ARAP():
         while np.linalg.det(tA1xA1_dense) == 0.0:
             logging.info('tA1xA1 is singular. perturbing...')
             tA1xA1_dense += 0.00000001 * np.identity(tA1xA1_dense.shape[0])
-        self.tA1xA1: csr_matrix = sp.csr_matrix(tA1xA1_dense)
+        self.tA1xA1: 'csr_matrix' = sp.csr_matrix(tA1xA1_dense)
 
         # ensure tA2xA2 matrix isn't singular and cache sparse repsentation
         tA2xA2_dense: npt.NDArray[np.float32] = self.tA2 @ self.A2
         while np.linalg.det(tA2xA2_dense) == 0.0:
             logging.info('tA2xA2 is singular. perturbing...')
             tA2xA2_dense += 0.00000001 * np.identity(tA2xA2_dense.shape[0])
-        self.tA2xA2: csr_matrix = sp.csr_matrix(tA2xA2_dense)
+        self.tA2xA2: 'csr_matrix' = sp.csr_matrix(tA2xA2_dense)
 
         # revert np overflow warnings behavior
         np.seterr(**old_settings)
@@ -175,6 +179,7 @@ class ARAP():
         pins_xy: ndarray [N, 2] with new pin xy positions
         return: ndarray [N, 2], the updated xy locations of each vertex in the mesh
         """
+        import scipy.sparse.linalg as spla
 
         # remove any pins that were orgininally outside the mesh
         pins_xy: npt.NDArray[np.float32] = pins_xy_[self.pin_mask]  # pyright: ignore[reportGeneralTypeIssues]
@@ -204,6 +209,51 @@ class ARAP():
 
         return np.vstack((v2x, v2y)).T
 
+    def __reduce__(self):
+        """ Pickled as the output of to_bytes(), so solvers sent to worker processes don't carry the large dense setup matrices. """
+        return (ARAP.from_bytes, (self.to_bytes(),))
+
+    def to_bytes(self) -> bytes:
+        """ Serialize everything solve() needs. The dense matrices used to set up the solver are not included. """
+        arrays: Dict[str, npt.NDArray] = {
+            'w': np.array(self.w),
+            'vertices': self.vertices,
+            'e_v_idxs': np.array(self.e_v_idxs, dtype=np.int32).reshape([-1, 2]),
+            'edge_vectors': self.edge_vectors,
+            'pin_mask': self.pin_mask,
+        }
+        for name in _SOLVE_MATRICES:
+            m: 'csr_matrix' = getattr(self, name)
+            arrays[f'{name}_data'] = m.data
+            arrays[f'{name}_indices'] = m.indices
+            arrays[f'{name}_indptr'] = m.indptr
+            arrays[f'{name}_shape'] = np.array(m.shape)
+
+        buf = io.BytesIO()
+        np.savez(buf, **arrays)
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'ARAP':
+        """ Restore a solver from the output of to_bytes(), without setting it up again. """
+        import scipy.sparse as sp
+
+        ret = cls.__new__(cls)
+        with np.load(io.BytesIO(data)) as npz:
+            ret.w = int(npz['w'])
+            ret.vertices = npz['vertices']
+            ret.e_v_idxs = [tuple(e_v_idx) for e_v_idx in npz['e_v_idxs']]
+            ret.edge_vectors = npz['edge_vectors']
+            ret.pin_mask = npz['pin_mask']
+            for name in _SOLVE_MATRICES:
+                m = sp.csr_matrix((npz[f'{name}_data'], npz[f'{name}_indices'], npz[f'{name}_indptr']), shape=tuple(npz[f'{name}_shape']))
+                setattr(ret, name, m)
+
+        ret.edge_num = len(ret.e_v_idxs)
+        ret.vert_num = len(ret.vertices)
+        ret.pin_num = int(np.count_nonzero(ret.pin_mask))
+        return ret
+
     def _xy_to_barycentric_coords(self,
                                   points: npt.NDArray[np.float32],
                                   vertices: npt.NDArray[np.float32],
@@ -6,6 +6,7 @@ import numpy as np
 import OpenGL.GL as GL
 import ctypes
 from animated_drawings.model.transform import Transform
+from animated_drawings.view import gl_resources
 
 
 class Box(Transform):
@@ -90,8 +91,8 @@ class Box(Transform):
         This way, unit tests and other non-rendering operations can proceed without requiring a Controller.
         """
         self.vao = GL.glGenVertexArrays(1)
-        self.vbo = GL.glGenBuffers(1)
-        self.ebo = GL.glGenBuffers(1)
+        self.vbo = gl_resources.gen_buffer()
+        self.ebo = gl_resources.gen_buffer()
 
         GL.glBindVertexArray(self.vao)
 
@@ -68,6 +68,10 @@ class BVH(Transform, TimeManager):
         self.add_child(self.root_joint)
         self.joint_num = self.root_joint.joint_count()
 
+        # joints in the order in which BVH rotation data is stored
+        self._joints: List[BVH_Joint] = []
+        self._collect_joints(self.root_joint)
+
         self.cur_frame = 0  # initialize skeleton pose to first frame
         self.apply_frame(self.cur_frame)
 
@@ -81,21 +85,21 @@ class BVH(Transform, TimeManager):
         cur_frame = round(cur_time / self.frame_time) % self.frame_max_num
         self.apply_frame(cur_frame)
 
+    def _collect_joints(self, joint: BVH_Joint) -> None:
+        self._joints.append(joint)
+        for c in joint.get_children():
+            if not isinstance(c, BVH_Joint):
+                continue
+            self._collect_joints(c)
+
     def apply_frame(self, frame_num: int) -> None:
         """ Apply root position and joint rotation data for specified frame_num """
         self.root_joint.set_position(self.pos_data[frame_num])
-        self._apply_frame_rotations(self.root_joint, frame_num, ptr=np.array(0))
 
-    def _apply_frame_rotations(self, joint: BVH_Joint, frame_num: int, ptr: npt.NDArray[np.int32]) -> None:
-        q = Quaternions(self.rot_data[frame_num, ptr])
-        joint.set_rotation(q)
-
-        ptr += 1
-
-        for c in joint.get_children():
-            if not isinstance(c, BVH_Joint):
-                continue
-            self._apply_frame_rotations(c, frame_num, ptr)
+        # rot_data quaternions are already normalized, so convert the whole frame at once
+        rotate_ms = Quaternions.from_array_unchecked(self.rot_data[frame_num]).to_rotation_matrices()
+        for joint, rotate_m in zip(self._joints, rotate_ms):
+            joint.set_rotation_matrix(rotate_m)
 
     def get_skeleton_fwd(self, forward_perp_vector_joint_names: List[Tuple[str, str]], update: bool = True) -> Vectors:
         """
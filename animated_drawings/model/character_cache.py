@@ -0,0 +1,64 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+On-disk cache of compiled characters: the mesh, the triangles nearest each joint, and the ARAP solver.
+Compiling a character is deterministic given its mask and skeleton, and doesn't depend upon the motion,
+so its results are stored in a ContentStore under a key derived from them, and shared by every motion the character is rendered with.
+"""
+
+import io
+import json
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from animated_drawings.content_store import ContentStore, get_content_store_from_env
+from animated_drawings.model.arap import ARAP
+
+CHARACTER_CACHE_VERSION = '1'
+
+DEFAULT_CHARACTER_CACHE_MAX_BYTES = 1024 ** 3
+
+get_character_cache: Callable[[], Optional[ContentStore]] = partial(get_content_store_from_env, 'CHARACTER_CACHE', DEFAULT_CHARACTER_CACHE_MAX_BYTES)
+
+
+def get_character_cache_key(mask: npt.NDArray[np.uint8], skeleton: Sequence[Any], img_dim: int) -> str:
+    """ Key identifying everything that affects the compiled character. mask is the padded, upright mask the character is compiled from. """
+    return ContentStore.key(
+        CHARACTER_CACHE_VERSION,
+        json.dumps([mask.shape, img_dim]),
+        np.ascontiguousarray(mask, dtype=np.uint8).tobytes(),
+        json.dumps(skeleton),
+    )
+
+
+def compiled_character_to_bytes(mesh_vertices: npt.NDArray[np.float32],
+                                mesh_triangles: List[npt.NDArray[np.int32]],
+                                joint_to_tri_v_idx: Dict[str, npt.NDArray[np.int32]],
+                                arap: ARAP
+                                ) -> bytes:
+    joint_names = list(joint_to_tri_v_idx.keys())
+    buf = io.BytesIO()
+    np.savez(buf,
+             mesh_vertices=mesh_vertices,
+             mesh_triangles=np.array(mesh_triangles, dtype=np.int32).reshape([-1, 3]),
+             joint_names=np.array(joint_names, dtype=np.str_),
+             joint_tri_v_idx_counts=np.array([len(joint_to_tri_v_idx[name]) for name in joint_names], dtype=np.int64),
+             joint_tri_v_idxs=np.concatenate([joint_to_tri_v_idx[name] for name in joint_names]).astype(np.int32),
+             arap=np.frombuffer(arap.to_bytes(), dtype=np.uint8))
+    return buf.getvalue()
+
+
+def compiled_character_from_bytes(data: bytes) -> Tuple[npt.NDArray[np.float32], List[npt.NDArray[np.int32]], Dict[str, npt.NDArray[np.int32]], ARAP]:
+    """ Inverse of compiled_character_to_bytes(). Returns mesh vertices, mesh triangles, joint_to_tri_v_idx, and the ARAP solver. """
+    with np.load(io.BytesIO(data)) as npz:
+        mesh_vertices = npz['mesh_vertices']
+        mesh_triangles = list(npz['mesh_triangles'])
+        joint_tri_v_idxs = np.split(npz['joint_tri_v_idxs'], np.cumsum(npz['joint_tri_v_idx_counts'])[:-1])
+        joint_to_tri_v_idx = {str(name): v_idxs for name, v_idxs in zip(npz['joint_names'], joint_tri_v_idxs)}
+        arap = ARAP.from_bytes(npz['arap'].tobytes())
+    return mesh_vertices, mesh_triangles, joint_to_tri_v_idx, arap
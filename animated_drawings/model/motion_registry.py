@@ -0,0 +1,316 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import copy
+import logging
+import math
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from animated_drawings.config import MotionConfig
+from animated_drawings.model.bvh import BVH
+from animated_drawings.model.joint import Joint
+from animated_drawings.model.quaternions import Quaternions
+from animated_drawings.model.transform import Transform
+from animated_drawings.model.vectors import Vectors
+
+x_axis = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+z_axis = np.array([0.0, 0.0, 1.0], dtype=np.float32)
+
+ProjectionGroups = List[Dict[str, Any]]
+
+
+def get_smallest_variance_axis(points: npt.NDArray[np.float32]) -> npt.NDArray[np.float64]:
+    """
+    Returns the unit axis along which the [N, 3] points vary the least, i.e. their third principal component.
+    Found via eigendecomposition of the 3x3 covariance matrix; eigh returns eigenvalues in ascending order.
+    The sign of the returned axis is arbitrary.
+    """
+    centered = points.astype(np.float64) - np.mean(points, axis=0, dtype=np.float64)
+    covariance = centered.T @ centered
+    _, eigenvectors = np.linalg.eigh(covariance)
+    return eigenvectors[:, 0]
+
+
+class MotionProjection():
+    """ Projection planes and per-frame joint depths for one set of bvh_projection_bodypart_groups. Shared, treat as read-only. """
+
+    def __init__(self,
+                 joint_group_name_to_projection_plane: Dict[str, npt.NDArray[np.float32]],
+                 joint_to_projection_plane: Dict[str, npt.NDArray[np.float32]],
+                 bvh_joint_to_projection_depth: Dict[str, npt.NDArray[np.float32]]
+                 ) -> None:
+        self.joint_group_name_to_projection_plane = joint_group_name_to_projection_plane
+        self.joint_to_projection_plane = joint_to_projection_plane
+        self.bvh_joint_to_projection_depth = bvh_joint_to_projection_depth
+
+
+class PreprocessedMotion():
+    """
+    The parts of retargeting that depend only upon the motion, not upon the character it drives.
+    Loads the BVH, orients, scales and grounds it, then runs FK over every frame to get normalized joint positions and forward vectors.
+    Projection planes and joint depths are computed upon request and cached per set of projection groups.
+    Instances are shared by all retargeters using the same motion, so their arrays are read-only and their BVH is private; see copy_bvh().
+    """
+
+    def __init__(self, motion_cfg: MotionConfig) -> None:
+
+        # instantiate the bvh
+        try:
+            self._bvh = BVH.from_file(str(motion_cfg.bvh_p), motion_cfg.start_frame_idx, motion_cfg.end_frame_idx)
+        except Exception as e:
+            msg = f'Error loading BVH: {e}'
+            logging.critical(msg)
+            assert False, msg
+
+        # get and cache bvh joint names for later
+        self.bvh_joint_names: List[str] = self._bvh.get_joint_names()
+
+        # bvh joints defining a set of vectors that skeleton's fwd is perpendicular to
+        self.forward_perp_vector_joint_names: List[Tuple[str, str]] = motion_cfg.forward_perp_joint_vectors
+
+        # override the frame_time, if one was specified within motion_cfg
+        if motion_cfg.frame_time:
+            self._bvh.frame_time = motion_cfg.frame_time
+        self.frame_time: float = self._bvh.frame_time
+        self.frame_max_num: int = self._bvh.frame_max_num
+
+        # rotate BVH skeleton so up is +Y
+        if motion_cfg.up == '+y':
+            pass  # no rotation needed
+        elif motion_cfg.up == '+z':
+            self._bvh.set_rotation(Quaternions.from_euler_angles('yx', np.array([-90.0, -90.0])))
+        else:
+            msg = f'up value not implemented: {motion_cfg.up}'
+            logging.critical(msg)
+            assert False, msg
+
+        # rotate BVH skeleton so forward is +X
+        skeleton_fwd: Vectors = self._bvh.get_skeleton_fwd(self.forward_perp_vector_joint_names)
+        q: Quaternions = Quaternions.rotate_between_vectors(skeleton_fwd, Vectors([1.0, 0.0, 0.0]))
+        self._bvh.rotation_offset(q)
+
+        # scale BVH
+        self._bvh.set_scale(motion_cfg.scale)
+
+        # position above origin
+        self._bvh.offset(-self._bvh.root_joint.get_world_position())
+
+        # adjust bvh skeleton y pos by getting groundplane joint...
+        try:
+            groundplane_joint = self._bvh.root_joint.get_transform_by_name(motion_cfg.groundplane_joint)
+            assert isinstance(groundplane_joint, Joint), f'could not find joint by name: {motion_cfg.groundplane_joint}'
+        except Exception as e:
+            msg = f'Error getting groundplane joint: {e}'
+            logging.warning(msg)
+            assert False
+
+        # ... and moving the bvh so it is on the y=0 plane
+        bvh_groundplane_y = groundplane_joint.get_world_position()[1]
+        self._bvh.offset(np.array([0, -bvh_groundplane_y, 0]))
+
+        self.joint_positions: npt.NDArray[np.float32]
+        self.fwd_vectors: npt.NDArray[np.float32]
+        self.bvh_root_positions: npt.NDArray[np.float32]
+        self._compute_normalized_joint_positions_and_fwd_vectors()
+
+        for arr in [self.joint_positions, self.fwd_vectors, self.bvh_root_positions]:
+            arr.flags.writeable = False
+
+        self._projections: Dict[Hashable, MotionProjection] = {}
+
+    def _compute_normalized_joint_positions_and_fwd_vectors(self) -> None:
+        """
+        Called during initialization.
+        Computes fwd vector for bvh skeleton at each frame.
+        Extracts all bvh skeleton joint locations for all frames.
+        Repositions them so root is above the origin.
+        Rotates them so skeleton faces along the +X axis.
+        """
+        # get joint positions and forward vectors
+        self.joint_positions = np.empty([self._bvh.frame_max_num, 3 * self._bvh.joint_num], dtype=np.float32)
+        self.fwd_vectors = np.empty([self._bvh.frame_max_num, 3], dtype=np.float32)
+        for frame_idx in range(self._bvh.frame_max_num):
+            self._bvh.apply_frame(frame_idx)
+            self.joint_positions[frame_idx] = self._bvh.root_joint.get_chain_worldspace_positions()
+            self.fwd_vectors[frame_idx] = self._bvh.get_skeleton_fwd(self.forward_perp_vector_joint_names).vs[0]
+
+        # reposition over origin
+        self.bvh_root_positions = self.joint_positions[:, :3]
+        self.joint_positions = self.joint_positions - np.tile(self.bvh_root_positions, [1, len(self.bvh_joint_names)])
+
+        # compute angle between skeleton's forward vector and x axis
+        v1 = np.tile(np.array([1.0, 0.0], dtype=np.float32), reps=(self.joint_positions.shape[0], 1))
+        v2 = self.fwd_vectors
+        dot: npt.NDArray[np.float32] = v1[:, 0]*v2[:, 0] + v1[:, 1]*v2[:, 2]
+        det: npt.NDArray[np.float32] = v1[:, 0]*v2[:, 2] - v2[:, 0]*v1[:, 1]
+        angle: npt.NDArray[np.float32] = np.arctan2(det, dot).astype(np.float32)
+        angle %= 2*np.pi
+        angle = np.where(angle < 0.0, angle + 2*np.pi, angle)
+
+        # rotate the skeleton's joint so it faces +X axis
+        for idx in range(self.joint_positions.shape[0]):
+            rot_mat = np.identity(3).astype(np.float32)
+            rot_mat[0, 0] = math.cos(angle[idx])
+            rot_mat[0, 2] = math.sin(angle[idx])
+            rot_mat[2, 0] = -math.sin(angle[idx])
+            rot_mat[2, 2] = math.cos(angle[idx])
+
+            rotated_joints: npt.NDArray[np.float32] = rot_mat @ self.joint_positions[idx].reshape([-1, 3]).T
+            self.joint_positions[idx] = rotated_joints.T.reshape(self.joint_positions[idx].shape)
+
+    def get_bvh_joint(self, joint_name: str) -> Optional[Transform]:
+        """ Returns the BVH joint named joint_name, or None if there isn't one. Shared, treat as read-only. """
+        return self._bvh.root_joint.get_transform_by_name(joint_name)
+
+    def copy_bvh(self) -> BVH:
+        """ Returns a copy of the oriented, scaled and grounded BVH, e.g. to add to a scene, which will animate and reparent it. """
+        return copy.deepcopy(self._bvh)
+
+    def get_joint_xyz(self, joint_name: str) -> npt.NDArray[np.float32]:
+        """ Returns [frame_num, 3] normalized positions of the specified joint. """
+        joint_idx = self.bvh_joint_names.index(joint_name)
+        return self.joint_positions[:, 3*joint_idx:3*(joint_idx+1)]
+
+    def get_projection(self, projection_groups: ProjectionGroups) -> MotionProjection:
+        """ Return the projection planes and joint depths for bvh_projection_bodypart_groups, computing them if not yet cached. """
+        key: Hashable = tuple((group['name'], tuple(group['bvh_joint_names']), group['method']) for group in projection_groups)
+        if key not in self._projections:
+            self._projections[key] = self._compute_projection(projection_groups)
+        return self._projections[key]
+
+    def _compute_projection(self, projection_groups: ProjectionGroups) -> MotionProjection:
+        joint_group_name_to_projection_plane: Dict[str, npt.NDArray[np.float32]] = {}
+        joint_to_projection_plane: Dict[str, npt.NDArray[np.float32]] = {}
+        for joint_projection_group in projection_groups:
+            group_name = joint_projection_group['name']
+            joint_names = joint_projection_group['bvh_joint_names']
+            projection_method = joint_projection_group['method']
+
+            projection_plane = self._determine_projection_plane_normal(group_name, joint_names, projection_method)
+            joint_group_name_to_projection_plane[group_name] = projection_plane
+
+            for joint_name in joint_names:
+                joint_to_projection_plane[joint_name] = projection_plane
+
+        bvh_joint_to_projection_depth = self._compute_depths(joint_to_projection_plane)
+
+        return MotionProjection(joint_group_name_to_projection_plane, joint_to_projection_plane, bvh_joint_to_projection_depth)
+
+    def _determine_projection_plane_normal(self, group_name: str, joint_names: List[str], projection_method: str) -> npt.NDArray[np.float32]:
+        """
+        Given a joint_projection_group dictionary object, computes the projection plane normal used for the group.
+        Called during initialization.
+        """
+
+        if projection_method == 'frontal':
+            logging.info(f'{group_name} projection_method is {projection_method}. Using {x_axis}')
+            return x_axis
+        elif projection_method == 'sagittal':
+            logging.info(f'{group_name} projection_method is {projection_method}. Using {z_axis}')
+            return z_axis
+        elif projection_method == 'pca':
+            logging.info(f'{group_name} projection_method is {projection_method}. Running PCA on {joint_names}')
+            pass  # pca code is below
+        else:
+            msg = f'bad project method for {group_name}: {projection_method}'
+            logging.critical(msg)
+            assert False, msg
+
+        # get the xyz locations of joints within this joint_projection_group
+        joints_idxs = [self.bvh_joint_names.index(joint_name) for joint_name in joint_names]
+        joints_mask = np.full(self.joint_positions.shape[1], False, dtype=np.bool8)
+        for idx in joints_idxs:
+            joints_mask[3*idx:3*(idx+1)] = True
+        joints_points = self.joint_positions[:, joints_mask]
+        joints_points = joints_points.reshape([-1, 3])
+
+        # do PCA and get 3rd component
+        pc3: npt.NDArray[np.float64] = get_smallest_variance_axis(joints_points)
+
+        # see if it is closer to the x axis or z axis
+        x_cos_sim: float = np.dot(x_axis, pc3) / (np.linalg.norm(x_axis) * np.linalg.norm(pc3))
+        z_cos_sim: float = np.dot(z_axis, pc3) / (np.linalg.norm(z_axis) * np.linalg.norm(pc3))
+
+        # return close of the two
+        if abs(x_cos_sim) > abs(z_cos_sim):
+            logging.info(f'PCA complete. {group_name} using {x_axis}')
+            return x_axis
+        else:
+            logging.info(f'PCA complete. {group_name} using {z_axis}')
+            return z_axis
+
+    def _compute_depths(self, joint_to_projection_plane: Dict[str, npt.NDArray[np.float32]]) -> Dict[str, npt.NDArray[np.float32]]:
+        """
+        For each BVH joint within bvh_projection_mapping_groups, compute distance to projection plane.
+        This distance used if the joint is a char_body_segmentation_groups depth_driver.
+        """
+
+        bvh_joint_to_projection_depth: Dict[str, npt.NDArray[np.float32]] = {}
+
+        for joint_name in self.bvh_joint_names:
+            joint_xyz = self.get_joint_xyz(joint_name)
+            try:
+                projection_plane_normal = joint_to_projection_plane[joint_name]
+            except Exception:
+                msg = f' error finding projection plane for joint_name: {joint_name}'
+                logging.info(msg)
+                continue
+
+            # project bone onto 2D plane
+            if np.array_equal(projection_plane_normal, x_axis):
+                joint_depths = joint_xyz[:, 0]
+            elif np.array_equal(projection_plane_normal, z_axis):
+                joint_depths = joint_xyz[:, 2]
+            else:
+                msg = 'error projection_plane_normal'
+                logging.critical(msg)
+                assert False, msg
+            bvh_joint_to_projection_depth[joint_name] = joint_depths
+
+        return bvh_joint_to_projection_depth
+
+
+# process-level cache of preprocessed motions, keyed by the motion config parameters that affect them.
+# Long-lived processes, like the render service's workers, see many motions, so only the most recently used are kept.
+MAX_PREPROCESSED_MOTIONS = 32
+_motion_registry: 'OrderedDict[Hashable, PreprocessedMotion]' = OrderedDict()
+
+
+def _get_motion_key(motion_cfg: MotionConfig) -> Hashable:
+    bvh_p = motion_cfg.bvh_p.resolve()
+    return (
+        str(bvh_p),
+        bvh_p.stat().st_mtime_ns,  # so that edits to the BVH are picked up
+        motion_cfg.start_frame_idx,
+        motion_cfg.end_frame_idx,
+        motion_cfg.frame_time,
+        motion_cfg.up,
+        motion_cfg.scale,
+        motion_cfg.groundplane_joint,
+        tuple(tuple(each) for each in motion_cfg.forward_perp_joint_vectors),
+    )
+
+
+def get_preprocessed_motion(motion_cfg: MotionConfig) -> PreprocessedMotion:
+    """ Return the PreprocessedMotion for motion_cfg, creating it if an equivalent one hasn't already been created in this process. """
+    key = _get_motion_key(motion_cfg)
+    if key in _motion_registry:
+        logging.info(f'Reusing preprocessed motion for {motion_cfg.bvh_p}')
+        _motion_registry.move_to_end(key)
+        return _motion_registry[key]
+
+    motion = PreprocessedMotion(motion_cfg)
+    _motion_registry[key] = motion
+    while len(_motion_registry) > MAX_PREPROCESSED_MOTIONS:
+        _motion_registry.popitem(last=False)
+    return motion
+
+
+def clear_motion_registry() -> None:
+    """ Release all preprocessed motions held by the registry. """
+    _motion_registry.clear()
@@ -20,6 +20,8 @@ class Quaternions:
     Strongly influenced by Daniel Holden's excellent Quaternions class.
     """
 
+    __slots__ = ('qs',)
+
     def __init__(self, qs: Union[Iterable[Union[int, float]], npt.NDArray[np.float32], Quaternions]) -> None:
 
         self.qs: npt.NDArray[np.float32]
@@ -57,6 +59,16 @@ class Quaternions:
 
         self.normalize()
 
+    @classmethod
+    def from_array_unchecked(cls, qs: npt.NDArray[np.float32]) -> Quaternions:
+        """
+        Fast path constructor for hot loops. Wraps qs without validating or normalizing it.
+        Caller must ensure qs has shape [..., 4] and contains unit quaternions. The array is shared, not copied.
+        """
+        ret_q = cls.__new__(cls)
+        ret_q.qs = qs
+        return ret_q
+
     def normalize(self) -> None:
         self.qs = self.qs / np.expand_dims(np.sum(self.qs ** 2.0, axis=-1) ** 0.5, axis=-1)
 
@@ -64,12 +76,22 @@ class Quaternions:
         """
         From Ken Shoemake
         https://www.ljll.math.upmc.fr/~frey/papers/scientific%20visualisation/Shoemake%20K.,%20Quaternions.pdf
-        :return: 4x4 rotation matrix representation of quaternions
+        :return: 4x4 rotation matrix representation of a single quaternion. If there are multiple, same as to_rotation_matrices()
+        """
+        ms = self.to_rotation_matrices()
+        if ms.shape[:-2] == (1,):
+            return ms[0]
+        return ms
+
+    def to_rotation_matrices(self) -> npt.NDArray[np.float32]:
+        """
+        Batched version of to_rotation_matrix.
+        :return: [..., 4, 4] rotation matrices, one per quaternion. For qs of shape [N, 4], returns [N, 4, 4]
         """
-        w = self.qs[..., 0].squeeze()
-        x = self.qs[..., 1].squeeze()
-        y = self.qs[..., 2].squeeze()
-        z = self.qs[..., 3].squeeze()
+        w = self.qs[..., 0]
+        x = self.qs[..., 1]
+        y = self.qs[..., 2]
+        z = self.qs[..., 3]
 
         xx, yy, zz = x**2, y**2, z**2
 
@@ -77,25 +99,26 @@ class Quaternions:
         xy, xz     = x*y, x*z  # no
         yz         = y*z
 
+        ms = np.zeros([*self.qs.shape[:-1], 4, 4], dtype=np.float32)
+
         # Row 1
-        r00 = 1 - 2 * (yy + zz)
-        r01 = 2 * (xy - wz)
-        r02 = 2 * (xz + wy)
+        ms[..., 0, 0] = 1 - 2 * (yy + zz)
+        ms[..., 0, 1] = 2 * (xy - wz)
+        ms[..., 0, 2] = 2 * (xz + wy)
 
         # Row 2
-        r10 = 2 * (xy + wz)
-        r11 = 1 - 2 * (xx + zz)
-        r12 = 2 * (yz - wx)
+        ms[..., 1, 0] = 2 * (xy + wz)
+        ms[..., 1, 1] = 1 - 2 * (xx + zz)
+        ms[..., 1, 2] = 2 * (yz - wx)
 
         # Row 3
-        r20 = 2 * (xz - wy)
-        r21 = 2 * (yz + wx)
-        r22 = 1 - 2 * (xx + yy)
+        ms[..., 2, 0] = 2 * (xz - wy)
+        ms[..., 2, 1] = 2 * (yz + wx)
+        ms[..., 2, 2] = 1 - 2 * (xx + yy)
+
+        ms[..., 3, 3] = 1.0
 
-        return np.array([[r00, r01, r02, 0.0],
-                         [r10, r11, r12, 0.0],
-                         [r20, r21, r22, 0.0],
-                         [0.0, 0.0, 0.0, 1.0]], dtype=np.float32)
+        return ms
 
     @classmethod
     def rotate_between_vectors(cls, v1: Vectors, v2: Vectors) -> Quaternions:
@@ -175,30 +198,42 @@ class Quaternions:
             logging.critical(msg)
             assert False, msg
 
-        # Note: Mike Day's article uses row vectors, whereas we used column, so here use transpose of matrix
-        MT = M.T
-        m00, m01, m02 = MT[0, 0], MT[0, 1], MT[0, 2]
-        m10, m11, m12 = MT[1, 0], MT[1, 1], MT[1, 2]
-        m20, m21, m22 = MT[2, 0], MT[2, 1], MT[2, 2]
-
-        if m22 < 0:
-            if m00 > m11:
-                t = 1 + m00 - m11 - m22
-                q = np.array([m12-m21,      t, m01+m10, m20+m02])
-            else:
-                t = 1 - m00 + m11 - m22
-                q = np.array([m20-m02, m01+m10,       t, m12+m21])
-        else:
-            if m00 < -m11:
-                t = 1 - m00 - m11 + m22
-                q = np.array([m01-m10, m20+m02, m12+m21,       t])
-            else:
-                t = 1 + m00 + m11 + m22
-                q = np.array([      t, m12-m21, m20-m02, m01-m10])
-
-        q *= (0.5 / math.sqrt(t))
+        return cls.from_rotation_matrices(M)
 
-        ret_q = Quaternions(q)
+    @classmethod
+    def from_rotation_matrices(cls, Ms: npt.NDArray[np.float32]) -> Quaternions:
+        """
+        Batched version of from_rotation_matrix. Takes [..., 4, 4] (or [..., 3, 3]) rotation matrices and returns one quaternion per matrix.
+        Unlike from_rotation_matrix, does not check that matrices are orthogonal with det == 1. Caller must ensure this.
+        """
+        # Note: Mike Day's article uses row vectors, whereas we used column, so here use transpose of matrix
+        m00, m01, m02 = Ms[..., 0, 0], Ms[..., 1, 0], Ms[..., 2, 0]
+        m10, m11, m12 = Ms[..., 0, 1], Ms[..., 1, 1], Ms[..., 2, 1]
+        m20, m21, m22 = Ms[..., 0, 2], Ms[..., 1, 2], Ms[..., 2, 2]
+
+        # compute all four of Day's candidate quaternions, then pick the numerically stable one for each matrix
+        t0 = 1 + m00 - m11 - m22
+        t1 = 1 - m00 + m11 - m22
+        t2 = 1 - m00 - m11 + m22
+        t3 = 1 + m00 + m11 + m22
+        candidates = np.stack([
+            np.stack([m12-m21,      t0, m01+m10, m20+m02], axis=-1),
+            np.stack([m20-m02, m01+m10,      t1, m12+m21], axis=-1),
+            np.stack([m01-m10, m20+m02, m12+m21,      t2], axis=-1),
+            np.stack([     t3, m12-m21, m20-m02, m01-m10], axis=-1),
+        ], axis=-2)
+        ts = np.stack([t0, t1, t2, t3], axis=-1)
+
+        branch = np.where(m22 < 0, np.where(m00 > m11, 0, 1), np.where(m00 < -m11, 2, 3))
+        q = np.take_along_axis(candidates, branch[..., None, None], axis=-2)[..., 0, :]
+        t = np.take_along_axis(ts, branch[..., None], axis=-1)
+
+        q = q * (0.5 / np.sqrt(t))
+
+        if q.ndim == 1:
+            q = np.expand_dims(q, axis=0)
+
+        ret_q = Quaternions.from_array_unchecked(q)
         ret_q.normalize()
         return ret_q
 
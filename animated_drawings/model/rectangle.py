@@ -5,6 +5,7 @@
 import numpy as np
 import OpenGL.GL as GL
 from animated_drawings.model.transform import Transform
+from animated_drawings.view import gl_resources
 import ctypes
 
 
@@ -33,8 +34,11 @@ class Rectangle(Transform):
             [0.5, 0.0,  0.5, *c],  # top right
         ], np.float32)
 
+        self._is_opengl_initialized: bool = False  # keep track of whether self._initialize_opengl_resources was called.
+
+    def _initialize_opengl_resources(self) -> None:
         self.vao = GL.glGenVertexArrays(1)
-        self.vbo = GL.glGenBuffers(1)
+        self.vbo = gl_resources.gen_buffer()
 
         GL.glBindVertexArray(self.vao)
 
@@ -57,8 +61,13 @@ class Rectangle(Transform):
         GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
         GL.glBindVertexArray(0)
 
+        self._is_opengl_initialized = True
+
     def _draw(self, **kwargs) -> None:
 
+        if not self._is_opengl_initialized:
+            self._initialize_opengl_resources()
+
         GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_FILL)
         GL.glUseProgram(kwargs['shader_ids']['color_shader'])
         model_loc = GL.glGetUniformLocation(kwargs['shader_ids']['color_shader'], "model")
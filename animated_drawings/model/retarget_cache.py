@@ -0,0 +1,57 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+On-disk cache of retargeting results.
+Retargeting is deterministic given the BVH, the motion config, the retarget config, and the character's rest skeleton,
+so its results are stored in a ContentStore under a key derived from all of them.
+"""
+
+import json
+from functools import partial
+from typing import Callable, List, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from animated_drawings.config import MotionConfig, RetargetConfig
+from animated_drawings.content_store import ContentStore, get_content_store_from_env
+
+RETARGET_CACHE_VERSION = '1'
+
+DEFAULT_RETARGET_CACHE_MAX_BYTES = 1024 ** 3
+
+get_retarget_cache: Callable[[], Optional[ContentStore]] = partial(get_content_store_from_env, 'RETARGET_CACHE', DEFAULT_RETARGET_CACHE_MAX_BYTES)
+
+
+def get_retarget_cache_key(motion_cfg: MotionConfig,
+                           retarget_cfg: RetargetConfig,
+                           char_joint_names: List[str],
+                           char_rest_positions: npt.NDArray[np.float32]
+                           ) -> str:
+    """ Key identifying everything that affects the retargeting results. Call after runtime checks have modified retarget_cfg. """
+    motion_params = {
+        'start_frame_idx': motion_cfg.start_frame_idx,
+        'end_frame_idx': motion_cfg.end_frame_idx,
+        'frame_time': motion_cfg.frame_time,
+        'up': motion_cfg.up,
+        'scale': motion_cfg.scale,
+        'groundplane_joint': motion_cfg.groundplane_joint,
+        'forward_perp_joint_vectors': motion_cfg.forward_perp_joint_vectors,
+    }
+    retarget_params = {
+        'char_start_loc': retarget_cfg.char_start_loc,
+        'bvh_projection_bodypart_groups': retarget_cfg.bvh_projection_bodypart_groups,
+        'char_bvh_root_offset': retarget_cfg.char_bvh_root_offset,
+        'char_joint_bvh_joints_mapping': retarget_cfg.char_joint_bvh_joints_mapping,
+    }
+
+    return ContentStore.key(
+        RETARGET_CACHE_VERSION,
+        motion_cfg.bvh_p.read_bytes(),
+        json.dumps(motion_params, sort_keys=True),
+        json.dumps(retarget_params, sort_keys=True),
+        json.dumps(char_joint_names),
+        np.ascontiguousarray(char_rest_positions, dtype=np.float32).tobytes(),
+    )
@@ -2,21 +2,17 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+from __future__ import annotations  # so we can refer to class Type inside class
+import io
 import logging
 from animated_drawings.model.bvh import BVH
 import numpy as np
 import numpy.typing as npt
-import math
 from animated_drawings.model.joint import Joint
-from sklearn.decomposition import PCA
-from typing import Tuple, List, Dict
-from animated_drawings.model.vectors import Vectors
-from animated_drawings.model.quaternions import Quaternions
+from animated_drawings.model.motion_registry import get_preprocessed_motion, MotionProjection, PreprocessedMotion, x_axis, z_axis
+from typing import Tuple, List, Dict, Optional
 from animated_drawings.config import MotionConfig, RetargetConfig
 
-x_axis = np.array([1.0, 0.0, 0.0], dtype=np.float32)
-z_axis = np.array([0.0, 0.0, 1.0], dtype=np.float32)
-
 
 class Retargeter():
     """
@@ -25,66 +21,21 @@ class Retargeter():
     specified in motion_cfg into a formal that can be applied to an animated drawing.
     It is responsible for project 3D joint locations onto 2D planes, determining resulting
     bone orientations, joint 'depths', and root offsets for each frame.
+    The character-independent work (BVH loading, FK, projection planes and depths) is done by a PreprocessedMotion,
+    which is shared between all retargeters in the process that use the same motion.
     """
 
     def __init__(self, motion_cfg: MotionConfig, retarget_cfg: RetargetConfig) -> None:
 
-        # instantiate the bvh
-        try:
-            self.bvh = BVH.from_file(str(motion_cfg.bvh_p), motion_cfg.start_frame_idx, motion_cfg.end_frame_idx)
-        except Exception as e:
-            msg = f'Error loading BVH: {e}'
-            logging.critical(msg)
-            assert False, msg
-
-        # get and cache bvh joint names for later
-        self.bvh_joint_names = self.bvh.get_joint_names()
-
-        # bvh joints defining a set of vectors that skeleton's fwd is perpendicular to
-        self.forward_perp_vector_joint_names: List[Tuple[str, str]] = motion_cfg.forward_perp_joint_vectors
-
-        # override the frame_time, if one was specified within motion_cfg
-        if motion_cfg.frame_time:
-            self.bvh.frame_time = motion_cfg.frame_time
-
-        # rotate BVH skeleton so up is +Y
-        if motion_cfg.up == '+y':
-            pass  # no rotation needed
-        elif motion_cfg.up == '+z':
-            self.bvh.set_rotation(Quaternions.from_euler_angles('yx', np.array([-90.0, -90.0])))
-        else:
-            msg = f'up value not implemented: {motion_cfg.up}'
-            logging.critical(msg)
-            assert False, msg
-
-        # rotate BVH skeleton so forward is +X
-        skeleton_fwd: Vectors = self.bvh.get_skeleton_fwd(self.forward_perp_vector_joint_names)
-        q: Quaternions = Quaternions.rotate_between_vectors(skeleton_fwd, Vectors([1.0, 0.0, 0.0]))
-        self.bvh.rotation_offset(q)
+        self._motion_cfg: MotionConfig = motion_cfg
+        self._projection_groups = retarget_cfg.bvh_projection_bodypart_groups
 
-        # scale BVH
-        self.bvh.set_scale(motion_cfg.scale)
+        # get the shared, read-only motion data
+        self._motion: Optional[PreprocessedMotion] = get_preprocessed_motion(motion_cfg)
+        self._projection: Optional[MotionProjection] = None
 
-        # position above origin
-        self.bvh.offset(-self.bvh.root_joint.get_world_position())
-
-        # adjust bvh skeleton y pos by getting groundplane joint...
-        try:
-            groundplane_joint = self.bvh.root_joint.get_transform_by_name(motion_cfg.groundplane_joint)
-            assert isinstance(groundplane_joint, Joint), f'could not find joint by name: {motion_cfg.groundplane_joint}'
-        except Exception as e:
-            msg = f'Error getting groundplane joint: {e}'
-            logging.warning(msg)
-            assert False
-
-        # ... and moving the bvh so it is on the y=0 plane
-        bvh_groundplane_y = groundplane_joint.get_world_position()[1]
-        self.bvh.offset(np.array([0, -bvh_groundplane_y, 0]))
-
-        self.joint_positions: npt.NDArray[np.float32]
-        self.fwd_vectors: npt.NDArray[np.float32]
-        self.bvh_root_positions: npt.NDArray[np.float32]
-        self._compute_normalized_joint_positions_and_fwd_vectors()
+        self.frame_time: float = self.motion.frame_time
+        self.frame_max_num: int = self.motion.frame_max_num
 
         # cache the starting worldspace location of character's root joint
         self.character_start_loc: npt.NDArray[np.float32] = np.array(retarget_cfg.char_start_loc, dtype=np.float32)
@@ -92,141 +43,106 @@ class Retargeter():
         # holds world coordinates of character root joint after retargeting
         self.char_root_positions: npt.NDArray[np.float32]
 
-        # get & save projection planes
-        self.joint_group_name_to_projection_plane: Dict[ str, npt.NDArray[np.float32]] = {}
-        self.joint_to_projection_plane: Dict[ str, npt.NDArray[np.float32]] = {}
-        for joint_projection_group in retarget_cfg.bvh_projection_bodypart_groups:
-            group_name = joint_projection_group['name']
-            joint_names = joint_projection_group['bvh_joint_names']
-            projection_method = joint_projection_group['method']
-
-            projection_plane = self._determine_projection_plane_normal(group_name, joint_names, projection_method)
-            self.joint_group_name_to_projection_plane[joint_projection_group['name']] = projection_plane
-
-            for joint_name in joint_projection_group['bvh_joint_names']:
-                self.joint_to_projection_plane[joint_name] = projection_plane
-
         # map character joint names to its orientations
         self.char_joint_to_orientation: Dict[str, npt.NDArray[np.float32]] = {}
 
-        # map bvh joint names to its distance to project plane (useful for rendering order)
-        self.bvh_joint_to_projection_depth: Dict[str, npt.NDArray[np.float32]] = self._compute_depths()
-
-    def _compute_normalized_joint_positions_and_fwd_vectors(self) -> None:
-        """
-        Called during initialization.
-        Computes fwd vector for bvh skeleton at each frame.
-        Extracts all bvh skeleton joint locations for all frames.
-        Repositions them so root is above the origin.
-        Rotates them so skeleton faces along the +X axis.
-        """
-        # get joint positions and forward vectors
-        self.joint_positions = np.empty([self.bvh.frame_max_num, 3 * self.bvh.joint_num], dtype=np.float32)
-        self.fwd_vectors = np.empty([self.bvh.frame_max_num, 3], dtype=np.float32)
-        for frame_idx in range(self.bvh.frame_max_num):
-            self.bvh.apply_frame(frame_idx)
-            self.joint_positions[frame_idx] = self.bvh.root_joint.get_chain_worldspace_positions()
-            self.fwd_vectors[frame_idx] = self.bvh.get_skeleton_fwd(self.forward_perp_vector_joint_names).vs[0]
-
-        # reposition over origin
-        self.bvh_root_positions = self.joint_positions[:, :3]
-        self.joint_positions = self.joint_positions - np.tile(self.bvh_root_positions, [1, len(self.bvh_joint_names)])
-
-        # compute angle between skeleton's forward vector and x axis
-        v1 = np.tile(np.array([1.0, 0.0], dtype=np.float32), reps=(self.joint_positions.shape[0], 1))
-        v2 = self.fwd_vectors
-        dot: npt.NDArray[np.float32] = v1[:, 0]*v2[:, 0] + v1[:, 1]*v2[:, 2]
-        det: npt.NDArray[np.float32] = v1[:, 0]*v2[:, 2] - v2[:, 0]*v1[:, 1]
-        angle: npt.NDArray[np.float32] = np.arctan2(det, dot).astype(np.float32)
-        angle %= 2*np.pi
-        angle = np.where(angle < 0.0, angle + 2*np.pi, angle)
-
-        # rotate the skeleton's joint so it faces +X axis
-        for idx in range(self.joint_positions.shape[0]):
-            rot_mat = np.identity(3).astype(np.float32)
-            rot_mat[0, 0] = math.cos(angle[idx])
-            rot_mat[0, 2] = math.sin(angle[idx])
-            rot_mat[2, 0] = -math.sin(angle[idx])
-            rot_mat[2, 2] = math.cos(angle[idx])
-
-            rotated_joints: npt.NDArray[np.float32] = rot_mat @ self.joint_positions[idx].reshape([-1, 3]).T
-            self.joint_positions[idx] = rotated_joints.T.reshape(self.joint_positions[idx].shape)
-
-    def _determine_projection_plane_normal(self, group_name: str, joint_names: List[str], projection_method: str) -> npt.NDArray[np.float32]:
-        """
-        Given a joint_projection_group dictionary object, computes the projection plane normal used for the group.
-        Called during initialization.
-        """
-
-        if projection_method == 'frontal':
-            logging.info(f'{group_name} projection_method is {projection_method}. Using {x_axis}')
-            return x_axis
-        elif projection_method == 'sagittal':
-            logging.info(f'{group_name} projection_method is {projection_method}. Using {z_axis}')
-            return z_axis
-        elif projection_method == 'pca':
-            logging.info(f'{group_name} projection_method is {projection_method}. Running PCA on {joint_names}')
-            pass  # pca code is below
-        else:
-            msg = f'bad project method for {group_name}: {projection_method}'
-            logging.critical(msg)
-            assert False, msg
-
-        # get the xyz locations of joints within this joint_projection_group
-        joints_idxs = [self.bvh_joint_names.index(joint_name) for joint_name in joint_names]
-        joints_mask = np.full(self.joint_positions.shape[1], False, dtype=np.bool8)
-        for idx in joints_idxs:
-            joints_mask[3*idx:3*(idx+1)] = True
-        joints_points = self.joint_positions[:, joints_mask]
-        joints_points = joints_points.reshape([-1, 3])
-
-        # do PCA and get 3rd component
-        pca = PCA()
-        pca.fit(joints_points)
-        pc3: npt.NDArray[np.float32] = pca.components_[2]  # pyright: ignore[reportGeneralTypeIssues]
-
-        # see if it is closer to the x axis or z axis
-        x_cos_sim: float = np.dot(x_axis, pc3) / (np.linalg.norm(x_axis) * np.linalg.norm(pc3))
-        z_cos_sim: float = np.dot(z_axis, pc3) / (np.linalg.norm(z_axis) * np.linalg.norm(pc3))
-
-        # return close of the two
-        if abs(x_cos_sim) > abs(z_cos_sim):
-            logging.info(f'PCA complete. {group_name} using {x_axis}')
-            return x_axis
-        else:
-            logging.info(f'PCA complete. {group_name} using {z_axis}')
-            return z_axis
-
-    def _compute_depths(self) -> Dict[str, npt.NDArray[np.float32]]:
+        # map bvh joint names to its distance to project plane (useful for rendering order). Shared, do not modify.
+        self.bvh_joint_to_projection_depth: Dict[str, npt.NDArray[np.float32]] = self.projection.bvh_joint_to_projection_depth
+
+    @property
+    def motion(self) -> PreprocessedMotion:
+        """ Shared motion data. Retargeters restored from bytes only load it upon first access. """
+        if self._motion is None:
+            self._motion = get_preprocessed_motion(self._motion_cfg)
+        return self._motion
+
+    @property
+    def projection(self) -> MotionProjection:
+        if self._projection is None:
+            self._projection = self.motion.get_projection(self._projection_groups)
+        return self._projection
+
+    def copy_bvh(self) -> BVH:
+        """ Returns a copy of the motion's BVH, which is shared by all retargeters using the motion. """
+        return self.motion.copy_bvh()
+
+    @property
+    def bvh_joint_names(self) -> List[str]:
+        return self.motion.bvh_joint_names
+
+    @property
+    def forward_perp_vector_joint_names(self) -> List[Tuple[str, str]]:
+        return self.motion.forward_perp_vector_joint_names
+
+    @property
+    def joint_positions(self) -> npt.NDArray[np.float32]:
+        return self.motion.joint_positions
+
+    @property
+    def fwd_vectors(self) -> npt.NDArray[np.float32]:
+        return self.motion.fwd_vectors
+
+    @property
+    def bvh_root_positions(self) -> npt.NDArray[np.float32]:
+        return self.motion.bvh_root_positions
+
+    @property
+    def joint_group_name_to_projection_plane(self) -> Dict[str, npt.NDArray[np.float32]]:
+        return self.projection.joint_group_name_to_projection_plane
+
+    @property
+    def joint_to_projection_plane(self) -> Dict[str, npt.NDArray[np.float32]]:
+        return self.projection.joint_to_projection_plane
+
+    def to_bytes(self) -> bytes:
+        """ Serialize the retargeting results, i.e. everything get_retargeted_frame_data() needs. """
+        orientation_names = list(self.char_joint_to_orientation.keys())
+        depth_names = list(self.bvh_joint_to_projection_depth.keys())
+
+        buf = io.BytesIO()
+        np.savez(buf,
+                 frame_time=np.array(self.frame_time),
+                 frame_max_num=np.array(self.frame_max_num),
+                 char_root_positions=self.char_root_positions,
+                 orientation_names=np.array(orientation_names, dtype=np.str_),
+                 orientations=np.array([self.char_joint_to_orientation[name] for name in orientation_names], dtype=np.float32),
+                 depth_names=np.array(depth_names, dtype=np.str_),
+                 depths=np.array([self.bvh_joint_to_projection_depth[name] for name in depth_names], dtype=np.float32))
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, motion_cfg: MotionConfig, retarget_cfg: RetargetConfig, data: bytes) -> Retargeter:
         """
-        For each BVH joint within bvh_projection_mapping_groups, compute distance to projection plane.
-        This distance used if the joint is a char_body_segmentation_groups depth_driver.
+        Restore a retargeter from the output of to_bytes(), without loading the BVH or retargeting.
+        Motion data (the bvh, joint positions, etc.) is loaded only if later accessed.
         """
-
-        bvh_joint_to_projection_depth: Dict[str, npt.NDArray[np.float32]] = {}
-
-        for joint_name in self.bvh_joint_names:
-            joint_idx = self.bvh_joint_names.index(joint_name)
-            joint_xyz = self.joint_positions[:, 3*joint_idx:3*(joint_idx+1)]
-            try:
-                projection_plane_normal = self.joint_to_projection_plane[joint_name]
-            except Exception:
-                msg = f' error finding projection plane for joint_name: {joint_name}'
-                logging.info(msg)
-                continue
-
-            # project bone onto 2D plane
-            if np.array_equal(projection_plane_normal, x_axis):
-                joint_depths = joint_xyz[:, 0]
-            elif np.array_equal(projection_plane_normal, z_axis):
-                joint_depths = joint_xyz[:, 2]
-            else:
-                msg = 'error projection_plane_normal'
+        ret = cls.__new__(cls)
+        ret._motion_cfg = motion_cfg
+        ret._projection_groups = retarget_cfg.bvh_projection_bodypart_groups
+        ret._motion = None
+        ret._projection = None
+        ret.character_start_loc = np.array(retarget_cfg.char_start_loc, dtype=np.float32)
+
+        with np.load(io.BytesIO(data)) as npz:
+            ret.frame_time = float(npz['frame_time'])
+            ret.frame_max_num = int(npz['frame_max_num'])
+            ret.char_root_positions = npz['char_root_positions']
+            ret.char_joint_to_orientation = {str(name): val for name, val in zip(npz['orientation_names'], npz['orientations'])}
+            ret.bvh_joint_to_projection_depth = {str(name): val for name, val in zip(npz['depth_names'], npz['depths'])}
+
+        return ret
+
+    def get_bone_length(self, bvh_prox_joint_name: str, bvh_dist_joint_name: str) -> float:
+        """ Length of the bvh bone between the two joints, measured in the final frame of the motion. """
+        for joint_name in [bvh_prox_joint_name, bvh_dist_joint_name]:
+            if joint_name not in self.bvh_joint_names:
+                msg = f'Could not find BVH joint with name: {joint_name}'
                 logging.critical(msg)
                 assert False, msg
-            bvh_joint_to_projection_depth[joint_name] = joint_depths
 
-        return bvh_joint_to_projection_depth
+        dist_joint_xyz = self.motion.get_joint_xyz(bvh_dist_joint_name)[-1]
+        prox_joint_xyz = self.motion.get_joint_xyz(bvh_prox_joint_name)[-1]
+        return float(np.linalg.norm(np.subtract(dist_joint_xyz, prox_joint_xyz)))
 
     def scale_root_positions_for_character(self, char_to_bvh_scale: float, projection_bodypart_group_for_offset: str) -> None:
         """
@@ -262,14 +178,14 @@ class Retargeter():
         """
 
         # get distal end joint
-        dist_joint = self.bvh.root_joint.get_transform_by_name(bvh_dist_joint_name)
+        dist_joint = self.motion.get_bvh_joint(bvh_dist_joint_name)
         if dist_joint is None or not isinstance(dist_joint, Joint) or dist_joint.name is None:
             msg = 'error finding joint {bvh_dist_joint_name}'
             logging.critical(msg)
             assert False, msg
 
         # get prox joint
-        prox_joint = self.bvh.root_joint.get_transform_by_name(bvh_prox_joint_name)
+        prox_joint = self.motion.get_bvh_joint(bvh_prox_joint_name)
         if prox_joint is None or not isinstance(prox_joint, Joint) or prox_joint.name is None:
             msg = 'joint {bvh_prox_joint_name} has no parent joint, therefore no bone orientation. Returning zero'
             logging.info(msg)
@@ -317,24 +233,35 @@ class Retargeter():
         # save it
         self.char_joint_to_orientation[char_joint_name] = np.array(theta)
 
+    def get_frame_idx(self, time: float) -> int:
+        """ Returns the index of the BVH frame corresponding to time, in seconds, clamped to the valid frame range. """
+        frame_idx = int(round(time / self.frame_time, 0))
+
+        if frame_idx < 0:
+            logging.info(f'invalid frame_idx ({frame_idx}), replacing with 0')
+            frame_idx = 0
+
+        if self.frame_max_num <= frame_idx:
+            logging.info(f'invalid frame_idx ({frame_idx}), replacing with last frame {self.frame_max_num-1}')
+            frame_idx = self.frame_max_num-1
+
+        return frame_idx
+
     def get_retargeted_frame_data(self, time: float) -> Tuple[Dict[str, float], Dict[str, float], npt.NDArray[np.float32]]:
         """
         Input: time, in seconds, used to select the correct BVH frame.
-        Calculate the proper frame and, for it, returns:
+        Calculate the proper frame and, for it, returns the results of get_frame_data().
+        """
+        return self.get_frame_data(self.get_frame_idx(time))
+
+    def get_frame_data(self, frame_idx: int) -> Tuple[Dict[str, float], Dict[str, float], npt.NDArray[np.float32]]:
+        """
+        Input: frame_idx, a valid BVH frame index.
+        For it, returns:
             - orientations, dictionary mapping from character joint names to world orientations (degrees CCW from +Y axis)
             - joint_depths, dictionary mapping from BVH skeleton's joint names to distance from joint to projection plane
             - root_positions, the position of the character's root at this frame.
         """
-        frame_idx = int(round(time / self.bvh.frame_time, 0))
-
-        if frame_idx < 0:
-            logging.info(f'invalid frame_idx ({frame_idx}), replacing with 0')
-            frame_idx = 0
-
-        if self.bvh.frame_max_num <= frame_idx:
-            logging.info(f'invalid frame_idx ({frame_idx}), replacing with last frame {self.bvh.frame_max_num-1}')
-            frame_idx = self.bvh.frame_max_num-1
-
         orientations = {key: val[frame_idx] for (key, val) in self.char_joint_to_orientation.items()}
 
         joint_depths = {key: val[frame_idx] for (key, val) in self.bvh_joint_to_projection_depth.items()}
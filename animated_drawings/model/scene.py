@@ -2,11 +2,16 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+from __future__ import annotations
+from typing import Dict, Optional
+
 from animated_drawings.model.transform import Transform
+from animated_drawings.model.transform_store import TransformStore
 from animated_drawings.model.time_manager import TimeManager
 from animated_drawings.config import SceneConfig
 from animated_drawings.model.floor import Floor
 from animated_drawings.model.animated_drawing import AnimatedDrawing
+from animated_drawings.model.bvh import BVH
 
 
 class Scene(Transform, TimeManager):
@@ -16,23 +21,40 @@ class Scene(Transform, TimeManager):
     It keeps track of global time.
     """
 
-    def __init__(self, cfg: SceneConfig) -> None:
-        """ Takes in the scene dictionary from an mvc config file and prepares the scene. """
+    def __init__(self, cfg: SceneConfig, compiled_from: Optional[Scene] = None) -> None:
+        """
+        Takes in the scene dictionary from an mvc config file and prepares the scene.
+        If compiled_from is given, animated drawings whose character config is used by one of its animated drawings share that one's compiled character.
+        """
         super().__init__()
 
         # add floor if required
         if cfg.add_floor:
             self.add_child(Floor())
 
+        # characters already compiled, by the id of their config
+        compiled: Dict[int, AnimatedDrawing] = {}
+        if compiled_from is not None:
+            compiled = {id(c.char_cfg): c for c in compiled_from.get_children() if isinstance(c, AnimatedDrawing)}
+
+        # bvhs added to visualize, by the id of the motion they're copied from
+        bvhs: Dict[int, BVH] = {}
+
         # Add the Animated Drawings
         for each in cfg.animated_characters:
 
-            ad = AnimatedDrawing(*each)
+            ad = AnimatedDrawing(*each, compiled_from=compiled.get(id(each[0])))
             self.add_child(ad)
 
-            # add bvh to the scene if we're going to visualize it
-            if cfg.add_ad_retarget_bvh:
-                self.add_child(ad.retargeter.bvh)
+            # add bvh to the scene if we're going to visualize it. The motion's bvh is shared across scenes, so the scene animates its own copy,
+            # shared by its characters using the same motion
+            if cfg.add_ad_retarget_bvh and id(ad.retargeter.motion) not in bvhs:
+                bvhs[id(ad.retargeter.motion)] = ad.retargeter.copy_bvh()
+                self.add_child(bvhs[id(ad.retargeter.motion)])
+
+        # flatten the scene graph's transforms into contiguous arrays, if desired
+        if cfg.use_transform_store:
+            TransformStore(self)
 
     def progress_time(self, delta_t: float) -> None:
         """
@@ -50,3 +72,20 @@ class Scene(Transform, TimeManager):
 
         for c in t.get_children():
             self._progress_time(c, delta_t)
+
+    def seek(self, time: float) -> None:
+        """
+        Entry point called to set the time of the scene, and every TimeManager object within it, to time seconds.
+        Unlike progress_time(), the result does not depend upon the previous time, so any frame can be produced directly.
+        """
+        self._seek(self, time)
+
+    def _seek(self, t: Transform, time: float) -> None:
+        """ Recursively calls set_time() and update() on all TimeManager objects. """
+
+        if isinstance(t, TimeManager):
+            t.set_time(time)
+            t.update()
+
+        for c in t.get_children():
+            self._seek(c, time)
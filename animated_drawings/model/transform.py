@@ -8,7 +8,10 @@ import numpy.typing as npt
 from animated_drawings.model.vectors import Vectors
 from animated_drawings.model.quaternions import Quaternions
 import logging
-from typing import Union, Optional, List, Tuple
+from typing import TYPE_CHECKING, Union, Optional, List, Tuple
+
+if TYPE_CHECKING:
+    from animated_drawings.model.transform_store import TransformStore
 
 
 class Transform():
@@ -24,6 +27,10 @@ class Transform():
 
         super().__init__(**kwargs)
 
+        # if set, this transform's matrices are views into a TransformStore, which handles their updates
+        self._store: Optional[TransformStore] = None
+        self._store_idx: int = -1
+
         self._parent: Optional[Transform] = parent
 
         self._children: List[Transform] = []
@@ -41,7 +48,20 @@ class Transform():
 
         self._local_transform: npt.NDArray[np.float32] = np.identity(4, dtype=np.float32)
         self._world_transform: npt.NDArray[np.float32] = np.identity(4, dtype=np.float32)
-        self.dirty_bit: bool = True  # are world/local transforms stale?
+        self._dirty_bit: bool = True  # are world/local transforms stale?
+
+    @property
+    def dirty_bit(self) -> bool:
+        if self._store is not None:
+            return bool(self._store.dirty_bits[self._store_idx])
+        return self._dirty_bit
+
+    @dirty_bit.setter
+    def dirty_bit(self, value: bool) -> None:
+        if self._store is not None:
+            self._store.dirty_bits[self._store_idx] = value
+        else:
+            self._dirty_bit = value
 
     def update_transforms(self, parent_dirty_bit: bool = False, recurse_on_children: bool = True, update_ancestors: bool = False) -> None:
         """
@@ -51,7 +71,12 @@ class Transform():
         If own or parent's dirty bit is set, recurses on children, unless param recurse_on_children is false.
         If update_ancestors is true, first find first ancestor, then call update_transforms upon it.
         Set dirty bit back to false.
+        If the transform belongs to a TransformStore, the store updates all of its stale transforms instead.
         """
+        if self._store is not None:
+            self._store.update()
+            return
+
         if update_ancestors:
             ancestor, ancestor_parent = self, self.get_parent()
             while ancestor_parent is not None:
@@ -70,9 +95,15 @@ class Transform():
         self.dirty_bit = False
 
     def compute_local_transform(self) -> None:
+        if self._store is not None:
+            self._store.compute_local_transform(self._store_idx)
+            return
         self._local_transform = self._translate_m @ self._rotate_m @ self._scale_m
 
     def compute_world_transform(self) -> None:
+        if self._store is not None:
+            self._store.update()
+            return
         self._world_transform = self._local_transform
         if self._parent:
             self._world_transform = self._parent._world_transform @ self._world_transform
@@ -164,7 +195,7 @@ class Transform():
         rotate_m[:-1, 1] = np.squeeze(up.vs)
         rotate_m[:-1, 2] = np.squeeze(fwd.vs)
 
-        self._rotate_m = rotate_m
+        self._rotate_m[...] = rotate_m  # in place, as _rotate_m may be a view into a TransformStore
         self.dirty_bit = True
 
     def get_right_up_fwd_vectors(self) -> Tuple[npt.NDArray[np.float32], npt.NDArray[np.float32], npt.NDArray[np.float32]]:
@@ -180,7 +211,12 @@ class Transform():
             msg = f'set_rotate q must have dimension (1, 4). Found: {q.qs.shape}'
             logging.critical(msg)
             assert False, msg
-        self._rotate_m = q.to_rotation_matrix()
+        self._rotate_m[...] = q.to_rotation_matrix()
+        self.dirty_bit = True
+
+    def set_rotation_matrix(self, rotate_m: npt.NDArray[np.float32]) -> None:
+        """ Set the rotation directly from a 4x4 rotation matrix. Matrix is copied but not validated. """
+        self._rotate_m[...] = rotate_m
         self.dirty_bit = True
 
     def rotation_offset(self, q: Quaternions) -> None:
@@ -188,12 +224,14 @@ class Transform():
             msg = f'set_rotate q must have dimension (1, 4). Found: {q.qs.shape}'
             logging.critical(msg)
             assert False, msg
-        self._rotate_m = (q * Quaternions.from_rotation_matrix(self._rotate_m)).to_rotation_matrix()
+        self._rotate_m[...] = (q * Quaternions.from_rotation_matrix(self._rotate_m)).to_rotation_matrix()
         self.dirty_bit = True
 
     def add_child(self, child: Transform) -> None:
         self._children.append(child)
         child.set_parent(self)
+        if self._store is not None:
+            self._store.set_structure_dirty()
 
     def get_children(self) -> List[Transform]:
         return self._children
@@ -208,6 +246,9 @@ class Transform():
     def get_transform_by_name(self, name: str) -> Optional[Transform]:
         """ Search self and children for transform with matching name. Return it if found, None otherwise. """
 
+        if self._store is not None:
+            return self._store.get_transform_by_name(name, self)
+
         # are we match?
         if self.name == name:
             return self
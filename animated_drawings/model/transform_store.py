@@ -0,0 +1,169 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from __future__ import annotations  # so we can refer to class Type inside class
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+import numpy as np
+import numpy.typing as npt
+
+if TYPE_CHECKING:
+    from animated_drawings.model.transform import Transform
+
+
+class TransformStore():
+    """
+    Flattened storage for every transform in the subtree beneath a root Transform.
+    Translation, rotation, scale, local and world matrices are held in contiguous [N, 4, 4] arrays, in depth-first order.
+    Each Transform's matrices become views into these arrays, so the Transform API continues to work as before.
+    Dirty transforms are tracked per node. On update(), local matrices are recomputed only for dirty nodes,
+    and world matrices only for dirty nodes and their descendants, one depth level at a time using batched matmuls.
+    If the structure of the subtree changes (e.g. add_child is called), the store is rebuilt lazily upon next use.
+    """
+
+    def __init__(self, root: Transform) -> None:
+        self.root: Transform = root
+
+        self.transforms: List[Transform]
+        self.translate_ms: npt.NDArray[np.float32]
+        self.rotate_ms: npt.NDArray[np.float32]
+        self.scale_ms: npt.NDArray[np.float32]
+        self.local_transforms: npt.NDArray[np.float32]
+        self.world_transforms: npt.NDArray[np.float32]
+        self.dirty_bits: npt.NDArray[np.bool_]
+
+        self._parent_idxs: npt.NDArray[np.int32]   # index of each node's parent, -1 for the root
+        self._subtree_ends: npt.NDArray[np.int32]  # a node's descendants occupy the indices [idx+1, subtree_end)
+        self._levels: List[npt.NDArray[np.int32]]  # node indices, grouped by depth
+        self._name_to_idxs: Dict[str, List[int]]
+
+        self._structure_dirty_bit: bool = True
+        self._build()
+
+    def _build(self) -> None:
+        """ Flatten the subtree into depth-first order and make every Transform a view over the store's arrays. """
+
+        transforms: List[Transform] = []
+        parent_idxs: List[int] = []
+        depths: List[int] = []
+        subtree_ends: List[int] = []
+
+        stack = [(self.root, -1, 0)]
+        while stack:
+            t, parent_idx, depth = stack.pop()
+            transforms.append(t)
+            parent_idxs.append(parent_idx)
+            depths.append(depth)
+            subtree_ends.append(-1)  # filled in below
+            idx = len(transforms) - 1
+            for c in reversed(t.get_children()):
+                stack.append((c, idx, depth + 1))
+
+        # a node's subtree ends where the next node of equal or lesser depth begins
+        open_idxs: List[int] = []
+        for idx, depth in enumerate(depths):
+            while open_idxs and depths[open_idxs[-1]] >= depth:
+                subtree_ends[open_idxs.pop()] = idx
+            open_idxs.append(idx)
+        for idx in open_idxs:
+            subtree_ends[idx] = len(transforms)
+
+        node_num = len(transforms)
+        self.translate_ms = np.empty([node_num, 4, 4], dtype=np.float32)
+        self.rotate_ms = np.empty([node_num, 4, 4], dtype=np.float32)
+        self.scale_ms = np.empty([node_num, 4, 4], dtype=np.float32)
+        self.local_transforms = np.empty([node_num, 4, 4], dtype=np.float32)
+        self.world_transforms = np.empty([node_num, 4, 4], dtype=np.float32)
+        self.dirty_bits = np.ones(node_num, dtype=np.bool_)
+
+        self._name_to_idxs = {}
+        for idx, t in enumerate(transforms):
+            # a transform can only be a view over one store. If another store had it, that store must rebuild before its next use.
+            if t._store is not None and t._store is not self:
+                t._store._structure_dirty_bit = True
+
+            self.translate_ms[idx] = t._translate_m
+            self.rotate_ms[idx] = t._rotate_m
+            self.scale_ms[idx] = t._scale_m
+            self.local_transforms[idx] = t._local_transform
+            self.world_transforms[idx] = t._world_transform
+
+            t._translate_m = self.translate_ms[idx]
+            t._rotate_m = self.rotate_ms[idx]
+            t._scale_m = self.scale_ms[idx]
+            t._local_transform = self.local_transforms[idx]
+            t._world_transform = self.world_transforms[idx]
+            t._store = self
+            t._store_idx = idx
+
+            if t.name is not None:
+                self._name_to_idxs.setdefault(t.name, []).append(idx)
+
+        self.transforms = transforms
+        self._parent_idxs = np.array(parent_idxs, dtype=np.int32)
+        self._subtree_ends = np.array(subtree_ends, dtype=np.int32)
+
+        depths_np = np.array(depths, dtype=np.int32)
+        self._levels = [np.flatnonzero(depths_np == depth).astype(np.int32) for depth in range(max(depths) + 1)]
+
+        self._structure_dirty_bit = False
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """ Unpickled transforms hold copies of the matrices, not views of the store's arrays, so rebuild upon next use. """
+        self.__dict__.update(state)
+        self._structure_dirty_bit = True
+
+    def set_structure_dirty(self) -> None:
+        """ Called when a transform within the store gains a child. """
+        self._structure_dirty_bit = True
+
+    def update(self) -> None:
+        """ Recompute stale local matrices, then the world matrices of all stale nodes and their descendants. """
+        if self._structure_dirty_bit:
+            self._build()
+
+        dirty_idxs = np.flatnonzero(self.dirty_bits)
+        if len(dirty_idxs) == 0:
+            return
+
+        self.local_transforms[dirty_idxs] = self.translate_ms[dirty_idxs] @ self.rotate_ms[dirty_idxs] @ self.scale_ms[dirty_idxs]
+
+        # a node's world matrix is stale if it, or any of its ancestors, is dirty
+        marks = np.zeros(len(self.transforms) + 1, dtype=np.int32)
+        np.add.at(marks, dirty_idxs, 1)
+        np.add.at(marks, self._subtree_ends[dirty_idxs], -1)
+        world_dirty = np.cumsum(marks[:-1]) > 0
+
+        for depth, level_idxs in enumerate(self._levels):
+            idxs = level_idxs[world_dirty[level_idxs]]
+            if len(idxs) == 0:
+                continue
+
+            if depth == 0:
+                root_parent: Optional[Transform] = self.root.get_parent()
+                if root_parent is None:
+                    self.world_transforms[idxs] = self.local_transforms[idxs]
+                else:
+                    self.world_transforms[idxs] = root_parent.get_world_transform() @ self.local_transforms[idxs]
+            else:
+                self.world_transforms[idxs] = self.world_transforms[self._parent_idxs[idxs]] @ self.local_transforms[idxs]
+
+        self.dirty_bits[dirty_idxs] = False
+
+    def compute_local_transform(self, idx: int) -> None:
+        """ Recompute a single node's local matrix in place, leaving it marked dirty so its world matrix is updated later. """
+        if self._structure_dirty_bit:
+            self._build()
+        np.matmul(self.translate_ms[idx] @ self.rotate_ms[idx], self.scale_ms[idx], out=self.local_transforms[idx])
+
+    def get_transform_by_name(self, name: str, subtree_root: Transform) -> Optional[Transform]:
+        """ Return the first transform, in depth-first order, within subtree_root's subtree whose name matches. None otherwise. """
+        if self._structure_dirty_bit:
+            self._build()
+
+        start: int = subtree_root._store_idx
+        end: int = int(self._subtree_ends[start])
+        for idx in self._name_to_idxs.get(name, []):
+            if start <= idx < end:
+                return self.transforms[idx]
+        return None
@@ -3,6 +3,7 @@
 # LICENSE file in the root directory of this source tree.
 
 from animated_drawings.model.transform import Transform
+from animated_drawings.view import gl_resources
 import numpy as np
 import numpy.typing as npt
 import OpenGL.GL as GL
@@ -29,7 +30,7 @@ class TransformWidget(Transform):
 
     def _initialize_opengl_resources(self):
         self.vao = GL.glGenVertexArrays(1)
-        self.vbo = GL.glGenBuffers(1)
+        self.vbo = gl_resources.gen_buffer()
 
         GL.glBindVertexArray(self.vao)
 
@@ -18,6 +18,8 @@ class Vectors():
     When passing in existing Vectors, new Vectors object will share the underlying nparray, so be careful.
     """
 
+    __slots__ = ('vs',)
+
     def __init__(self, vs_: Union[Iterable[Union[float, int, Vectors, npt.NDArray[np.float32]]], Vectors]) -> None:  # noqa: C901
 
         self.vs: npt.NDArray[np.float32]
@@ -69,6 +71,16 @@ class Vectors():
             logging.critical(msg)
             assert False, msg
 
+    @classmethod
+    def from_array_unchecked(cls, vs: npt.NDArray[np.float32]) -> Vectors:
+        """
+        Fast path constructor for hot loops. Wraps vs without validating it.
+        Caller must ensure vs has shape [N, dim]. The array is shared, not copied.
+        """
+        ret_v = cls.__new__(cls)
+        ret_v.vs = vs
+        return ret_v
+
     def norm(self) -> None:
         ns: npt.NDArray[np.float64] = np.linalg.norm(self.vs, axis=-1)
 
@@ -0,0 +1,48 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+On-disk cache of the outputs of the image to animation pipeline's stages:
+detection and pose estimation results, keyed by the image sent to the model, segmentation masks, keyed by the cropped character,
+and, in the render service, rendered videos, keyed by the character, motion, retarget, and view configs.
+Together with the character and retarget caches, a resubmitted image, or a new motion for the same drawing,
+only runs the stages whose inputs changed.
+"""
+
+import json
+from functools import partial
+from typing import Any, Callable, Optional, Union
+
+import numpy as np
+import numpy.typing as npt
+
+from animated_drawings.content_store import ContentStore, get_content_store_from_env
+
+PIPELINE_CACHE_VERSION = '1'
+
+DEFAULT_PIPELINE_CACHE_MAX_BYTES = 4 * 1024 ** 3
+
+get_pipeline_cache: Callable[[], Optional[ContentStore]] = partial(get_content_store_from_env, 'PIPELINE_CACHE', DEFAULT_PIPELINE_CACHE_MAX_BYTES)
+
+
+def get_stage_key(stage: str, *inputs: Union[str, bytes, npt.NDArray[Any]]) -> str:
+    """ Key identifying the output of stage given its inputs. Arrays are identified by their shape, dtype, and contents. """
+    parts = [PIPELINE_CACHE_VERSION, stage]
+    for x in inputs:
+        if isinstance(x, np.ndarray):
+            parts.extend([json.dumps([x.shape, x.dtype.str]), np.ascontiguousarray(x).tobytes()])
+        else:
+            parts.append(x)
+    return ContentStore.key(*parts)
+
+
+def cached(cache: Optional[ContentStore], key: str, compute: Callable[[], bytes]) -> bytes:
+    """ Returns the blob stored under key, if cache is enabled and has one. Otherwise, computes it and stores it. """
+    if cache is None:
+        return compute()
+    data = cache.get(key)
+    if data is None:
+        data = compute()
+        cache.put(key, data)
+    return data
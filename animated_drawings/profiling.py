@@ -0,0 +1,150 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Lightweight, opt-in timing of named spans of work.
+Code is instrumented with `with profiling.span('name'):` blocks.
+Spans are passed to every registered recorder when they end. If no recorders are registered, span() returns a shared
+object whose __enter__ and __exit__ do nothing, so instrumentation costs almost nothing when profiling is disabled.
+Recorders are StageTimer, which summarizes span durations, and ChromeTracer, which saves a timeline of spans.
+"""
+
+from __future__ import annotations
+import os
+import json
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, DefaultDict, Dict, List, Union
+
+import numpy as np
+
+
+class Recorder(ABC):
+    """ Base class of objects that receive finished spans. """
+
+    @abstractmethod
+    def record(self, name: str, start: float, end: float) -> None:
+        """ Called when the span named name ends. start and end are time.perf_counter() values, in seconds. """
+
+
+class StageTimer(Recorder):
+    """ Collects the duration of every span, grouped by name, and summarizes them. """
+
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self) -> None:
+        self.durations: DefaultDict[str, List[float]] = defaultdict(list)
+
+    def record(self, name: str, start: float, end: float) -> None:
+        self.durations[name].append(end - start)
+
+    def clear(self) -> None:
+        self.durations.clear()
+
+    def get_stats(self, name: str) -> Dict[str, Union[int, float]]:
+        """ Returns the count, total, mean, max and percentiles of the named span's durations. All times are in milliseconds. """
+        durations_ms = 1000.0 * np.array(self.durations.get(name, []), dtype=np.float64)
+        if len(durations_ms) == 0:
+            return {'count': 0}
+
+        stats: Dict[str, Union[int, float]] = {
+            'count': len(durations_ms),
+            'total_ms': float(durations_ms.sum()),
+            'mean_ms': float(durations_ms.mean()),
+        }
+        for percentile, value in zip(self.PERCENTILES, np.percentile(durations_ms, self.PERCENTILES)):
+            stats[f'p{percentile}_ms'] = float(value)
+        stats['max_ms'] = float(durations_ms.max())
+        return stats
+
+    def get_all_stats(self, prefix: str = '') -> Dict[str, Dict[str, Union[int, float]]]:
+        """ Returns get_stats() of every span whose name begins with prefix, keyed by the remainder of the name. """
+        return {name[len(prefix):]: self.get_stats(name) for name in sorted(self.durations) if name.startswith(prefix)}
+
+
+class ChromeTracer(Recorder):
+    """
+    Records every span as a complete event in the Chrome trace event format, viewable in chrome://tracing or ui.perfetto.dev.
+    Each event records the process and thread it ran on, so work on other threads appears on its own track.
+    """
+
+    def __init__(self) -> None:
+        self.start: float = time.perf_counter()
+        self.events: List[Dict[str, Any]] = [{
+            'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'tid': threading.get_ident(),
+            'args': {'name': 'animated_drawings'},
+        }]
+
+    def record(self, name: str, start: float, end: float) -> None:
+        self.events.append({
+            'name': name,
+            'ph': 'X',
+            'ts': 1e6 * (start - self.start),  # microseconds
+            'dur': 1e6 * (end - start),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+        })
+
+    def save(self, output_path: Union[str, Path]) -> None:
+        output_p = Path(output_path)
+        output_p.parent.mkdir(exist_ok=True, parents=True)
+        with open(output_p, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+
+class _Span():
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.start: float = 0.0
+
+    def __enter__(self) -> _Span:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        end = time.perf_counter()
+        for recorder in _recorders:
+            recorder.record(self.name, self.start, end)
+
+
+class _NullSpan():
+    __slots__ = ()
+
+    def __enter__(self) -> _NullSpan:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+_recorders: List[Recorder] = []
+
+
+def span(name: str) -> Union[_Span, _NullSpan]:
+    """ Returns a context manager timing the enclosed block as the span called name. """
+    if not _recorders:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def is_enabled() -> bool:
+    """ Whether any recorders are registered. """
+    return bool(_recorders)
+
+
+def add_recorder(recorder: Recorder) -> None:
+    if recorder not in _recorders:
+        _recorders.append(recorder)
+
+
+def remove_recorder(recorder: Recorder) -> None:
+    if recorder in _recorders:
+        _recorders.remove(recorder)
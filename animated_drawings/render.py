@@ -2,30 +2,161 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
+from __future__ import annotations
 import logging
+import os
 import sys
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    from animated_drawings.config import Config
+    from animated_drawings.model.scene import Scene
+    from animated_drawings.view.view import View
 
 
-def start(user_mvc_cfg_fn: str):
+def start(user_mvc_cfg: Union[str, Dict[str, Any]]):
+    """ Renders according to user_mvc_cfg, either the filepath of an mvc config file or a dict with the same contents. """
 
     # build cfg
     from animated_drawings.config import Config
-    cfg: Config = Config(user_mvc_cfg_fn)
+    cfg: Config = Config(user_mvc_cfg)
 
-    # create view
-    from animated_drawings.view.view import View
-    view = View.create_view(cfg.view)
+    _run(cfg)
 
-    # create scene
-    from animated_drawings.model.scene import Scene
-    scene = Scene(cfg.scene)
 
-    # create controller
-    from animated_drawings.controller.controller import Controller
-    controller = Controller.create_controller(cfg.controller, scene, view)
+def render_to_file(output_file: BinaryIO,
+                   scene: Dict[str, Any],
+                   view: Optional[Dict[str, Any]] = None,
+                   controller: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Renders a video and writes it to output_file, a binary file-like object, without reading or writing config files.
+    scene, view, and controller contain the options of the corresponding sections of an mvc config file.
+    Characters, motions and retargeting in scene['ANIMATED_CHARACTERS'] may be given as filepaths, dicts, or config objects.
+    Character dicts contain their texture and mask images, so nothing needs to be on disk. See CharacterConfig.
+    The video format is determined by the extension of controller['OUTPUT_VIDEO_PATH'], but nothing is written to that path.
+    """
+    _run(get_video_render_cfg(scene, view, controller), output_file)
+
+
+def render_to_bytes(scene: Dict[str, Any],
+                    view: Optional[Dict[str, Any]] = None,
+                    controller: Optional[Dict[str, Any]] = None) -> bytes:
+    """ Renders a video, as render_to_file() does, and returns the encoded video. """
+    import io
+    output_file = io.BytesIO()
+    render_to_file(output_file, scene, view, controller)
+    return output_file.getvalue()
+
+
+def render_motions(character: Union[str, Dict[str, Any]],
+                   motions: Sequence[Tuple[Any, Any]],
+                   view: Optional[Dict[str, Any]] = None,
+                   controller: Optional[Dict[str, Any]] = None) -> List[bytes]:
+    """
+    Renders one character with each of motions, a sequence of (motion config, retarget config) pairs, and returns the encoded videos, in order.
+    The character is built once and every video is rendered in the same headless OpenGL context, so N motions cost
+    little more than one character setup plus N renders. See RenderWorker.render_motions().
+    """
+    from animated_drawings.render_worker import RenderWorker
+    worker = RenderWorker()
+    try:
+        return worker.render_motions(character, motions, view, controller)
+    finally:
+        worker.cleanup()
+
+
+def get_video_render_cfg(scene: Dict[str, Any],
+                         view: Optional[Dict[str, Any]] = None,
+                         controller: Optional[Dict[str, Any]] = None) -> Config:
+    """ Returns the config of a video render, given the options of the scene, view, and controller sections of an mvc config file. """
+    from animated_drawings.config import Config
+    return Config({'scene': scene, 'view': view or {}, 'controller': {**(controller or {}), 'MODE': 'video_render'}})
+
+
+def _run(cfg: Config, output_file: Optional[BinaryIO] = None) -> None:
+    """ Creates the view, scene, and controller specified by cfg, then runs the controller. """
+
+    # if requested, record a timeline of where time was spent
+    from animated_drawings import profiling
+    tracer: Optional[profiling.ChromeTracer] = None
+    stage_timer: Optional[profiling.StageTimer] = None
+    trace_output_path: Optional[str] = cfg.controller.trace_output_path or os.environ.get('AD_TRACE_PATH')
+    if trace_output_path:
+        tracer = profiling.ChromeTracer()
+        profiling.add_recorder(tracer)
+
+    try:
+        # create view. Meshes are exported without rendering, so no view is needed
+        from animated_drawings.view.view import View
+        view: Optional[View] = None
+        if cfg.controller.mode != 'mesh_export':
+            with profiling.span('view_init'):
+                view = View.create_view(cfg.view)
+
+        # when benchmarking, time the stages of scene creation too
+        if cfg.controller.mode == 'benchmark':
+            stage_timer = profiling.StageTimer()
+            profiling.add_recorder(stage_timer)
+
+        # create scene
+        from animated_drawings.model.scene import Scene
+        with profiling.span('scene_init'):
+            scene = Scene(cfg.scene)
+
+        # create controller
+        from animated_drawings.controller.controller import Controller
+        with profiling.span('controller_init'):
+            controller = Controller.create_controller(cfg.controller, scene, view, output_file, stage_timer)
+
+        # start the run loop
+        controller.run()
+
+    finally:
+        if stage_timer is not None:
+            profiling.remove_recorder(stage_timer)
+
+        # save the trace even if rendering failed, as that's when it's most useful
+        if tracer is not None and trace_output_path:
+            profiling.remove_recorder(tracer)
+            tracer.save(trace_output_path)
+            logging.info(f'Wrote trace to {trace_output_path}')
+
+
+def render_frames(scene: Scene, view: View, frame_idxs: Iterable[int], delta_t: Optional[float] = None) -> npt.NDArray[np.uint8]:
+    """
+    Renders the scene at each of frame_idxs and returns the frames as an [N, height, width, 4] array of RGBA values, rows ordered top to bottom.
+    Frame i is rendered at time i * delta_t seconds. If delta_t is None, the frame time of the first character's motion is used.
+    The scene is seeked directly to each frame, so frames can be requested in any order at the same cost.
+    As with render.start(), the view must be created before the scene.
+    """
+    import numpy as np
+    from OpenGL import GL
+    from animated_drawings.model.animated_drawing import AnimatedDrawing
+    from animated_drawings.controller.video_render_controller import read_frame
+
+    if delta_t is None:
+        frame_times = [c.retargeter.frame_time for c in scene.get_children() if isinstance(c, AnimatedDrawing)]
+        if not frame_times:
+            msg = 'delta_t must be specified when rendering a scene without animated drawings'
+            logging.critical(msg)
+            assert False, msg
+        delta_t = frame_times[0]
+
+    frame_idxs = list(frame_idxs)
+    width, height = view.get_framebuffer_size()
+    frames = np.empty([len(frame_idxs), height, width, 4], dtype=np.uint8)
+    frame_data = np.empty([height, width, 4], dtype=np.uint8)
+    for idx, frame_idx in enumerate(frame_idxs):
+        scene.seek(frame_idx * delta_t)
+        view.clear_window()
+        scene.update_transforms()
+        view.render(scene)
+        read_frame(width, height, frame_data, GL.GL_RGBA)
+        frames[idx] = frame_data[::-1]
 
-    # start the run loop
-    controller.run()
+    return frames
 
 
 if __name__ == '__main__':
@@ -0,0 +1,127 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Long-lived renderer for processes that render many videos, such as a render service.
+render.start() creates, and destroys, an OSMesa context for every render, compiling shaders and uploading background images each time.
+A RenderWorker keeps one headless view per window size, with its context, shaders, background textures and OpenGL buffers,
+so that rendering a job only costs the work specific to its scene.
+"""
+
+from __future__ import annotations
+import io
+import logging
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, List, Optional, Sequence, Tuple, Union
+
+from animated_drawings import profiling
+
+if TYPE_CHECKING:
+    from animated_drawings.config import CharacterConfig, Config, ViewConfig
+    from animated_drawings.model.scene import Scene
+    from animated_drawings.view.mesa_view import MesaView
+
+
+class RenderWorker():
+    """
+    Renders a stream of video render jobs within this process, reusing OpenGL state between them.
+    Jobs are rendered one at a time. To render jobs in parallel, use one RenderWorker per process.
+    """
+
+    def __init__(self) -> None:
+        self.views: Dict[Tuple[int, int], MesaView] = {}  # by window dimensions
+        self.jobs_rendered: int = 0
+
+    def get_view(self, view_cfg: ViewConfig) -> MesaView:
+        """ Returns the view for view_cfg's window dimensions, reset to view_cfg, creating it if this is the first job of that size. """
+        from animated_drawings.view.mesa_view import MesaView
+
+        window_dimensions: Tuple[int, int] = (view_cfg.window_dimensions[0], view_cfg.window_dimensions[1])
+        view: Optional[MesaView] = self.views.get(window_dimensions)
+        if view is None:
+            view = MesaView(view_cfg, persistent=True)
+            self.views[window_dimensions] = view
+        else:
+            view.reset(view_cfg)
+        return view
+
+    def warm_up(self, view: Optional[Dict[str, Any]] = None) -> None:
+        """ Creates the view for the view options given, as in render_to_bytes(), so that it's ready before the first job arrives. """
+        from animated_drawings.render import get_video_render_cfg
+        self.get_view(get_video_render_cfg({'ANIMATED_CHARACTERS': []}, view).view)
+
+    def render(self, cfg: Config, output_file: Optional[BinaryIO] = None, compiled_from: Optional[Scene] = None) -> Scene:
+        """
+        Renders the video specified by cfg, which must be in video_render mode, to output_file, or, if None, to OUTPUT_VIDEO_PATH.
+        Frames are always rendered by this process, using its existing context, so cfg's RENDER_WORKERS is set to 1.
+        Characters already compiled for compiled_from, a scene previously rendered, aren't compiled again. See Scene.
+        Returns the scene rendered.
+        """
+        if cfg.controller.mode != 'video_render':
+            msg = f'RenderWorker only renders in video_render mode, not {cfg.controller.mode}'
+            logging.critical(msg)
+            assert False, msg
+        cfg.controller.render_workers = 1
+
+        with profiling.span('view_init'):
+            view = self.get_view(cfg.view)
+
+        from animated_drawings.model.scene import Scene
+        with profiling.span('scene_init'):
+            scene = Scene(cfg.scene, compiled_from)
+
+        try:
+            from animated_drawings.controller.controller import Controller
+            with profiling.span('controller_init'):
+                controller = Controller.create_controller(cfg.controller, scene, view, output_file)
+            controller.run()
+        finally:
+            # the controller releases the scene's resources when it finishes, but not if rendering failed
+            view.cleanup()
+
+        self.jobs_rendered += 1
+        return scene
+
+    def render_to_bytes(self,
+                        scene: Dict[str, Any],
+                        view: Optional[Dict[str, Any]] = None,
+                        controller: Optional[Dict[str, Any]] = None) -> bytes:
+        """ Renders a video, as render.render_to_bytes() does, and returns the encoded video. """
+        from animated_drawings.render import get_video_render_cfg
+        output_file = io.BytesIO()
+        self.render(get_video_render_cfg(scene, view, controller), output_file)
+        return output_file.getvalue()
+
+    def render_motions(self,
+                       character: Union[str, Dict[str, Any], CharacterConfig],
+                       motions: Sequence[Tuple[Any, Any]],
+                       view: Optional[Dict[str, Any]] = None,
+                       controller: Optional[Dict[str, Any]] = None) -> List[bytes]:
+        """
+        Renders character driven by each of motions, a sequence of (motion config, retarget config) pairs, and returns the encoded videos, in order.
+        Configs may be given as filepaths, dicts, or config objects, as in render_to_bytes(); view and controller apply to every video.
+        The character's mask, texture, mesh, and ARAP solver are built once, for the first motion, and shared by the others.
+        """
+        from animated_drawings.config import CharacterConfig
+        from animated_drawings.render import get_video_render_cfg
+
+        # the same config object is used in every scene, which is how scenes recognize the character as already compiled
+        if not isinstance(character, CharacterConfig):
+            character = CharacterConfig.from_file(character) if isinstance(character, str) else CharacterConfig(character)
+
+        videos: List[bytes] = []
+        scene: Optional[Scene] = None
+        for motion_cfg, retarget_cfg in motions:
+            output_file = io.BytesIO()
+            cfg = get_video_render_cfg({'ANIMATED_CHARACTERS': [{'character_cfg': character, 'motion_cfg': motion_cfg, 'retarget_cfg': retarget_cfg}]},
+                                       view, controller)
+            scene = self.render(cfg, output_file, scene)
+            videos.append(output_file.getvalue())
+        return videos
+
+    def cleanup(self) -> None:
+        """ Destroys the contexts of all views. The worker can still be used afterwards, but will need to create new views. """
+        for view in self.views.values():
+            view.make_current()
+            view.destroy()
+        self.views.clear()
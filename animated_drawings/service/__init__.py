@@ -0,0 +1,7 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Local HTTP render service. Run with `python -m animated_drawings.service`; see server.py for its endpoints.
+"""
@@ -0,0 +1,33 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import argparse
+import logging
+
+from animated_drawings.annotation import DEFAULT_TORCHSERVE_URL
+from animated_drawings.service.server import DEFAULT_PORT, serve
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves render jobs over HTTP.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=1, help='number of render worker processes')
+    parser.add_argument('--max-queued-jobs', type=int, default=16, help='jobs waiting beyond this are rejected with 429')
+    parser.add_argument('--max-finished-jobs', type=int, default=100, help='number of finished jobs whose results are kept')
+    parser.add_argument('--job-timeout', type=float, default=600.0, help='seconds after which a running job marks the workers unhealthy')
+    parser.add_argument('--db', default='render_jobs.sqlite3', help='SQLite database recording jobs, e.g. on a persistent volume. Unfinished jobs resume on restart')
+    parser.add_argument('--shutdown-timeout', type=float, default=25.0, help='seconds running jobs are given to finish on SIGTERM')
+    parser.add_argument('--torchserve-url', default=DEFAULT_TORCHSERVE_URL, help='used to annotate submitted images')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    serve(args.host, args.port, args.shutdown_timeout,
+          workers=args.workers,
+          max_queued_jobs=args.max_queued_jobs,
+          max_finished_jobs=args.max_finished_jobs,
+          job_timeout=args.job_timeout,
+          torchserve_url=args.torchserve_url,
+          db_path=args.db)
@@ -0,0 +1,161 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Stand-in for the torchserve inference api, for measuring the pipeline without the torchserve container and its models.
+Answers the drawn humanoid detector and pose estimator with deterministic outputs computed from the image sent:
+the detector returns the bounding box of the image's dark pixels, and the pose estimator a canned skeleton scaled to the image.
+Each model has a fixed number of workers, and each prediction takes a configurable latency, to approximate the real models' load.
+Run with:
+    python -m animated_drawings.service.fake_torchserve [--port 8080] [--detector-latency 0.2] [--pose-latency 0.1]
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from animated_drawings.service.protocol import HTTPError, Request, Response, json_response, read_request, write_response
+from animated_drawings.torchserve_client import DEFAULT_TORCHSERVE_URL, DETECTOR_MODEL, POSE_ESTIMATOR_MODEL
+
+DEFAULT_PORT = int(DEFAULT_TORCHSERVE_URL.rsplit(':', 1)[1])
+
+# COCO keypoints of a person standing with arms out, as fractions of the bounding box width and height
+CANNED_KEYPOINTS = [
+    (0.50, 0.10),  # nose
+    (0.47, 0.08), (0.53, 0.08),  # eyes
+    (0.44, 0.10), (0.56, 0.10),  # ears
+    (0.38, 0.25), (0.62, 0.25),  # shoulders
+    (0.24, 0.38), (0.76, 0.38),  # elbows
+    (0.10, 0.48), (0.90, 0.48),  # wrists
+    (0.42, 0.55), (0.58, 0.55),  # hips
+    (0.40, 0.74), (0.60, 0.74),  # knees
+    (0.38, 0.92), (0.62, 0.92),  # ankles
+]
+
+
+def detect(img: npt.NDArray[np.uint8]) -> List[Dict[str, Any]]:
+    """ Returns a single detection: the bounding box of the image's dark pixels, padded by 5%. No detections if there are none. """
+    ys, xs = np.nonzero(np.min(img, axis=2) < 128)
+    if len(xs) == 0:
+        return []
+    h, w = img.shape[:2]
+    pad_x, pad_y = 0.05 * (xs.max() - xs.min() + 1), 0.05 * (ys.max() - ys.min() + 1)
+    bbox = [max(0.0, xs.min() - pad_x), max(0.0, ys.min() - pad_y), min(float(w), xs.max() + 1 + pad_x), min(float(h), ys.max() + 1 + pad_y)]
+    return [{'class_name': 'drawn_humanoid', 'bbox': [float(x) for x in bbox], 'score': 0.99}]
+
+
+def estimate_pose(img: npt.NDArray[np.uint8]) -> List[Dict[str, Any]]:
+    """ Returns a single skeleton: the canned keypoints, scaled to the image. """
+    h, w = img.shape[:2]
+    return [{'keypoints': [[x * w, y * h, 0.9] for x, y in CANNED_KEYPOINTS]}]
+
+
+def _read_image(request: Request) -> npt.NDArray[np.uint8]:
+    """ Decodes the image sent as the 'data' field of a multipart form, as TorchserveClient does, or as the request body. """
+    import cv2
+
+    data = request.body
+    if request.content_type == 'multipart/form-data':
+        from email.parser import BytesParser
+        from email.policy import HTTP
+
+        content_type = request.headers['content-type'].encode('latin-1')
+        message = BytesParser(policy=HTTP).parsebytes(b'Content-Type: ' + content_type + b'\r\n\r\n' + request.body)
+        parts = [part for part in message.iter_parts() if part.get_param('name', header='content-disposition') == 'data']
+        if not parts:
+            raise HTTPError(400, 'no data field in form')
+        data = parts[0].get_payload(decode=True)
+
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise HTTPError(400, 'could not decode image')
+    return img
+
+
+class FakeTorchserve():
+    """ Serves the models with workers concurrent predictions each, taking detector_latency and pose_latency seconds. """
+
+    def __init__(self, detector_latency: float = 0.0, pose_latency: float = 0.0, workers: int = 4) -> None:
+        self.latencies: Dict[str, float] = {DETECTOR_MODEL: detector_latency, POSE_ESTIMATOR_MODEL: pose_latency}
+        self.workers: int = workers
+        self.request_counts: Dict[str, int] = {DETECTOR_MODEL: 0, POSE_ESTIMATOR_MODEL: 0}
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    async def start(self, host: str = '0.0.0.0', port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        self._semaphores = {model_name: asyncio.Semaphore(self.workers) for model_name in self.latencies}
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        logging.info(f'Fake torchserve listening on {host}:{port}')
+        return self.server
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def handle_request(self, request: Request) -> Response:
+        parts = [p for p in request.path.split('/') if p]
+
+        if parts == ['ping']:
+            return json_response(200, {'status': 'Healthy'})
+
+        if len(parts) == 2 and parts[0] == 'predictions' and parts[1] in self.latencies:
+            if request.method != 'POST':
+                raise HTTPError(405, 'use POST')
+            model_name = parts[1]
+            self.request_counts[model_name] += 1
+            img = _read_image(request)
+            async with self._semaphores[model_name]:
+                await asyncio.sleep(self.latencies[model_name])
+                return json_response(200, detect(img) if model_name == DETECTOR_MODEL else estimate_pose(img))
+
+        raise HTTPError(404, f'no such endpoint: {request.path}')
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await read_request(reader, writer, 100 * 1024 * 1024)
+                    if request is None:
+                        break
+                    keep_alive = request.keep_alive
+                    response = await self.handle_request(request)
+                except HTTPError as e:
+                    response = json_response(e.status, {'code': e.status, 'message': e.message})
+                await write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serves fake drawn humanoid detector and pose estimator predictions.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--detector-latency', type=float, default=0.0, help='seconds each detection takes')
+    parser.add_argument('--pose-latency', type=float, default=0.0, help='seconds each pose estimation takes')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent predictions per model')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def _serve() -> None:
+        fake = FakeTorchserve(args.detector_latency, args.pose_latency, args.workers)
+        server = await fake.start(args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(_serve())
+    except KeyboardInterrupt:
+        pass
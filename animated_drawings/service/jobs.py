@@ -0,0 +1,335 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Render jobs: parsing their specification from requests, and running them within render worker processes.
+
+A job spec is a plain, picklable dict sent to a worker process:
+    'image': bytes of an image containing a drawn character, to be annotated by torchserve, or
+    'character': the name of a bundled example character, or a dict with 'char_cfg' (skeleton, width, height),
+                 and 'texture' and 'mask', the bytes of encoded images
+    'motion': name of a bundled motion config
+    'retarget': name of a bundled retarget config, which fits the motion's BVH skeleton
+    'format': 'gif' or 'mp4'
+"""
+
+import base64
+import binascii
+import io
+import json
+import logging
+import time
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from animated_drawings.content_store import ContentStore
+from animated_drawings.utils import resolve_package_path
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+OUTPUT_CONTENT_TYPES = {'gif': 'image/gif', 'mp4': 'video/mp4'}
+DEFAULT_MOTION = 'dab'
+DEFAULT_RETARGET = 'fair1_ppf'
+DEFAULT_FORMAT = 'gif'
+
+# retarget configs used by default for bundled motions whose BVH skeletons DEFAULT_RETARGET doesn't fit
+MOTION_RETARGETS = {
+    'jumping_jacks': 'cmu1_pfp',
+    'jesse_dance': 'mixamo_fff',
+}
+
+
+# stages of a job, each recorded once completed, so that an interrupted job resumes after the last one
+ANNOTATED = 'annotated'  # the character has been annotated, for jobs submitted with an image
+RENDERED = 'rendered'
+
+
+class Job():
+
+    def __init__(self, spec: Dict[str, Any], job_id: Optional[str] = None, input_hash: Optional[str] = None) -> None:
+        self.job_id: str = job_id or uuid.uuid4().hex
+        self.spec: Dict[str, Any] = spec
+        self.input_hash: str = input_hash or spec_hash(spec)
+        self.format: str = spec['format']
+        self.status: str = QUEUED
+        self.stage: Optional[str] = None  # the last stage completed
+        self.error: Optional[str] = None
+        self.created_time: float = time.time()
+        self.started_time: Optional[float] = None
+        self.finished_time: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    @property
+    def content_type(self) -> str:
+        return OUTPUT_CONTENT_TYPES[self.format]
+
+    def to_dict(self) -> Dict[str, Any]:
+        d: Dict[str, Any] = {
+            'job_id': self.job_id,
+            'status': self.status,
+            'stage': self.stage,
+            'created': self.created_time,
+            'started': self.started_time,
+            'finished': self.finished_time,
+        }
+        if self.status == DONE:
+            d['result'] = f'/jobs/{self.job_id}/result'
+        if self.error is not None:
+            d['error'] = self.error
+        return d
+
+
+def encode_spec(spec: Dict[str, Any]) -> str:
+    """ Returns spec as json, with its images base64 encoded. Keys are sorted, so equal specs have equal encodings. """
+    def _default(o: Any) -> Any:
+        if isinstance(o, bytes):
+            return {'__bytes__': base64.b64encode(o).decode('ascii')}
+        raise TypeError(f'cannot encode {type(o)}')
+    return json.dumps(spec, sort_keys=True, default=_default)
+
+
+def decode_spec(s: str) -> Dict[str, Any]:
+    def _object_hook(d: Dict[str, Any]) -> Any:
+        return base64.b64decode(d['__bytes__']) if set(d) == {'__bytes__'} else d
+    return json.loads(s, object_hook=_object_hook)
+
+
+def spec_hash(spec: Dict[str, Any]) -> str:
+    """ Identifies the job's inputs, so that resubmissions of a job can be detected. """
+    return ContentStore.key(encode_spec(spec))
+
+
+def _bundled_configs(kind: str) -> Dict[str, Path]:
+    """ Returns the bundled example configs of kind 'motion' or 'retarget', by name. """
+    cfg_dir = resolve_package_path(str(Path('..', 'examples', 'config', kind)))
+    return {p.stem: p for p in cfg_dir.glob('*.yaml')}
+
+
+def _bundled_characters() -> Dict[str, Path]:
+    """ Returns the char_cfg.yaml files of the bundled example characters, by name. """
+    char_dir = resolve_package_path(str(Path('..', 'examples', 'characters')))
+    return {p.parent.name: p for p in char_dir.glob('*/char_cfg.yaml')}
+
+
+def _b64decode(value: Any, name: str) -> bytes:
+    try:
+        assert isinstance(value, str)
+        return base64.b64decode(value, validate=True)
+    except (AssertionError, binascii.Error):
+        raise ValueError(f'{name} must be a base64 encoded string')
+
+
+def _choose(request: Dict[str, Any], key: str, default: str, choices: Dict[str, Any]) -> str:
+    value = request.get(key, default)
+    if not isinstance(value, str) or value not in choices:
+        raise ValueError(f'unknown {key}: {value}. Choose from {sorted(choices)}')
+    return value
+
+
+@lru_cache(maxsize=None)  # bounded by the number of bundled motions
+def _motion_joint_names(motion: str) -> List[str]:
+    """ Returns the joint names of the bundled motion's BVH skeleton. """
+    from animated_drawings.config import MotionConfig
+    from animated_drawings.model.bvh import BVH
+
+    motion_cfg = MotionConfig.from_file(str(_bundled_configs('motion')[motion]))
+    return BVH.from_file(str(motion_cfg.bvh_p)).get_joint_names()
+
+
+def _missing_joint_names(motion: str, retarget: str) -> List[str]:
+    """ Returns the BVH joints the bundled retarget config refers to that the bundled motion's skeleton lacks. Empty if the retarget fits. """
+    from animated_drawings.config import RetargetConfig
+
+    motion_joint_names = set(_motion_joint_names(motion))
+    retarget_cfg = RetargetConfig.from_file(str(_bundled_configs('retarget')[retarget]))
+    return [name for name in retarget_cfg.get_bvh_joint_names() if name not in motion_joint_names]
+
+
+def parse_job_spec(content_type: str, body: bytes, query: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Returns the job spec of a job submission. Raises ValueError, with a message for the client, if it is invalid.
+    The body is either an image, with motion, retarget and format in the query string,
+    or a json object with 'image' or 'character' and, optionally, 'motion', 'retarget' and 'format'.
+    Images in json are base64 encoded.
+    If retarget isn't specified, the one that fits the motion is used. Retargets that don't fit the motion are rejected.
+    """
+    if content_type.startswith('image/'):
+        if not body:
+            raise ValueError('image is empty')
+        request: Dict[str, Any] = dict(query)
+        spec: Dict[str, Any] = {'image': body}
+    elif content_type == 'application/json':
+        try:
+            request = json.loads(body)
+            assert isinstance(request, dict)
+        except (AssertionError, ValueError):
+            raise ValueError('body must be a json object')
+
+        if ('image' in request) == ('character' in request):
+            raise ValueError("exactly one of 'image' or 'character' must be specified")
+
+        if 'image' in request:
+            spec = {'image': _b64decode(request['image'], 'image')}
+        elif isinstance(request['character'], str):
+            if request['character'] not in _bundled_characters():
+                raise ValueError(f"unknown character: {request['character']}")
+            spec = {'character': request['character']}
+        elif isinstance(request['character'], dict):
+            character = request['character']
+            char_cfg = character.get('char_cfg')
+            if not isinstance(char_cfg, dict) or not {'skeleton', 'width', 'height'} <= set(char_cfg):
+                raise ValueError("character['char_cfg'] must contain skeleton, width, and height")
+            spec = {'character': {
+                'char_cfg': char_cfg,
+                'texture': _b64decode(character.get('texture'), "character['texture']"),
+                'mask': _b64decode(character.get('mask'), "character['mask']"),
+            }}
+        else:
+            raise ValueError("character must be a name or an object")
+    else:
+        raise ValueError(f'unsupported content type: {content_type or None}. Send an image, or application/json')
+
+    spec['motion'] = _choose(request, 'motion', DEFAULT_MOTION, _bundled_configs('motion'))
+    spec['retarget'] = _choose(request, 'retarget', MOTION_RETARGETS.get(spec['motion'], DEFAULT_RETARGET), _bundled_configs('retarget'))
+    spec['format'] = _choose(request, 'format', DEFAULT_FORMAT, OUTPUT_CONTENT_TYPES)
+
+    missing_joint_names = _missing_joint_names(spec['motion'], spec['retarget'])
+    if missing_joint_names:
+        fitting = [retarget for retarget in sorted(_bundled_configs('retarget')) if not _missing_joint_names(spec['motion'], retarget)]
+        raise ValueError(f"retarget {spec['retarget']} does not fit motion {spec['motion']}, whose skeleton has no joints {missing_joint_names}. "
+                         f'Choose from {fitting}')
+
+    return spec
+
+
+# state of the render worker process, set by init_worker()
+_render_worker = None
+_torchserve_url: Optional[str] = None
+
+
+def init_worker(torchserve_url: str) -> None:
+    """ Initializes a render worker process, creating its OpenGL context before the first job arrives. """
+    global _render_worker
+    from animated_drawings.render_worker import RenderWorker
+
+    init_annotation_worker(torchserve_url)
+    _render_worker = RenderWorker()
+    _render_worker.warm_up()
+
+
+def init_annotation_worker(torchserve_url: str) -> None:
+    """ Initializes a worker process for annotate_job() only, without OpenGL, e.g. to load test annotation where rendering isn't possible. """
+    global _torchserve_url
+    _torchserve_url = torchserve_url
+
+
+def ping() -> None:
+    """ Run by the service in each worker process. Returns once the process has been initialized, or fails if it couldn't be. """
+
+
+def annotate_job(spec: Dict[str, Any]) -> bytes:
+    """ Annotates the image of spec, which must have one, within a render worker process. Returns the character, see character_to_bytes(). """
+    import cv2
+    import numpy as np
+    from animated_drawings.annotation import DEFAULT_TORCHSERVE_URL, image_to_character
+
+    img = cv2.imdecode(np.frombuffer(spec['image'], np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        msg = 'could not decode image'
+        logging.critical(msg)
+        assert False, msg
+    return character_to_bytes(image_to_character(img, _torchserve_url or DEFAULT_TORCHSERVE_URL))
+
+
+def render_job(spec: Dict[str, Any], character: Optional[bytes]) -> bytes:
+    """
+    Renders the job specified by spec within a render worker process and returns the encoded video.
+    character is the output of annotate_job() for jobs with an image, and None otherwise.
+    """
+    if _render_worker is None:
+        msg = 'render worker process was not initialized'
+        logging.critical(msg)
+        assert False, msg
+
+    from animated_drawings.pipeline_cache import cached, get_pipeline_cache
+
+    render_worker = _render_worker
+    scene = {'ANIMATED_CHARACTERS': [{
+        'character_cfg': character_from_bytes(character) if character is not None else _load_character(spec),
+        'motion_cfg': str(_bundled_configs('motion')[spec['motion']]),
+        'retarget_cfg': str(_bundled_configs('retarget')[spec['retarget']]),
+    }]}
+    return cached(get_pipeline_cache(), _video_key(spec, character),
+                  lambda: render_worker.render_to_bytes(scene, controller={'OUTPUT_VIDEO_PATH': f"video.{spec['format']}"}))
+
+
+def _video_key(spec: Dict[str, Any], character: Optional[bytes]) -> str:
+    """ Pipeline cache key of the video rendered for spec: the contents of the character, motion, retarget, and view configs. """
+    from animated_drawings.config import MotionConfig
+    from animated_drawings.pipeline_cache import get_stage_key
+
+    if character is not None:
+        character_inputs = [character]
+    elif isinstance(spec['character'], str):
+        char_dir = _bundled_characters()[spec['character']].parent
+        character_inputs = [(char_dir / fn).read_bytes() for fn in ['char_cfg.yaml', 'texture.png', 'mask.png']]
+    else:
+        character_inputs = [encode_spec(spec['character'])]
+
+    motion_p = _bundled_configs('motion')[spec['motion']]
+    retarget_p = _bundled_configs('retarget')[spec['retarget']]
+    return get_stage_key(
+        'render',
+        *character_inputs,
+        motion_p.read_bytes(),
+        MotionConfig.from_file(str(motion_p)).bvh_p.read_bytes(),
+        retarget_p.read_bytes(),
+        resolve_package_path('mvc_base_cfg.yaml').read_bytes(),
+        spec['format'],
+    )
+
+
+def _load_character(spec: Dict[str, Any]) -> Any:
+    """ Returns the character config, as a filepath or dict, of spec's bundled or submitted character. """
+    import cv2
+    import numpy as np
+
+    if isinstance(spec['character'], str):
+        return str(_bundled_characters()[spec['character']])
+
+    character = spec['character']
+    txtr = cv2.imdecode(np.frombuffer(character['texture'], np.uint8), cv2.IMREAD_UNCHANGED)
+    mask = cv2.imdecode(np.frombuffer(character['mask'], np.uint8), cv2.IMREAD_GRAYSCALE)
+    if txtr is None or mask is None:
+        msg = 'could not decode character texture or mask'
+        logging.critical(msg)
+        assert False, msg
+    if txtr.ndim == 2:
+        txtr = cv2.cvtColor(txtr, cv2.COLOR_GRAY2BGRA)
+    elif txtr.shape[2] == 3:
+        txtr = cv2.cvtColor(txtr, cv2.COLOR_BGR2BGRA)
+    return {**character['char_cfg'], 'texture': cv2.cvtColor(txtr, cv2.COLOR_BGRA2RGBA), 'mask': mask}
+
+
+def character_to_bytes(character: Dict[str, Any]) -> bytes:
+    """ Serializes an in-memory character config, as returned by annotation.image_to_character(). """
+    import numpy as np
+    char_cfg = {k: v for k, v in character.items() if k not in ('texture', 'mask')}
+    f = io.BytesIO()
+    np.savez_compressed(f, texture=character['texture'], mask=character['mask'], char_cfg=np.array(json.dumps(char_cfg)))
+    return f.getvalue()
+
+
+def character_from_bytes(data: bytes) -> Dict[str, Any]:
+    import numpy as np
+    with np.load(io.BytesIO(data)) as arrays:
+        return {**json.loads(str(arrays['char_cfg'])), 'texture': arrays['texture'], 'mask': arrays['mask']}
@@ -0,0 +1,293 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Load generator for the render service. Submits image to animation jobs, keeping concurrency jobs in flight,
+and prints a JSON report of throughput, latency percentiles, and the peak resident memory of the service's process tree.
+Each job's image differs by a light pixel within the drawing, so the service neither deduplicates jobs nor serves them from the pipeline cache,
+while fake torchserve detects the same character in each.
+
+Against a running service, whose process id is given to measure its memory:
+    python -m animated_drawings.service.loadgen --url http://localhost:8000 --pid <pid> --jobs 50 --concurrency 4
+Offline, against a service and fake torchserve (see fake_torchserve.py) started within the load generator's process:
+    python -m animated_drawings.service.loadgen --local --jobs 50 --concurrency 4 --detector-latency 0.2 --pose-latency 0.1
+With --skip-render, local jobs are annotated but not rendered, so the pipeline can be measured where OpenGL isn't available.
+"""
+
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from animated_drawings.service import jobs
+
+DEFAULT_IMAGE = str(Path(__file__).parent.parent.parent / 'examples' / 'drawings' / 'garlic.png')
+MAX_RETRY_WAIT = 1.0  # seconds to wait before resubmitting a job rejected with 429, at most
+
+
+def make_images(img_fn: str, count: int) -> List[bytes]:
+    """
+    Returns count PNG encoded copies of the image, each with a different light pixel at the center of the drawing.
+    The drawing is the bounding box of the image's dark pixels, as fake torchserve detects it;
+    as the pixel is light and inside that box, the character detected in each copy is the same.
+    """
+    import cv2
+
+    img = cv2.imread(img_fn)
+    if img is None:
+        msg = f'could not read image: {img_fn}'
+        logging.critical(msg)
+        assert False, msg
+
+    ys, xs = np.nonzero(np.min(img, axis=2) < 128)
+    if len(xs) == 0 or xs.max() - xs.min() < 2 or ys.max() - ys.min() < 2:
+        msg = f'no drawing of at least 3x3 pixels found in image: {img_fn}'
+        logging.critical(msg)
+        assert False, msg
+    y, x = (ys.min() + ys.max()) // 2, (xs.min() + xs.max()) // 2
+
+    images = []
+    for idx in range(count):
+        img[y, x] = [128 + idx % 128, 128 + (idx // 128) % 128, 128 + (idx // 16384) % 128]
+        images.append(cv2.imencode('.png', img)[1].tobytes())
+    return images
+
+
+def _request(url: str, method: str, data: Optional[bytes] = None, content_type: Optional[str] = None, timeout: float = 60.0) -> Tuple[int, Any, bytes]:
+    """ Returns the status, headers, and body of the response. """
+    headers = {'Content-Type': content_type} if content_type is not None else {}
+    req = urllib.request.Request(url, data, headers, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def run_job(url: str, image: bytes, motion: str, fmt: str, timeout: float) -> Tuple[float, int]:
+    """ Submits a job for image and waits for its result. Returns its latency, in seconds, and the number of times it was rejected with 429. """
+    start_time = time.perf_counter()
+    rejected = 0
+    while True:
+        status, headers, body = _request(f'{url}/jobs?motion={motion}&format={fmt}', 'POST', image, 'image/png')
+        if status != 429:
+            break
+        rejected += 1
+        time.sleep(min(MAX_RETRY_WAIT, float(headers.get('Retry-After', MAX_RETRY_WAIT))))
+    if status not in (200, 202):
+        raise Exception(f'submission failed with {status}: {body[:200]!r}')
+
+    job_id = json.loads(body)['job_id']
+    status, _, body = _request(f'{url}/jobs/{job_id}/result?wait={timeout}', 'GET', timeout=timeout + 10)
+    if status != 200:
+        raise Exception(f'job {job_id} failed with {status}: {body[:200]!r}')
+    return time.perf_counter() - start_time, rejected
+
+
+def process_tree_rss(pid: int) -> int:
+    """ Returns the resident memory, in bytes, of process pid and its descendants. Requires Linux's /proc; 0 elsewhere. """
+    total = 0
+    try:
+        for line in Path(f'/proc/{pid}/status').read_text().splitlines():
+            if line.startswith('VmRSS:'):
+                total += int(line.split()[1]) * 1024
+        for children_p in Path(f'/proc/{pid}/task').glob('*/children'):
+            total += sum(process_tree_rss(int(child)) for child in children_p.read_text().split())
+    except (OSError, ValueError):
+        pass  # the process exited while being read
+    return total
+
+
+class RssSampler(threading.Thread):
+    """ Samples the resident memory of pid's process tree every interval seconds, keeping the peak, until stop() is called. """
+
+    def __init__(self, pid: int, interval: float = 0.5) -> None:
+        super().__init__(daemon=True)
+        self.pid: int = pid
+        self.interval: float = interval
+        self.peak_bytes: int = 0
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            self.peak_bytes = max(self.peak_bytes, process_tree_rss(self.pid))
+            self._stopped.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+def wait_until_healthy(url: str, timeout: float) -> None:
+    """ Waits for the service's /ping to report its workers are ready. """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            status, _, body = _request(f'{url}/ping', 'GET', timeout=5)
+            if status == 200:
+                return
+        except (urllib.error.URLError, ConnectionError):
+            body = b'service unreachable'
+        if time.monotonic() > deadline:
+            msg = f'service at {url} not healthy after {timeout} seconds: {body[:200]!r}'
+            logging.critical(msg)
+            assert False, msg
+        time.sleep(0.2)
+
+
+def run_load(url: str,
+             images: Sequence[bytes],
+             motions: Sequence[str],
+             concurrency: int,
+             fmt: str = jobs.DEFAULT_FORMAT,
+             pid: Optional[int] = None,
+             job_timeout: float = 600.0
+             ) -> Dict[str, Any]:
+    """
+    Runs a job for each of images, cycling through motions, with up to concurrency jobs in flight. Returns the report.
+    If pid is given, the peak resident memory of its process tree is reported.
+    """
+    latencies: List[float] = []
+    errors: List[str] = []
+    rejected = 0
+    lock = threading.Lock()
+
+    def _run(idx: int) -> None:
+        nonlocal rejected
+        try:
+            latency, job_rejected = run_job(url, images[idx], motions[idx % len(motions)], fmt, job_timeout)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        with lock:
+            latencies.append(latency)
+            rejected += job_rejected
+
+    sampler = RssSampler(pid) if pid is not None else None
+    if sampler is not None:
+        sampler.start()
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(_run, range(len(images))))
+    seconds = time.perf_counter() - start_time
+    if sampler is not None:
+        sampler.stop()
+
+    report: Dict[str, Any] = {
+        'jobs': len(images),
+        'succeeded': len(latencies),
+        'failed': len(errors),
+        'rejected_submissions': rejected,
+        'concurrency': concurrency,
+        'seconds': round(seconds, 3),
+        'throughput_jobs_per_second': round(len(latencies) / seconds, 3),
+    }
+    if latencies:
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        report['latency_seconds'] = {
+            'mean': round(float(np.mean(latencies)), 3),
+            'p50': round(float(p50), 3),
+            'p90': round(float(p90), 3),
+            'p99': round(float(p99), 3),
+            'max': round(max(latencies), 3),
+        }
+    if sampler is not None:
+        report['peak_rss_mb'] = round(sampler.peak_bytes / 1024 ** 2, 1)
+    if errors:
+        report['errors'] = sorted(set(errors))[:5]
+    return report
+
+
+def _skip_render(spec: Dict[str, Any], character: Optional[bytes]) -> bytes:
+    """ Stands in for jobs.render_job() with --skip-render. Returns the annotated character. """
+    return character or b''
+
+
+def run_local(images: Sequence[bytes],
+              motions: Sequence[str],
+              concurrency: int,
+              fmt: str = jobs.DEFAULT_FORMAT,
+              workers: int = 1,
+              detector_latency: float = 0.0,
+              pose_latency: float = 0.0,
+              skip_render: bool = False,
+              job_timeout: float = 600.0
+              ) -> Dict[str, Any]:
+    """
+    Runs the load against a RenderService and FakeTorchserve started in this process, on free ports. Returns the report.
+    The reported memory includes the load generator and fake torchserve, which share the service's process.
+    """
+    import asyncio
+    import os
+    from animated_drawings.service.fake_torchserve import FakeTorchserve
+    from animated_drawings.service.server import RenderService
+
+    async def _run() -> Dict[str, Any]:
+        fake = FakeTorchserve(detector_latency, pose_latency)
+        fake_server = await fake.start('127.0.0.1', 0)
+        torchserve_url = f'http://127.0.0.1:{fake_server.sockets[0].getsockname()[1]}'
+
+        service = RenderService(
+            workers=workers,
+            max_queued_jobs=max(16, concurrency),
+            max_finished_jobs=max(100, len(images)),
+            job_timeout=job_timeout,
+            torchserve_url=torchserve_url,
+            init_fn=jobs.init_annotation_worker if skip_render else jobs.init_worker,
+            render_fn=_skip_render if skip_render else jobs.render_job)
+        server = await service.start('127.0.0.1', 0)
+        url = f'http://127.0.0.1:{server.sockets[0].getsockname()[1]}'
+
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, wait_until_healthy, url, job_timeout)
+            report = await loop.run_in_executor(None, run_load, url, images, motions, concurrency, fmt, os.getpid(), job_timeout)
+        finally:
+            await service.stop()
+            await fake.stop()
+        report['torchserve_requests'] = dict(fake.request_counts)
+        return report
+
+    return asyncio.run(_run())
+
+
+if __name__ == '__main__':
+    import argparse
+    from animated_drawings.service.server import DEFAULT_PORT
+
+    parser = argparse.ArgumentParser(description='Measures the render service under load.')
+    parser.add_argument('--url', default=f'http://localhost:{DEFAULT_PORT}', help='render service to load, unless --local')
+    parser.add_argument('--pid', type=int, help='process id of the render service, to report its peak memory')
+    parser.add_argument('--image', default=DEFAULT_IMAGE, help='drawing submitted with each job')
+    parser.add_argument('--motions', default=jobs.DEFAULT_MOTION, help='comma separated motions, assigned to jobs in turn')
+    parser.add_argument('--format', default=jobs.DEFAULT_FORMAT, choices=sorted(jobs.OUTPUT_CONTENT_TYPES))
+    parser.add_argument('--jobs', type=int, default=20, help='number of jobs to run')
+    parser.add_argument('--concurrency', type=int, default=4, help='number of jobs kept in flight')
+    parser.add_argument('--job-timeout', type=float, default=600.0, help='seconds to wait for each job')
+    parser.add_argument('--local', action='store_true', help='start a render service and fake torchserve in this process')
+    parser.add_argument('--workers', type=int, default=1, help='with --local, number of render worker processes')
+    parser.add_argument('--detector-latency', type=float, default=0.0, help='with --local, seconds each fake detection takes')
+    parser.add_argument('--pose-latency', type=float, default=0.0, help='with --local, seconds each fake pose estimation takes')
+    parser.add_argument('--skip-render', action='store_true', help='with --local, annotate jobs without rendering them')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    images = make_images(args.image, args.jobs)
+    motions = args.motions.split(',')
+    if args.local:
+        report = run_local(images, motions, args.concurrency, args.format, args.workers,
+                           args.detector_latency, args.pose_latency, args.skip_render, args.job_timeout)
+    else:
+        wait_until_healthy(args.url, args.job_timeout)
+        report = run_load(args.url, images, motions, args.concurrency, args.format, args.pid, args.job_timeout)
+    print(json.dumps(report, indent=2))
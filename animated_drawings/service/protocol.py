@@ -0,0 +1,149 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+The small subset of HTTP/1.1 spoken by the render service, on top of asyncio streams.
+Request bodies must have a Content-Length. Connections are kept alive unless the client asks otherwise.
+"""
+
+import asyncio
+import json
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+MAX_HEADER_COUNT = 100
+WRITE_CHUNK_BYTES = 1 << 16
+
+REASONS = {
+    100: 'Continue',
+    200: 'OK',
+    202: 'Accepted',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    411: 'Length Required',
+    413: 'Payload Too Large',
+    429: 'Too Many Requests',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+
+class HTTPError(Exception):
+    """ Raised while handling a request to respond with an error status. """
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None) -> None:
+        super().__init__(message)
+        self.status: int = status
+        self.message: str = message
+        self.headers: Dict[str, str] = headers or {}
+
+
+class Request():
+
+    def __init__(self, method: str, target: str, version: str, headers: Dict[str, str], body: bytes) -> None:
+        self.method: str = method
+        self.version: str = version
+        self.headers: Dict[str, str] = headers  # names are lowercase
+        self.body: bytes = body
+
+        url = urlsplit(target)
+        self.path: str = url.path
+        self.query: Dict[str, str] = dict(parse_qsl(url.query))
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get('content-type', '').split(';')[0].strip().lower()
+
+
+class Response():
+
+    def __init__(self, status: int, body: bytes = b'', content_type: str = 'application/octet-stream', headers: Optional[Dict[str, str]] = None) -> None:
+        self.status: int = status
+        self.body: bytes = body
+        self.headers: Dict[str, str] = {'Content-Type': content_type, **(headers or {})}
+
+
+def json_response(status: int, obj: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(status, json.dumps(obj).encode('utf-8'), 'application/json', headers)
+
+
+async def read_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, max_body_bytes: int) -> Optional[Request]:
+    """
+    Reads the next request from the connection. Returns None if the client closed the connection before sending one.
+    Raises HTTPError if the request is malformed or its body is larger than max_body_bytes.
+    """
+    try:
+        request_line = await reader.readline()
+    except (asyncio.LimitOverrunError, ValueError):
+        raise HTTPError(400, 'request line too long')
+    if not request_line:
+        return None
+
+    try:
+        method, target, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, 'malformed request line')
+    if not version.startswith('HTTP/1.'):
+        raise HTTPError(400, f'unsupported protocol version {version}')
+
+    headers: Dict[str, str] = {}
+    while True:
+        try:
+            line = await reader.readline()
+        except (asyncio.LimitOverrunError, ValueError):
+            raise HTTPError(400, 'header line too long')
+        if line in (b'\r\n', b'\n', b''):
+            break
+        if len(headers) >= MAX_HEADER_COUNT:
+            raise HTTPError(400, 'too many headers')
+        name, sep, value = line.decode('latin-1').partition(':')
+        if not sep:
+            raise HTTPError(400, 'malformed header')
+        headers[name.strip().lower()] = value.strip()
+
+    body = b''
+    if 'transfer-encoding' in headers:
+        raise HTTPError(411, 'request bodies must have a Content-Length')
+    if 'content-length' in headers:
+        try:
+            content_length = int(headers['content-length'])
+            assert content_length >= 0
+        except (AssertionError, ValueError):
+            raise HTTPError(400, 'invalid Content-Length')
+        if content_length > max_body_bytes:
+            raise HTTPError(413, f'request body larger than {max_body_bytes} bytes')
+
+        # clients such as curl wait for permission before sending large bodies
+        if headers.get('expect', '').lower() == '100-continue':
+            writer.write(f'{version} 100 Continue\r\n\r\n'.encode('latin-1'))
+            await writer.drain()
+
+        try:
+            body = await reader.readexactly(content_length)
+        except asyncio.IncompleteReadError:
+            return None
+
+    return Request(method.upper(), target, version, headers, body)
+
+
+async def write_response(writer: asyncio.StreamWriter, response: Response, keep_alive: bool) -> None:
+    """ Writes response, draining in chunks so that large bodies are sent as fast as the client reads them. """
+    head = [f'HTTP/1.1 {response.status} {REASONS.get(response.status, "Unknown")}']
+    headers = {**response.headers, 'Content-Length': str(len(response.body)), 'Connection': 'keep-alive' if keep_alive else 'close'}
+    head.extend(f'{name}: {value}' for name, value in headers.items())
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+
+    body = memoryview(response.body)
+    for start in range(0, len(body), WRITE_CHUNK_BYTES):
+        writer.write(body[start:start + WRITE_CHUNK_BYTES])
+        await writer.drain()
+    await writer.drain()
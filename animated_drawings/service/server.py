@@ -0,0 +1,381 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+asyncio HTTP server that queues render jobs and dispatches them to a pool of render worker processes.
+
+Endpoints:
+    POST /jobs               submit a job (see jobs.parse_job_spec()). 202 with the job's status, or 429 if the queue is full
+    GET  /jobs/<id>          the job's status. With ?wait=<seconds>, waits up to that long for the job to finish
+    GET  /jobs/<id>/result   the rendered video. Waits for the job to finish, up to ?wait=<seconds>, then 202 if it hasn't
+    GET  /ping               200 if the render workers are healthy, 503 otherwise, with queue and worker statistics
+"""
+
+import asyncio
+import logging
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Set, TypeVar
+
+from animated_drawings.annotation import DEFAULT_TORCHSERVE_URL
+from animated_drawings.service import jobs
+from animated_drawings.service.jobs import Job
+from animated_drawings.service.protocol import HTTPError, Request, Response, json_response, read_request, write_response
+from animated_drawings.service.store import JobStore
+
+DEFAULT_PORT = 8000  # torchserve's inference api uses 8080
+
+T = TypeVar('T')
+
+
+class RenderService():
+    """
+    Admits up to max_queued_jobs waiting jobs. Beyond that, submissions are rejected with 429 and a Retry-After estimate,
+    so that an overloaded service sheds load rather than accumulating work it can't finish.
+    Each of the workers processes is initialized once, keeping its OpenGL context between jobs (see RenderWorker).
+
+    Jobs are recorded in the JobStore at db_path, with the output of each stage they complete.
+    The store is only used from its own thread, so that reading and writing outputs, e.g. videos, doesn't block the event loop.
+    Submitting a job with the same inputs as one that's queued, running, or done returns that job rather than rendering it again.
+    Jobs left unfinished by a previous service using the same database are resumed, from their last completed stage, on start().
+    The most recent max_finished_jobs finished jobs are kept for clients to fetch.
+    """
+
+    def __init__(self,
+                 workers: int = 1,
+                 max_queued_jobs: int = 16,
+                 max_finished_jobs: int = 100,
+                 job_timeout: float = 600.0,
+                 max_request_bytes: int = 20 * 1024 * 1024,
+                 torchserve_url: str = DEFAULT_TORCHSERVE_URL,
+                 db_path: str = ':memory:',
+                 init_fn: Callable[[str], None] = jobs.init_worker,
+                 annotate_fn: Callable[[Dict[str, Any]], bytes] = jobs.annotate_job,
+                 render_fn: Callable[[Dict[str, Any], Optional[bytes]], bytes] = jobs.render_job) -> None:
+        self.workers: int = workers
+        self.max_queued_jobs: int = max_queued_jobs
+        self.max_finished_jobs: int = max_finished_jobs
+        self.job_timeout: float = job_timeout  # running longer than this marks the workers unhealthy
+        self.max_request_bytes: int = max_request_bytes
+        self.torchserve_url: str = torchserve_url
+
+        # run within worker processes, so must be picklable. See the functions of jobs.py they default to
+        self.init_fn: Callable[[str], None] = init_fn
+        self.annotate_fn: Callable[[Dict[str, Any]], bytes] = annotate_fn
+        self.render_fn: Callable[[Dict[str, Any], Optional[bytes]], bytes] = render_fn
+
+        self.store: JobStore = JobStore(db_path)
+        self._store_executor: ThreadPoolExecutor = ThreadPoolExecutor(1, thread_name_prefix='job_store')
+        self._submit_lock: asyncio.Lock
+        self.running: Dict[str, Job] = {}
+        self.job_finished: Dict[str, asyncio.Event] = {}  # of jobs queued or running in this service
+        self.queue: 'asyncio.Queue[Job]'
+        self.draining: bool = False  # set by stop()
+
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.workers_ready: bool = False  # set once the current pool's workers are initialized
+        self.worker_restarts: int = 0
+        self.mean_job_seconds: float = 10.0  # moving average, used to estimate Retry-After
+
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._dispatchers: List['asyncio.Task[None]'] = []
+        self._job_tasks: Set['asyncio.Task[None]'] = set()
+        self._warm_up_task: Optional['asyncio.Task[None]'] = None
+
+    async def start(self, host: str = '0.0.0.0', port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        """ Starts the worker processes and the job dispatchers, requeues unfinished jobs, then begins accepting connections. """
+        self.queue = asyncio.Queue()  # admission is limited by submit(), so that resumed jobs always fit
+        self._submit_lock = asyncio.Lock()
+        self._start_executor()
+
+        resumed = await self._in_store(self.store.unfinished)
+        for job in resumed:
+            self._enqueue(job)
+        if resumed:
+            logging.info(f'Resuming {len(resumed)} unfinished jobs')
+
+        self._dispatchers = [asyncio.ensure_future(self._dispatch()) for _ in range(self.workers)]
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        logging.info(f'Render service listening on {host}:{port} with {self.workers} workers')
+        return self.server
+
+    async def stop(self, timeout: float = 0.0) -> None:
+        """
+        Stops accepting connections and jobs, then waits up to timeout seconds for running jobs to finish.
+        Jobs still running are then interrupted and, like queued jobs, are left unfinished in the store, to be resumed by the next service.
+        """
+        self.draining = True
+        if self.server is not None:
+            self.server.close()
+
+        tasks = self._dispatchers + ([self._warm_up_task] if self._warm_up_task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        interrupted: Set['asyncio.Task[None]'] = set(self._job_tasks)
+        if interrupted and timeout > 0:
+            _, interrupted = await asyncio.wait(interrupted, timeout=timeout)
+        for task in interrupted:
+            task.cancel()
+        if interrupted:
+            await asyncio.gather(*interrupted, return_exceptions=True)
+            logging.info(f'Interrupted {len(interrupted)} running jobs, to be resumed on restart')
+
+        if self.executor is not None:
+            executor, self.executor = self.executor, None
+            if interrupted:
+                # don't wait for the interrupted jobs' renders to finish
+                _terminate_workers(executor)
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+        await self._in_store(self.store.close)
+        self._store_executor.shutdown()
+
+    async def _in_store(self, fn: Callable[..., T], *args: Any) -> T:
+        """ Runs fn, a method of the store, on the store's thread. Calls run one at a time, in the order they're made. """
+        return await asyncio.get_running_loop().run_in_executor(self._store_executor, fn, *args)
+
+    def _start_executor(self) -> None:
+        # workers are spawned rather than forked: OpenGL contexts and threads don't survive fork
+        self.executor = ProcessPoolExecutor(self.workers, multiprocessing.get_context('spawn'), self.init_fn, (self.torchserve_url,))
+        self.workers_ready = False
+        self._warm_up_task = asyncio.ensure_future(self._warm_up(self.executor))
+
+    async def _warm_up(self, executor: ProcessPoolExecutor) -> None:
+        """ Starts every worker process, rather than waiting for jobs to arrive, and marks the pool ready once they're initialized. """
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*[loop.run_in_executor(executor, jobs.ping) for _ in range(self.workers)])
+        except Exception as e:
+            # back off, so that workers that can't start, e.g. without OpenGL, aren't respawned continuously
+            logging.error(f'Render workers failed to start: {e}')
+            await asyncio.sleep(min(60, 2 ** self.worker_restarts))
+            self._restart_executor(executor)
+            return
+        if executor is self.executor:
+            self.workers_ready = True
+
+    def _restart_executor(self, broken: ProcessPoolExecutor) -> None:
+        """ Replaces the pool if a worker process died. Every job running in the pool fails with it. """
+        if broken is not self.executor:
+            return  # already replaced
+        logging.error('A render worker process died. Restarting render workers')
+        broken.shutdown(wait=False)
+        self.worker_restarts += 1
+        self._start_executor()
+
+    def _enqueue(self, job: Job) -> None:
+        self.job_finished[job.job_id] = asyncio.Event()
+        self.queue.put_nowait(job)
+
+    async def _dispatch(self) -> None:
+        """ Runs queued jobs, one at a time. One dispatcher runs per worker. """
+        while True:
+            job = await self.queue.get()
+            task = asyncio.ensure_future(self._run(job))
+            self._job_tasks.add(task)
+            task.add_done_callback(self._job_tasks.discard)
+            await asyncio.shield(task)  # stop() decides whether running jobs are waited for or interrupted
+
+    async def _run(self, job: Job) -> None:
+        """ Runs job's remaining stages in the worker pool, recording each in the store as it completes. """
+        loop = asyncio.get_running_loop()
+        job.status, job.started_time = jobs.RUNNING, time.time()
+        self.running[job.job_id] = job
+        await self._in_store(self.store.update, job)
+
+        executor = self.executor
+        result: Optional[bytes] = None
+        try:
+            assert executor is not None
+            character: Optional[bytes] = None
+            if 'image' in job.spec:
+                if job.stage == jobs.ANNOTATED:
+                    character = await self._in_store(self.store.get_output, job.job_id, jobs.ANNOTATED)
+                if character is None:
+                    character = await loop.run_in_executor(executor, self.annotate_fn, job.spec)
+                    job.stage = jobs.ANNOTATED
+                    await self._in_store(self.store.update, job, character)
+
+            result = await loop.run_in_executor(executor, self.render_fn, job.spec, character)
+            job.status, job.stage = jobs.DONE, jobs.RENDERED
+        except BrokenProcessPool:
+            job.status, job.error = jobs.FAILED, 'render worker process died'
+            self._restart_executor(executor)  # type: ignore
+        except Exception as e:
+            job.status, job.error = jobs.FAILED, str(e) or type(e).__name__
+        finally:
+            # if interrupted by stop(), the job is left running in the store
+            del self.running[job.job_id]
+
+        job.finished_time = time.time()
+        await self._in_store(self.store.update, job, result)
+        self.job_finished.pop(job.job_id).set()
+
+        if job.status == jobs.DONE:
+            self.mean_job_seconds = 0.8 * self.mean_job_seconds + 0.2 * (job.finished_time - job.started_time)
+        else:
+            logging.warning(f'Job {job.job_id} failed: {job.error}')
+        await self._in_store(self.store.evict_finished, self.max_finished_jobs)
+
+    async def submit(self, spec: Dict[str, Any]) -> Job:
+        """
+        Queues a job, unless one with the same inputs is queued, running, or done, in which case that job is returned.
+        Raises HTTPError(429) if the queue is full, or HTTPError(503) if the service is stopping.
+        """
+        # hashing uploaded images takes a while, so is done off the event loop
+        input_hash = await asyncio.get_running_loop().run_in_executor(None, jobs.spec_hash, spec)
+
+        # one submission at a time, so that concurrent resubmissions of a job find it, and the queue limit holds
+        async with self._submit_lock:
+            existing = await self._in_store(self.store.find, input_hash)
+            if existing is not None:
+                return existing
+
+            if self.draining:
+                raise HTTPError(503, 'service is shutting down', {'Retry-After': '30'})
+            if self.queue.qsize() >= self.max_queued_jobs:
+                retry_after = math.ceil(self.mean_job_seconds * (self.queue.qsize() + len(self.running)) / self.workers)
+                raise HTTPError(429, f'job queue is full ({self.max_queued_jobs} jobs)', {'Retry-After': str(retry_after)})
+
+            job = Job(spec, input_hash=input_hash)
+            await self._in_store(self.store.add, job)
+            self._enqueue(job)
+            return job
+
+    def get_status(self) -> Dict[str, Any]:
+        """ Returns the health of the workers, with queue and worker statistics. """
+        now = time.time()
+        stalled = [job.job_id for job in self.running.values() if job.started_time is not None and now - job.started_time > self.job_timeout]
+        healthy = self.executor is not None and self.workers_ready and not stalled and not self.draining
+        return {
+            'status': 'Healthy' if healthy else 'Unhealthy',
+            'draining': self.draining,
+            'workers': self.workers,
+            'workers_ready': self.workers_ready,
+            'worker_restarts': self.worker_restarts,
+            'stalled_jobs': stalled,
+            'queued_jobs': self.queue.qsize(),
+            'running_jobs': len(self.running),
+            'max_queued_jobs': self.max_queued_jobs,
+        }
+
+    async def _wait_for_job(self, job: Job, request: Request, default_wait: float) -> Job:
+        """ Waits for job to finish, up to the request's ?wait=<seconds>, or default_wait, and returns its current state. """
+        try:
+            wait = min(float(request.query.get('wait', default_wait)), self.job_timeout)
+        except ValueError:
+            raise HTTPError(400, 'wait must be a number of seconds')
+        event = self.job_finished.get(job.job_id)
+        if event is not None and wait > 0:
+            try:
+                await asyncio.wait_for(event.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+        return await self._get_job(job.job_id)
+
+    async def _get_job(self, job_id: str) -> Job:
+        job = await self._in_store(self.store.get, job_id)
+        if job is None:
+            raise HTTPError(404, f'no job {job_id}')
+        return job
+
+    async def handle_request(self, request: Request) -> Response:
+        parts = [p for p in request.path.split('/') if p]
+
+        if parts == ['ping']:
+            if request.method != 'GET':
+                raise HTTPError(405, 'use GET')
+            status = self.get_status()
+            return json_response(200 if status['status'] == 'Healthy' else 503, status)
+
+        if parts == ['jobs']:
+            if request.method != 'POST':
+                raise HTTPError(405, 'use POST')
+            try:
+                # decoding uploaded images takes a while, so is done off the event loop
+                spec = await asyncio.get_running_loop().run_in_executor(
+                    None, jobs.parse_job_spec, request.content_type, request.body, request.query)
+            except ValueError as e:
+                raise HTTPError(400, str(e))
+            job = await self.submit(spec)
+            return json_response(200 if job.finished else 202, job.to_dict(), {'Location': f'/jobs/{job.job_id}'})
+
+        if len(parts) == 2 and parts[0] == 'jobs':
+            if request.method != 'GET':
+                raise HTTPError(405, 'use GET')
+            job = await self._wait_for_job(await self._get_job(parts[1]), request, default_wait=0)
+            return json_response(200, job.to_dict())
+
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'result':
+            if request.method != 'GET':
+                raise HTTPError(405, 'use GET')
+            job = await self._wait_for_job(await self._get_job(parts[1]), request, default_wait=self.job_timeout)
+            if job.status == jobs.FAILED:
+                return json_response(500, job.to_dict())
+            result = await self._in_store(self.store.get_output, job.job_id, jobs.RENDERED) if job.status == jobs.DONE else None
+            if result is None:
+                return json_response(202, job.to_dict(), {'Retry-After': str(math.ceil(self.mean_job_seconds))})
+            return Response(200, result, job.content_type)
+
+        raise HTTPError(404, f'no such endpoint: {request.path}')
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await read_request(reader, writer, self.max_request_bytes)
+                    if request is None:
+                        break
+                    keep_alive = request.keep_alive
+                    response = await self.handle_request(request)
+                except HTTPError as e:
+                    response = json_response(e.status, {'error': e.message}, e.headers)
+                except Exception as e:
+                    logging.exception('Error handling request')
+                    response = json_response(500, {'error': str(e)})
+                await write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def _terminate_workers(executor: ProcessPoolExecutor) -> None:
+    """ Shuts down executor without waiting for its jobs, terminating its worker processes. Other child processes are left alone. """
+    processes = list((executor._processes or {}).values())  # pyright: ignore[reportPrivateUsage]
+    executor.shutdown(wait=False)
+    for process in processes:
+        process.terminate()
+
+
+def serve(host: str = '0.0.0.0', port: int = DEFAULT_PORT, shutdown_timeout: float = 25.0, **service_kwargs: Any) -> None:
+    """
+    Runs a RenderService until SIGINT or SIGTERM. Running jobs are then given shutdown_timeout seconds to finish,
+    which should be less than the time the process manager waits before killing the service (30s for Fly's kill_timeout).
+    service_kwargs are passed to RenderService.
+    """
+    import signal
+
+    async def _serve() -> None:
+        service = RenderService(**service_kwargs)
+        await service.start(host, port)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await stop.wait()
+
+        logging.info('Stopping render service')
+        await service.stop(shutdown_timeout)
+
+    asyncio.run(_serve())
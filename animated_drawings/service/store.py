@@ -0,0 +1,123 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+SQLite record of render jobs, their completed stages, and their outputs.
+Every change is committed before the service acts on it, so after a crash or redeploy
+a new service resumes unfinished jobs from the last stage they completed.
+"""
+
+import sqlite3
+from typing import Any, List, Optional
+
+from animated_drawings.service import jobs
+from animated_drawings.service.jobs import Job
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    input_hash TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    format TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_input_hash ON jobs (input_hash);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS outputs (
+    job_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (job_id, stage)
+);
+"""
+
+_JOB_COLUMNS = 'job_id, input_hash, format, status, stage, error, created, started, finished'
+
+
+class JobStore():
+    """
+    Jobs stored in the SQLite database at db_path. The default, ':memory:', keeps them for the life of the store only.
+    The store may be used from any thread, but only from one thread at a time.
+    """
+
+    def __init__(self, db_path: str = ':memory:') -> None:
+        self.db_path: str = db_path
+        self.conn: sqlite3.Connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        if db_path != ':memory:':
+            # write-ahead logging: commits are durable without rewriting the database, and reads don't block on writes
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.conn:
+            self.conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row, spec: Optional[str] = None) -> Job:
+        job = Job(jobs.decode_spec(spec) if spec is not None else {'format': row['format']}, row['job_id'], row['input_hash'])
+        job.status, job.stage, job.error = row['status'], row['stage'], row['error']
+        job.created_time, job.started_time, job.finished_time = row['created'], row['started'], row['finished']
+        return job
+
+    def add(self, job: Job) -> None:
+        with self.conn:
+            self.conn.execute(
+                f'INSERT INTO jobs ({_JOB_COLUMNS}, spec) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job.job_id, job.input_hash, job.format, job.status, job.stage, job.error,
+                 job.created_time, job.started_time, job.finished_time, jobs.encode_spec(job.spec)))
+
+    def update(self, job: Job, stage_output: Optional[bytes] = None) -> None:
+        """
+        Records job's status and stage. If given, stage_output is stored as the output of job.stage, in the same transaction.
+        Once the job is done, the outputs of stages before the last are deleted.
+        """
+        with self.conn:
+            self.conn.execute(
+                'UPDATE jobs SET status = ?, stage = ?, error = ?, started = ?, finished = ? WHERE job_id = ?',
+                (job.status, job.stage, job.error, job.started_time, job.finished_time, job.job_id))
+            if stage_output is not None:
+                self.conn.execute('INSERT OR REPLACE INTO outputs (job_id, stage, data) VALUES (?, ?, ?)', (job.job_id, job.stage, stage_output))
+            if job.finished:
+                self.conn.execute('DELETE FROM outputs WHERE job_id = ? AND stage IS NOT ?', (job.job_id, jobs.RENDERED))
+
+    def get(self, job_id: str, with_spec: bool = False) -> Optional[Job]:
+        """ Returns the job. Unless with_spec, its spec only contains the output format, as its inputs can be large. """
+        row = self.conn.execute(f'SELECT {_JOB_COLUMNS}, spec FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        return self._to_job(row, row['spec'] if with_spec else None)
+
+    def find(self, input_hash: str) -> Optional[Job]:
+        """ Returns the most recent job, queued, running, or done, with input_hash. Failed jobs are ignored, so they can be retried. """
+        row = self.conn.execute(
+            f'SELECT {_JOB_COLUMNS} FROM jobs WHERE input_hash = ? AND status != ? ORDER BY created DESC LIMIT 1',
+            (input_hash, jobs.FAILED)).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def get_output(self, job_id: str, stage: str) -> Optional[bytes]:
+        row = self.conn.execute('SELECT data FROM outputs WHERE job_id = ? AND stage = ?', (job_id, stage)).fetchone()
+        return bytes(row['data']) if row is not None else None
+
+    def unfinished(self) -> List[Job]:
+        """ Returns the jobs that are queued, or were running when the previous service stopped, with their specs, oldest first. """
+        rows = self.conn.execute(
+            f'SELECT {_JOB_COLUMNS}, spec FROM jobs WHERE status IN (?, ?) ORDER BY created',
+            (jobs.QUEUED, jobs.RUNNING)).fetchall()
+        return [self._to_job(row, row['spec']) for row in rows]
+
+    def evict_finished(self, keep: int) -> None:
+        """ Deletes all but the keep most recently finished jobs, and their outputs. """
+        with self.conn:
+            stale: List[Any] = self.conn.execute(
+                'SELECT job_id FROM jobs WHERE status IN (?, ?) ORDER BY finished DESC LIMIT -1 OFFSET ?',
+                (jobs.DONE, jobs.FAILED, keep)).fetchall()
+            self.conn.executemany('DELETE FROM outputs WHERE job_id = ?', stale)
+            self.conn.executemany('DELETE FROM jobs WHERE job_id = ?', stale)
+
+    def close(self) -> None:
+        self.conn.close()
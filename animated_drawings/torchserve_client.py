@@ -0,0 +1,109 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Client for the drawn humanoid detector and pose estimator models served by torchserve.
+A client keeps a pool of open connections to torchserve, so consecutive requests don't each pay for a new connection,
+applies connect and read timeouts, and retries requests that fail to connect or that torchserve rejects while it's busy.
+Images are sent JPEG encoded by default, which is several times faster to encode, and smaller, than PNG.
+The torchserve handlers decode any image format OpenCV can read, so the encoding only needs to change on this side.
+"""
+
+import logging
+import threading
+from typing import Dict, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+DEFAULT_TORCHSERVE_URL = 'http://localhost:8080'
+
+DETECTOR_MODEL = 'drawn_humanoid_detector'
+POSE_ESTIMATOR_MODEL = 'drawn_humanoid_pose_estimator'
+
+
+class TorchserveClient():
+    """
+    Sends images to the models of the torchserve inference api at url.
+
+    Params:
+        url: base url of the torchserve inference api
+        connect_timeout: seconds to wait for a connection to torchserve
+        read_timeout: seconds to wait for a prediction, once connected
+        retries: times to retry a request that failed to connect, or received a 502, 503, or 504 response
+        pool_size: maximum number of connections kept open, and so of concurrent requests worth sending
+        image_format: '.jpg' or '.png', the encoding of images sent to torchserve
+        jpeg_quality: quality of JPEG encoded images, from 0 to 100
+    """
+
+    def __init__(self,
+                 url: str = DEFAULT_TORCHSERVE_URL,
+                 connect_timeout: float = 5.0,
+                 read_timeout: float = 60.0,
+                 retries: int = 3,
+                 pool_size: int = 8,
+                 image_format: str = '.jpg',
+                 jpeg_quality: int = 95
+                 ) -> None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        if image_format not in ('.jpg', '.png'):
+            msg = f'image_format must be .jpg or .png. Found {image_format}'
+            logging.critical(msg)
+            assert False, msg
+
+        self.url: str = url.rstrip('/')
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.pool_size: int = pool_size
+        self.image_format: str = image_format
+        self.jpeg_quality: int = jpeg_quality
+
+        # predictions have no side effects, so POSTs are safe to retry
+        retry = Retry(total=retries, connect=retries, read=0, status=retries, backoff_factor=0.5,
+                      status_forcelist=(502, 503, 504), allowed_methods=frozenset(['POST']), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session: requests.Session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def encoding(self) -> str:
+        """ Identifies how images are encoded, as model outputs can differ slightly between encodings. """
+        return f'{self.image_format}:{self.jpeg_quality}' if self.image_format == '.jpg' else self.image_format
+
+    def encode(self, img: npt.NDArray[np.uint8]) -> bytes:
+        """ Encodes the BGR image as it's sent to torchserve. """
+        import cv2
+
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality] if self.image_format == '.jpg' else []
+        success, buf = cv2.imencode(self.image_format, img, params)
+        if not success:
+            msg = f'could not encode image of shape {img.shape} as {self.image_format}'
+            logging.critical(msg)
+            assert False, msg
+        return buf.tobytes()
+
+    def predict(self, model_name: str, img: npt.NDArray[np.uint8]) -> bytes:
+        """ Sends the BGR image to model_name and returns the response body. Raises an Exception if the request fails. """
+        resp = self.session.post(f'{self.url}/predictions/{model_name}', files={'data': self.encode(img)}, timeout=self.timeout, verify=False)
+        if resp.status_code >= 300:
+            raise Exception(f'{model_name} request failed, resp: {resp}, {resp.content[:200]!r}')
+        return resp.content
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_clients: Dict[str, TorchserveClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(url: str = DEFAULT_TORCHSERVE_URL) -> TorchserveClient:
+    """ Returns a client for url with the default settings, shared by all callers within the process so that they share its connections. """
+    with _clients_lock:
+        if url not in _clients:
+            _clients[url] = TorchserveClient(url)
+        return _clients[url]
@@ -2,17 +2,25 @@
 # This source code is licensed under the MIT license found in the
 # LICENSE file in the root directory of this source tree.
 
-from PIL import Image, ImageOps
 import numpy as np
 import numpy.typing as npt
-import cv2
 from pathlib import Path
 import logging
-from pkg_resources import resource_filename
+try:
+    from importlib.resources import files as resource_files  # python >= 3.9
+except ImportError:
+    resource_files = None
 
 TOLERANCE = 10**-5
 
 
+def resolve_package_path(file_name: str) -> Path:
+    """ Given a path relative to the animated_drawings package directory, returns its location on disk. """
+    if resource_files is not None:
+        return Path(str(resource_files('animated_drawings').joinpath(file_name)))
+    return Path(__file__).parent.joinpath(file_name)
+
+
 def resolve_ad_filepath(file_name: str, file_type: str) -> Path:
     """
     Given input filename, attempts to find the file, first by relative to cwd,
@@ -23,10 +31,10 @@ def resolve_ad_filepath(file_name: str, file_type: str) -> Path:
         return Path(file_name)
     elif Path.joinpath(Path.cwd(), file_name).exists():
         return Path.joinpath(Path.cwd(), file_name)
-    elif Path(resource_filename(__name__, file_name)).exists():
-        return Path(resource_filename(__name__, file_name))
-    elif Path(resource_filename(__name__, str(Path('..', file_name)))):
-        return Path(resource_filename(__name__, str(Path('..', file_name))))
+    elif resolve_package_path(file_name).exists():
+        return resolve_package_path(file_name)
+    elif resolve_package_path(str(Path('..', file_name))):
+        return resolve_package_path(str(Path('..', file_name)))
 
     msg = f'Could not find the {file_type} specified: {file_name}'
     logging.critical(msg)
@@ -37,6 +45,9 @@ def read_background_image(file_name: str) -> npt.NDArray[np.uint8]:
     """
     Given path to input image file, opens it, flips it based on EXIF tags, if present, and returns image with proper orientation.
     """
+    from PIL import Image, ImageOps
+    import cv2
+
     # Check the file path
     file_path = resolve_ad_filepath(file_name, 'background_image')
 
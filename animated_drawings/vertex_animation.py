@@ -0,0 +1,166 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Compact, bandwidth-friendly encoding of per-frame 2D vertex positions, for web playback of exported meshes.
+
+Positions are encoded as follows:
+    1. Each axis is quantized to 16 bits within the clip's bounding box.
+    2. If the clip repeats itself (e.g. a walk cycle played several times), only the first cycle is kept.
+    3. Frames are split into chunks. The first frame of each chunk is stored as is, the rest as deltas from the previous frame,
+       so each chunk can be decoded on its own.
+    4. Vertices of the same body part move together, so each vertex's value is stored as a delta from the previous vertex's value.
+    5. Deltas are zigzag encoded, so small negative and positive deltas both become small unsigned values,
+       and split into a plane of low bytes and a plane of high bytes, which are mostly zero.
+    6. Each chunk is compressed with zlib.
+
+All values are little-endian. The layout is:
+    magic                          4 bytes, b'ADVA'
+    version                        uint8
+    frame_count                    uint32, number of frames in the clip
+    loop_frames                    uint32, number of frames stored. Frame i of the clip is stored frame i % loop_frames
+    vertex_count                   uint32
+    chunk_frames                   uint32, number of stored frames per chunk. The last chunk may have fewer
+    frame_time                     float32, seconds per frame
+    bbox_min, bbox_max             2 x float32 each, bounding box of the positions
+    chunk_count                    uint32
+    chunk_sizes                    chunk_count x uint32, compressed size of each chunk, in bytes
+    chunks                         zlib-compressed [low bytes, high bytes] planes of each chunk's [2, frames, vertex_count] uint16 values
+"""
+
+from __future__ import annotations
+import logging
+import struct
+import zlib
+from typing import List, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+VERTEX_ANIMATION_MAGIC = b'ADVA'
+VERTEX_ANIMATION_VERSION = 1
+
+DEFAULT_CHUNK_FRAMES = 32
+DEFAULT_LOOP_TOLERANCE = 2  # in quantization steps
+
+_HEADER = struct.Struct('<4sBIIIIf2f2fI')
+_QUANTIZATION_STEPS = 65535
+
+
+def _find_loop_frames(quantized: npt.NDArray[np.int32], tolerance: int) -> int:
+    """
+    Returns the length of the shortest cycle that the frames repeat, to within tolerance. If they don't repeat, the number of frames.
+    Every frame is compared with its frame of the first cycle, which is the one stored, so errors can't accumulate from cycle to cycle.
+    """
+    frame_count = len(quantized)
+    for period in range(2, frame_count):
+        # cheap check of a single frame before comparing the whole clip
+        if np.abs(quantized[period] - quantized[0]).max() > tolerance:
+            continue
+        if np.abs(quantized - quantized[np.arange(frame_count) % period]).max() <= tolerance:
+            return period
+    return frame_count
+
+
+def encode_vertex_animation(positions: npt.NDArray[np.float32],
+                            frame_time: float,
+                            chunk_frames: int = DEFAULT_CHUNK_FRAMES,
+                            loop_tolerance: int = DEFAULT_LOOP_TOLERANCE
+                            ) -> bytes:
+    """
+    Encodes positions, an [frames, vertices, 2] array of xy vertex positions, as described in the module docstring.
+    Decoded positions are within half a quantization step, 1/65535th of the bounding box, of the originals.
+    If the clip repeats to within loop_tolerance quantization steps, only its first cycle is stored,
+    and decoded positions are then within loop_tolerance + 0.5 quantization steps of the originals. Use 0 to only detect exact repeats.
+    """
+    if positions.ndim != 3 or positions.shape[2] != 2 or positions.shape[0] == 0:
+        msg = f'positions must be a non-empty [frames, vertices, 2] array. Found shape {positions.shape}'
+        logging.critical(msg)
+        assert False, msg
+    if chunk_frames < 1:
+        msg = f'chunk_frames must be > 0: {chunk_frames}'
+        logging.critical(msg)
+        assert False, msg
+
+    frame_count, vertex_count, _ = positions.shape
+
+    # quantize within the bounding box
+    bbox_min: npt.NDArray[np.float32] = positions.min(axis=(0, 1)).astype(np.float32)
+    bbox_max: npt.NDArray[np.float32] = positions.max(axis=(0, 1)).astype(np.float32)
+    scale = np.where(bbox_max > bbox_min, bbox_max - bbox_min, 1.0).astype(np.float64)
+    quantized = np.round((positions - bbox_min) / scale * _QUANTIZATION_STEPS).astype(np.int32)
+
+    # only store one cycle of looping clips
+    loop_frames = _find_loop_frames(quantized, loop_tolerance)
+    quantized = quantized[:loop_frames]
+
+    chunks: List[bytes] = []
+    for chunk_start in range(0, loop_frames, chunk_frames):
+        chunk = quantized[chunk_start:chunk_start + chunk_frames]
+
+        # first frame stored as is, then deltas from the previous frame, then from the previous vertex, wrapped to 16 bits
+        deltas = np.diff(chunk, axis=0, prepend=np.zeros_like(chunk[:1]))
+        deltas = np.diff(deltas, axis=1, prepend=np.zeros_like(deltas[:, :1])).transpose([2, 0, 1]).astype(np.int16)
+
+        # zigzag: 0, -1, 1, -2, 2, ... become 0, 1, 2, 3, 4, ...
+        zigzag = ((deltas.astype(np.int32) << 1) ^ (deltas.astype(np.int32) >> 15)).astype(np.uint16)
+
+        planes = np.stack([zigzag & 0xFF, zigzag >> 8]).astype(np.uint8)
+        chunks.append(zlib.compress(planes.tobytes(), 9))
+
+    header = _HEADER.pack(VERTEX_ANIMATION_MAGIC, VERTEX_ANIMATION_VERSION, frame_count, loop_frames, vertex_count, chunk_frames,
+                          frame_time, *bbox_min, *bbox_max, len(chunks))
+    chunk_sizes = np.array([len(c) for c in chunks], dtype='<u4').tobytes()
+    return b''.join([header, chunk_sizes, *chunks])
+
+
+class VertexAnimation():
+    """ Decoder for vertex positions encoded by encode_vertex_animation(). Chunks can be decoded individually, e.g. while streaming. """
+
+    def __init__(self, data: bytes) -> None:
+        if len(data) < _HEADER.size:
+            msg = 'Vertex animation data is too short'
+            logging.critical(msg)
+            assert False, msg
+
+        magic, version, frame_count, loop_frames, vertex_count, chunk_frames, frame_time, min_x, min_y, max_x, max_y, chunk_count = _HEADER.unpack_from(data)
+        if magic != VERTEX_ANIMATION_MAGIC or version != VERTEX_ANIMATION_VERSION:
+            msg = f'Unsupported vertex animation data: magic {magic!r}, version {version}'
+            logging.critical(msg)
+            assert False, msg
+
+        self.frame_count: int = frame_count
+        self.loop_frames: int = loop_frames
+        self.vertex_count: int = vertex_count
+        self.chunk_frames: int = chunk_frames
+        self.frame_time: float = frame_time
+        self.bbox_min: npt.NDArray[np.float32] = np.array([min_x, min_y], dtype=np.float32)
+        self.bbox_max: npt.NDArray[np.float32] = np.array([max_x, max_y], dtype=np.float32)
+
+        chunk_sizes = np.frombuffer(data, dtype='<u4', count=chunk_count, offset=_HEADER.size)
+        chunk_ends = _HEADER.size + chunk_sizes.nbytes + np.cumsum(chunk_sizes)
+        self._chunk_spans: List[Tuple[int, int]] = [(int(end - size), int(end)) for size, end in zip(chunk_sizes, chunk_ends)]
+        self._data: bytes = data
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self._chunk_spans)
+
+    def decode_chunk(self, chunk_idx: int) -> npt.NDArray[np.float32]:
+        """ Returns the positions of the stored frames within the chunk, as a [frames, vertex_count, 2] array. """
+        start, end = self._chunk_spans[chunk_idx]
+        frames = min(self.chunk_frames, self.loop_frames - chunk_idx * self.chunk_frames)
+
+        planes = np.frombuffer(zlib.decompress(self._data[start:end]), dtype=np.uint8).reshape([2, 2, frames, self.vertex_count])
+        zigzag = planes[0].astype(np.int32) | (planes[1].astype(np.int32) << 8)
+        deltas = ((zigzag >> 1) ^ -(zigzag & 1)).transpose([1, 2, 0])
+        quantized = np.cumsum(np.cumsum(deltas, axis=1), axis=0) & 0xFFFF
+
+        scale = np.where(self.bbox_max > self.bbox_min, self.bbox_max - self.bbox_min, 1.0)
+        return (quantized / _QUANTIZATION_STEPS * scale + self.bbox_min).astype(np.float32)
+
+    def decode(self) -> npt.NDArray[np.float32]:
+        """ Returns the positions of every frame of the clip, as a [frame_count, vertex_count, 2] array. """
+        cycle = np.concatenate([self.decode_chunk(idx) for idx in range(self.chunk_count)])
+        return cycle[np.arange(self.frame_count) % self.loop_frames]
@@ -0,0 +1,62 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Reuse of OpenGL buffers and textures between scenes drawn with the same, long-lived, context.
+Drawables get buffer and texture names from gen_buffer() and gen_texture() rather than from OpenGL directly.
+If a view has made a GLResourcePool current, names released by earlier scenes are handed out again. Otherwise, new names are generated.
+Vertex array objects are not reused, as they retain the attribute state of their previous drawable.
+"""
+
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Optional
+from OpenGL import GL
+
+if TYPE_CHECKING:
+    from animated_drawings.model.transform import Transform
+
+
+class GLResourcePool():
+    """ The buffers and textures released by scenes drawn with one OpenGL context. Only valid while that context is current. """
+
+    def __init__(self) -> None:
+        self.buffers: List[int] = []
+        self.textures: List[int] = []
+
+    def release(self, scene: Transform) -> None:
+        """ Releases the OpenGL resources of every drawable within scene. Drawables recreate them if drawn again. """
+        if getattr(scene, '_is_opengl_initialized', False):
+            GL.glDeleteVertexArrays(1, [scene.vao])  # pyright: ignore[reportGeneralTypeIssues]
+            for name in ['vbo', 'ebo']:
+                if hasattr(scene, name):
+                    self.buffers.append(getattr(scene, name))
+            if hasattr(scene, 'txtr_id'):
+                self.textures.append(scene.txtr_id)  # pyright: ignore[reportGeneralTypeIssues]
+            scene._is_opengl_initialized = False  # pyright: ignore[reportGeneralTypeIssues]
+
+        for child in scene.get_children():
+            self.release(child)
+
+
+_current_pool: Optional[GLResourcePool] = None
+
+
+def set_current_pool(pool: Optional[GLResourcePool]) -> None:
+    """ Called by views when making their context current. """
+    global _current_pool
+    _current_pool = pool
+
+
+def gen_buffer() -> int:
+    """ Returns the name of a buffer object, reusing a released one if possible. """
+    if _current_pool is not None and _current_pool.buffers:
+        return _current_pool.buffers.pop()
+    return GL.glGenBuffers(1)
+
+
+def gen_texture() -> int:
+    """ Returns the name of a texture object, reusing a released one if possible. """
+    if _current_pool is not None and _current_pool.textures:
+        return _current_pool.textures.pop()
+    return GL.glGenTextures(1)
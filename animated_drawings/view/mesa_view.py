@@ -12,24 +12,31 @@ from animated_drawings.model.scene import Scene
 from animated_drawings.model.transform import Transform
 from animated_drawings.view.view import View
 from animated_drawings.view.utils import get_projection_matrix
-from animated_drawings.utils import read_background_image
+from animated_drawings.utils import read_background_image, resolve_package_path
 from animated_drawings.view.shaders.shader import Shader
+from animated_drawings.view.gl_resources import GLResourcePool, set_current_pool
 from animated_drawings.config import ViewConfig
 
 import logging
-from typing import Tuple, Dict
+from typing import List, Tuple, Dict
 import numpy as np
 import numpy.typing as npt
-from pathlib import Path
-from pkg_resources import resource_filename
 
 
 class MesaView(View):
-    """ Mesa View for Headless Rendering """
+    """
+    Mesa View for Headless Rendering.
+    If persistent, the context outlives the render: cleanup() only releases the OpenGL resources of the scenes rendered,
+    so the view can be reset() and used for another scene. destroy() destroys the context.
+    """
 
-    def __init__(self, cfg: ViewConfig) -> None:
+    def __init__(self, cfg: ViewConfig, persistent: bool = False) -> None:
         super().__init__(cfg)
 
+        self.persistent: bool = persistent
+        self.rendered_scenes: List[Transform] = []  # scenes whose resources are released by cleanup(), if persistent
+        self.gl_resources: GLResourcePool = GLResourcePool()
+
         self.camera: Camera = Camera(self.cfg.camera_pos, self.cfg.camera_fwd)
 
         self.ctx: osmesa.OSMesaContext
@@ -40,10 +47,34 @@ class MesaView(View):
         self.shader_ids: Dict[str, int] = {}
         self._prep_shaders()
 
+        # background image textures, by filepath, so they're only uploaded once per context
+        self.background_images: Dict[str, Tuple[int, int, int, int]] = {}  # txtr_id, fboId, txtr_w, txtr_h
         self._prep_background_image()
 
         self._set_shader_projections(get_projection_matrix(*self.get_framebuffer_size()))
 
+    def make_current(self) -> None:
+        """ Makes this view's context current, so that it's used by subsequent OpenGL calls. """
+        width, height = self.get_framebuffer_size()
+        osmesa.OSMesaMakeCurrent(self.ctx, self.buffer, GL.GL_UNSIGNED_BYTE, width, height)
+        set_current_pool(self.gl_resources)
+
+    def reset(self, cfg: ViewConfig) -> None:
+        """
+        Prepares the view to render a new scene with cfg, keeping its context, shaders, and background textures.
+        cfg must have the same window dimensions as the view.
+        """
+        if tuple(cfg.window_dimensions) != tuple(self.cfg.window_dimensions):
+            msg = f'Cannot reset view with window dimensions {self.cfg.window_dimensions} to {cfg.window_dimensions}'
+            logging.critical(msg)
+            assert False, msg
+
+        self.make_current()
+        self.cfg = cfg
+        self.camera = Camera(self.cfg.camera_pos, self.cfg.camera_fwd)
+        GL.glClearColor(*self.cfg.clear_color)
+        self._prep_background_image()
+
     def _prep_background_image(self) -> None:
         """ Initialize framebuffer object for background image, if specified. """
 
@@ -51,6 +82,11 @@ class MesaView(View):
         if not self.cfg.background_image:
             return
 
+        # if already uploaded to this context, reuse it
+        if self.cfg.background_image in self.background_images:
+            self.txtr_id, self.fboId, self.txtr_w, self.txtr_h = self.background_images[self.cfg.background_image]
+            return
+
         _txtr = read_background_image(self.cfg.background_image)
 
         self.txtr_h, self.txtr_w, _ = _txtr.shape
@@ -65,17 +101,19 @@ class MesaView(View):
         GL.glBindFramebuffer(GL.GL_READ_FRAMEBUFFER, self.fboId)
         GL.glFramebufferTexture2D(GL.GL_READ_FRAMEBUFFER, GL.GL_COLOR_ATTACHMENT0, GL.GL_TEXTURE_2D, self.txtr_id, 0)
 
+        self.background_images[self.cfg.background_image] = (self.txtr_id, self.fboId, self.txtr_w, self.txtr_h)
+
     def _prep_shaders(self) -> None:
-        BVH_VERT = Path(resource_filename(__name__, "shaders/bvh.vert"))
-        BVH_FRAG = Path(resource_filename(__name__, "shaders/bvh.frag"))
+        BVH_VERT = resolve_package_path("view/shaders/bvh.vert")
+        BVH_FRAG = resolve_package_path("view/shaders/bvh.frag")
         self._initiatize_shader('bvh_shader', str(BVH_VERT), str(BVH_FRAG))
 
-        COLOR_VERT = Path(resource_filename(__name__, "shaders/color.vert"))
-        COLOR_FRAG = Path(resource_filename(__name__, "shaders/color.frag"))
+        COLOR_VERT = resolve_package_path("view/shaders/color.vert")
+        COLOR_FRAG = resolve_package_path("view/shaders/color.frag")
         self._initiatize_shader('color_shader', str(COLOR_VERT), str(COLOR_FRAG))
 
-        TEXTURE_VERT = Path(resource_filename(__name__, "shaders/texture.vert"))
-        TEXTURE_FRAG = Path(resource_filename(__name__, "shaders/texture.frag"))
+        TEXTURE_VERT = resolve_package_path("view/shaders/texture.vert")
+        TEXTURE_FRAG = resolve_package_path("view/shaders/texture.frag")
         self._initiatize_shader('texture_shader', str(TEXTURE_VERT), str(TEXTURE_FRAG), texture=True)
 
     def _update_shaders_view_transform(self, camera: Camera) -> None:
@@ -112,6 +150,7 @@ class MesaView(View):
         self.ctx = osmesa.OSMesaCreateContext(osmesa.OSMESA_RGBA, None)
         self.buffer: npt.NDArray[np.uint8] = GL.arrays.GLubyteArray.zeros((height, width, 4))  # type: ignore
         osmesa.OSMesaMakeCurrent(self.ctx, self.buffer, GL.GL_UNSIGNED_BYTE, width, height)
+        set_current_pool(self.gl_resources)
 
         GL.glClearColor(*self.cfg.clear_color)
 
@@ -132,6 +171,9 @@ class MesaView(View):
 
         scene.draw(shader_ids=self.shader_ids, viewer_cfg=self.cfg)
 
+        if self.persistent and not any(s is scene for s in self.rendered_scenes):
+            self.rendered_scenes.append(scene)
+
     def get_framebuffer_size(self) -> Tuple[int, int]:
         """ Return (width, height) of view's window. """
         return self.buffer.shape[:2][::-1]
@@ -140,5 +182,17 @@ class MesaView(View):
         GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)  # type: ignore
 
     def cleanup(self) -> None:
-        """ Destroy the context when it is finished. """
+        """ Destroy the context when it is finished. If persistent, only release the resources of the rendered scenes, for reuse. """
+        if not self.persistent:
+            self.destroy()
+            return
+
+        self.make_current()
+        for scene in self.rendered_scenes:
+            self.gl_resources.release(scene)
+        self.rendered_scenes.clear()
+
+    def destroy(self) -> None:
+        """ Destroy the context. """
+        set_current_pool(None)
         osmesa.OSMesaDestroyContext(self.ctx)
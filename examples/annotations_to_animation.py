@@ -6,7 +6,6 @@ import animated_drawings.render
 import logging
 from pathlib import Path
 import sys
-import yaml
 from pkg_resources import resource_filename
 
 
@@ -31,13 +30,8 @@ def annotations_to_animation(char_anno_dir: str, motion_cfg_fn: str, retarget_cf
             'OUTPUT_VIDEO_PATH': str(Path(char_anno_dir, 'video.gif').resolve())}  # set the output location
     }
 
-    # write the new mvc config file out
-    output_mvc_cfn_fn = str(Path(char_anno_dir, 'mvc_cfg.yaml'))
-    with open(output_mvc_cfn_fn, 'w') as f:
-        yaml.dump(dict(mvc_cfg), f)
-
     # render the video
-    animated_drawings.render.start(output_mvc_cfn_fn)
+    animated_drawings.render.start(mvc_cfg)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,54 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+import animated_drawings.render
+import logging
+from pathlib import Path
+import sys
+from pkg_resources import resource_filename
+
+# the retarget config matching each bundled motion's BVH skeleton
+MOTION_RETARGETS = {
+    'dab': 'fair1_ppf',
+    'jumping': 'fair1_ppf',
+    'wave_hello': 'fair1_ppf',
+    'zombie': 'fair1_ppf',
+    'jumping_jacks': 'cmu1_pfp',
+    'jesse_dance': 'mixamo_fff',
+}
+
+
+def render_motions(char_anno_dir: str, motions: list, video_format: str = 'gif'):
+    """
+    Given a path to a directory with character annotations and a list of motion names, each optionally followed by ':' and a retarget name,
+    renders the character with each of the bundled motions, building the character only once.
+    Saves each animation to {char_anno_dir}/{motion}.{video_format}
+    """
+    motion_retarget_cfg_fns = []
+    for motion in motions:
+        motion, _, retarget = motion.partition(':')
+        motion_retarget_cfg_fns.append((
+            resource_filename(__name__, f'config/motion/{motion}.yaml'),
+            resource_filename(__name__, f'config/retarget/{retarget or MOTION_RETARGETS.get(motion, "fair1_ppf")}.yaml'),
+        ))
+
+    videos = animated_drawings.render.render_motions(
+        str(Path(char_anno_dir, 'char_cfg.yaml').resolve()),
+        motion_retarget_cfg_fns,
+        controller={'OUTPUT_VIDEO_PATH': f'video.{video_format}'})  # only its extension is used, to choose the format
+
+    for motion, video in zip(motions, videos):
+        Path(char_anno_dir, f'{motion.partition(":")[0]}.{video_format}').write_bytes(video)
+
+
+if __name__ == '__main__':
+
+    log_dir = Path('./logs')
+    log_dir.mkdir(exist_ok=True, parents=True)
+    logging.basicConfig(filename=f'{log_dir}/log.txt', level=logging.DEBUG)
+
+    char_anno_dir = sys.argv[1]
+    motions = sys.argv[2:] if len(sys.argv) > 2 else list(MOTION_RETARGETS)
+
+    render_motions(char_anno_dir, motions)
@@ -14,7 +14,6 @@ setup(
         'numpy==1.24.4',
         'scipy==1.10.0',
         'scikit-image==0.19.3',
-        'scikit-learn==1.1.2',
         'shapely==1.8.5.post1',
         'opencv-python==4.6.0.66',
         'Pillow==10.1.0',
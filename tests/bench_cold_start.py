@@ -0,0 +1,57 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Measures the cold start of a render process: wall time from importing animated_drawings.render to the first rendered frame.
+Must be run in a fresh interpreter, as it measures import time. Requires OSMesa. Run with:
+    python -m tests.bench_cold_start [mvc_cfg_fn]
+Prints a JSON dictionary mapping each startup stage to the cumulative number of seconds elapsed when it completed.
+"""
+
+import time
+_start_time = time.perf_counter()
+
+import json
+import sys
+
+DEFAULT_MVC_CFG_FN = 'tests/test_render_files/mvc_render_gif.yaml'
+
+
+def main(mvc_cfg_fn: str) -> None:
+    timings = {}
+
+    def _mark(stage: str) -> None:
+        timings[stage] = round(time.perf_counter() - _start_time, 4)
+
+    import animated_drawings.render  # noqa: F401
+    _mark('import')
+
+    from animated_drawings.config import Config
+    cfg = Config(mvc_cfg_fn)
+    cfg.view.use_mesa = True
+    _mark('config')
+
+    # the view must be created before the scene, as it selects the OpenGL platform
+    from animated_drawings.view.view import View
+    view = View.create_view(cfg.view)
+    _mark('view')
+
+    from animated_drawings.model.scene import Scene
+    scene = Scene(cfg.scene)
+    _mark('scene')
+
+    from OpenGL import GL
+    scene.update_transforms()
+    view.clear_window()
+    view.render(scene)
+    GL.glFinish()
+    _mark('first_frame')
+
+    view.cleanup()
+
+    print(json.dumps(timings))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_MVC_CFG_FN)
@@ -0,0 +1,38 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Micro-benchmarks comparing per-quaternion and batched conversions. Not collected by pytest. Run with:
+    python -m tests.bench_quaternions
+"""
+
+from animated_drawings.model.quaternions import Quaternions
+from animated_drawings.model.vectors import Vectors
+import numpy as np
+import timeit
+
+
+def main(joint_num: int = 64, repeat: int = 200) -> None:
+    rng = np.random.default_rng(0)
+    qs = rng.normal(size=[joint_num, 4])
+    qs /= np.linalg.norm(qs, axis=-1, keepdims=True)
+    ms = Quaternions(qs).to_rotation_matrices()
+
+    benchmarks = {
+        'to_rotation_matrix (per quaternion)': lambda: [Quaternions(q).to_rotation_matrix() for q in qs],
+        'to_rotation_matrices (batched)': lambda: Quaternions.from_array_unchecked(qs).to_rotation_matrices(),
+        'from_rotation_matrix (per matrix)': lambda: [Quaternions.from_rotation_matrix(m) for m in ms],
+        'from_rotation_matrices (batched)': lambda: Quaternions.from_rotation_matrices(ms),
+        'Vectors (checked)': lambda: [Vectors(q[:3]) for q in qs],
+        'Vectors (unchecked)': lambda: [Vectors.from_array_unchecked(q[np.newaxis, :3]) for q in qs],
+    }
+
+    print(f'{joint_num} quaternions, best of {repeat} runs')
+    for name, fn in benchmarks.items():
+        best = min(timeit.repeat(fn, number=1, repeat=repeat))
+        print(f'{name:40s} {best * 1e6:10.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -25,3 +25,247 @@ def test_init():
     AnimatedDrawing(char_cfg, retarget_cfg, motion_cfg)
 
     assert True
+
+
+def test_rig_fk_matches_joint_transforms():
+    from animated_drawings.model.animated_drawing import AnimatedDrawingRig
+    import numpy as np
+
+    mvc_cfg_fn = resource_filename(__name__, 'test_animated_drawing_files/test_mvc.yaml')
+    char_cfg, _, _ = Config(mvc_cfg_fn).scene.animated_characters[0]
+    rig = AnimatedDrawingRig(char_cfg)
+
+    # rest pose positions must match the joint locations
+    rest_positions = np.array(rig.root_joint.get_chain_worldspace_positions()).reshape([-1, 3])[:, :2]
+    assert np.allclose(rig.get_joints_2D_positions(), rest_positions, atol=1e-6)
+
+    rig.root_joint.set_position(np.array([0.3, 0.2, -0.5]))
+    rig.set_global_orientations({'torso': 10.0, 'neck': 45.0, 'left_elbow': 200.0, 'left_hand': 95.0, 'right_knee': 170.0, 'right_foot': 185.0})
+
+    fk_positions = rig.get_joints_2D_positions()
+    rig._sync_joint_transforms()
+    transform_positions = np.array(rig.root_joint.get_chain_worldspace_positions()).reshape([-1, 3])[:, :2]
+    assert np.allclose(fk_positions, transform_positions, atol=1e-5)
+
+
+def test_retargeters_share_preprocessed_motion():
+    from animated_drawings.model.retargeter import Retargeter
+    import numpy as np
+
+    mvc_cfg_fn = resource_filename(__name__, 'test_animated_drawing_files/test_mvc.yaml')
+    _, retarget_cfg1, motion_cfg1 = Config(mvc_cfg_fn).scene.animated_characters[0]
+    _, retarget_cfg2, motion_cfg2 = Config(mvc_cfg_fn).scene.animated_characters[0]
+
+    r1 = Retargeter(motion_cfg1, retarget_cfg1)
+    r2 = Retargeter(motion_cfg2, retarget_cfg2)
+
+    # motion data is shared and read-only; per-character data is not
+    assert r1.motion is r2.motion
+    assert r1.bvh_joint_to_projection_depth is r2.bvh_joint_to_projection_depth
+    assert not r1.joint_positions.flags.writeable
+    assert r1.char_joint_to_orientation is not r2.char_joint_to_orientation
+
+    r1.scale_root_positions_for_character(1.0, 'Lower Limbs')
+    r2.scale_root_positions_for_character(2.0, 'Lower Limbs')
+    assert np.allclose(2.0 * r1.char_root_positions, r2.char_root_positions, atol=1e-4)
+
+
+def test_motion_registry_keeps_most_recently_used(monkeypatch):
+    from animated_drawings.model import motion_registry
+
+    mvc_cfg_fn = resource_filename(__name__, 'test_animated_drawing_files/test_mvc.yaml')
+    _, _, motion_cfg = Config(mvc_cfg_fn).scene.animated_characters[0]
+    motion_cfgs = [motion_cfg.replace(end_frame_idx=end_frame_idx) for end_frame_idx in [10, 20, 30]]
+
+    monkeypatch.setattr(motion_registry, 'MAX_PREPROCESSED_MOTIONS', 2)
+    motion_registry.clear_motion_registry()
+    m0 = motion_registry.get_preprocessed_motion(motion_cfgs[0])
+    motion_registry.get_preprocessed_motion(motion_cfgs[1])
+    assert motion_registry.get_preprocessed_motion(motion_cfgs[0]) is m0  # now the most recently used
+    motion_registry.get_preprocessed_motion(motion_cfgs[2])  # evicts motion_cfgs[1]
+
+    assert len(motion_registry._motion_registry) == 2
+    assert motion_registry.get_preprocessed_motion(motion_cfgs[0]) is m0
+    motion_registry.clear_motion_registry()
+
+
+def test_scenes_visualize_their_own_bvh(monkeypatch):
+    from animated_drawings.model.bvh import BVH
+    from animated_drawings.model.scene import Scene
+    import copy
+
+    monkeypatch.delenv('AD_CHARACTER_CACHE_DIR', raising=False)
+    mvc_cfg_fn = resource_filename(__name__, 'test_animated_drawing_files/test_mvc.yaml')
+    scene_cfg = copy.copy(Config(mvc_cfg_fn).scene)
+    scene_cfg.add_ad_retarget_bvh = True
+
+    scenes = [Scene(scene_cfg), Scene(scene_cfg)]
+    bvhs = [[c for c in scene.get_children() if isinstance(c, BVH)] for scene in scenes]
+    assert [len(each) for each in bvhs] == [1, 1]
+    (bvh0,), (bvh1,) = bvhs
+    assert bvh0 is not bvh1 and bvh0.get_parent() is scenes[0] and bvh1.get_parent() is scenes[1]
+
+    # the motion's own bvh is left untouched by the scenes animating their copies
+    ad = scenes[0].get_children()[0]
+    assert isinstance(ad, AnimatedDrawing)
+    assert ad.retargeter.motion._bvh not in (bvh0, bvh1) and ad.retargeter.motion._bvh.get_parent() is None
+    scenes[0].progress_time(0.5)
+    assert bvh0.get_time() != bvh1.get_time()
+
+
+def test_retargeter_bytes_round_trip():
+    from animated_drawings.model.retargeter import Retargeter
+    import numpy as np
+
+    mvc_cfg_fn = resource_filename(__name__, 'test_animated_drawing_files/test_mvc.yaml')
+    _, retarget_cfg, motion_cfg = Config(mvc_cfg_fn).scene.animated_characters[0]
+
+    r1 = Retargeter(motion_cfg, retarget_cfg)
+    r1.scale_root_positions_for_character(1.5, 'Lower Limbs')
+    for char_joint_name, (bvh_prox_joint_name, bvh_dist_joint_name) in retarget_cfg.char_joint_bvh_joints_mapping.items():
+        r1.compute_orientations(bvh_prox_joint_name, bvh_dist_joint_name, char_joint_name)
+
+    r2 = Retargeter.from_bytes(motion_cfg, retarget_cfg, r1.to_bytes())
+    assert r2._motion is None  # motion data is not loaded unless needed
+
+    for t in [0.0, 0.5, 100.0]:
+        o1, d1, p1 = r1.get_retargeted_frame_data(t)
+        o2, d2, p2 = r2.get_retargeted_frame_data(t)
+        assert o1.keys() == o2.keys() and d1.keys() == d2.keys()
+        assert all(np.isclose(o1[k], o2[k]) for k in o1)
+        assert all(np.isclose(d1[k], d2[k]) for k in d1)
+        assert np.allclose(p1, p2)
+
+
+def test_smallest_variance_axis():
+    from animated_drawings.model.motion_registry import get_smallest_variance_axis
+    import numpy as np
+
+    # points scattered within a plane tilted away from the y-z plane; its normal is the smallest variance axis
+    rng = np.random.default_rng(0)
+    normal = np.array([1.0, 0.2, -0.1]) / np.linalg.norm([1.0, 0.2, -0.1])
+    in_plane = np.linalg.svd(normal[np.newaxis])[2][1:]
+    points = rng.normal(size=[200, 2]) @ in_plane * 5.0 + normal * rng.normal(scale=0.01, size=[200, 1]) + 3.0
+
+    assert np.isclose(abs(np.dot(get_smallest_variance_axis(points.astype(np.float32)), normal)), 1.0, atol=1e-4)
+
+
+def test_precomputed_frames_match_computed_frames():
+    from animated_drawings.model.animated_drawing import _CharacterPickler, _CharacterUnpickler
+    from animated_drawings.model.scene import Scene
+    from animated_drawings.model.transform_store import TransformStore
+    import io
+    import numpy as np
+
+    # a character within a flattened scene, as rendered
+    mvc_cfg_fn = resource_filename(__name__, 'test_animated_drawing_files/test_mvc.yaml')
+    scene = Scene(Config(mvc_cfg_fn).scene)
+    TransformStore(scene)
+    ad = scene.get_children()[0]
+    assert isinstance(ad, AnimatedDrawing)
+
+    # the character is sent to the processes without the scene, and the ARAP solver without its setup matrices
+    buf = io.BytesIO()
+    _CharacterPickler(buf, ad).dump(ad)
+    pickled_ad = _CharacterUnpickler(io.BytesIO(buf.getvalue())).load()
+    assert pickled_ad.get_parent() is None and pickled_ad._store is None and not hasattr(pickled_ad.arap, 'A1')
+
+    ad.precompute_frames(processes=2)
+
+    frame_idxs = [0, 1, ad.retargeter.frame_max_num // 2, ad.retargeter.frame_max_num - 1]
+    precomputed = []
+    for frame_idx in frame_idxs:
+        ad.set_time(frame_idx * ad.retargeter.frame_time)
+        ad.update()
+        precomputed.append((ad.vertices[:, :3].copy(), ad.indices.copy()))
+
+    ad._precomputed_vertices = ad._precomputed_indices = None
+    for frame_idx, (vertices, indices) in zip(frame_idxs, precomputed):
+        ad.set_time(frame_idx * ad.retargeter.frame_time)
+        ad.update()
+        assert np.allclose(ad.vertices[:, :3], vertices, atol=1e-5)
+        assert np.array_equal(ad.indices, indices)
+
+
+def test_in_memory_character_matches_files():
+    import cv2
+    import yaml
+    import numpy as np
+
+    char_dir = resource_filename(__name__, '../examples/characters/char2')
+    with open(f'{char_dir}/char_cfg.yaml', 'r') as f:
+        char_cfg_d = yaml.load(f, Loader=yaml.FullLoader)
+    char_cfg_d['texture'] = cv2.cvtColor(cv2.imread(f'{char_dir}/texture.png', cv2.IMREAD_UNCHANGED), cv2.COLOR_BGRA2RGBA)
+    char_cfg_d['mask'] = cv2.imread(f'{char_dir}/mask.png', cv2.IMREAD_GRAYSCALE)
+
+    mvc_cfg_fn = resource_filename(__name__, 'test_animated_drawing_files/test_mvc.yaml')
+    file_char_cfg, retarget_cfg, motion_cfg = Config(mvc_cfg_fn).scene.animated_characters[0]
+    mvc_cfg = {'scene': {'ANIMATED_CHARACTERS': [{
+        'character_cfg': char_cfg_d,
+        'motion_cfg': motion_cfg,
+        'retarget_cfg': 'examples/config/retarget/cmu1_pfp.yaml',
+    }]}}
+    char_cfg, _, in_memory_motion_cfg = Config(mvc_cfg).scene.animated_characters[0]
+    assert in_memory_motion_cfg is motion_cfg
+    assert char_cfg.txtr_p is None and char_cfg.skeleton == file_char_cfg.skeleton
+
+    # configs are immutable, so one retarget config can drive both characters
+    ad = AnimatedDrawing(char_cfg, retarget_cfg, motion_cfg)
+    file_ad = AnimatedDrawing(file_char_cfg, retarget_cfg, motion_cfg)
+    assert np.array_equal(ad.txtr, file_ad.txtr)
+    assert np.array_equal(ad.mask, file_ad.mask)
+    assert np.array_equal(ad.vertices[:, [0, 1, 2, 6, 7]], file_ad.vertices[:, [0, 1, 2, 6, 7]])  # positions and uvs
+    orientations, _, root_position = ad.retargeter.get_frame_data(10)
+    file_orientations, _, file_root_position = file_ad.retargeter.get_frame_data(10)
+    assert orientations == file_orientations
+    assert np.array_equal(root_position, file_root_position)
+
+
+def test_compiled_character_cache(tmp_path, monkeypatch):
+    import numpy as np
+
+    monkeypatch.setenv('AD_CHARACTER_CACHE_DIR', str(tmp_path))
+    mvc_cfg_fn = resource_filename(__name__, 'test_animated_drawing_files/test_mvc.yaml')
+    char_cfg, retarget_cfg, motion_cfg = Config(mvc_cfg_fn).scene.animated_characters[0]
+
+    compiled_ad = AnimatedDrawing(char_cfg, retarget_cfg, motion_cfg)
+    assert len(list(tmp_path.glob('*/*'))) == 1
+    cached_ad = AnimatedDrawing(char_cfg, retarget_cfg, motion_cfg)
+
+    assert list(cached_ad.joint_to_tri_v_idx.keys()) == list(compiled_ad.joint_to_tri_v_idx.keys())
+    for joint_name, tri_v_idxs in compiled_ad.joint_to_tri_v_idx.items():
+        assert np.array_equal(cached_ad.joint_to_tri_v_idx[joint_name], tri_v_idxs)
+
+    for ad in [compiled_ad, cached_ad]:
+        ad.set_time(10 * ad.retargeter.frame_time)
+        ad.update()
+    assert np.array_equal(cached_ad.vertices[:, [0, 1, 2, 6, 7]], compiled_ad.vertices[:, [0, 1, 2, 6, 7]])  # positions and uvs
+    assert np.array_equal(cached_ad.indices, compiled_ad.indices)
+
+
+def test_scene_shares_compiled_character_between_motions(monkeypatch):
+    from animated_drawings.config import MotionConfig, RetargetConfig
+    from animated_drawings.model.scene import Scene
+    from animated_drawings.render import get_video_render_cfg
+    import numpy as np
+
+    monkeypatch.delenv('AD_CHARACTER_CACHE_DIR', raising=False)
+    mvc_cfg_fn = resource_filename(__name__, 'test_animated_drawing_files/test_mvc.yaml')
+    char_cfg, _, _ = Config(mvc_cfg_fn).scene.animated_characters[0]
+    motion_cfg = MotionConfig.from_file('examples/config/motion/dab.yaml')
+    retarget_cfg = RetargetConfig.from_file('examples/config/retarget/fair1_ppf.yaml')
+
+    first_scene = Scene(Config(mvc_cfg_fn).scene)
+    scene_cfg = get_video_render_cfg({'ANIMATED_CHARACTERS': [{'character_cfg': char_cfg, 'motion_cfg': motion_cfg, 'retarget_cfg': retarget_cfg}]}).scene
+    scene = Scene(scene_cfg, compiled_from=first_scene)
+    first_ad, ad = first_scene.get_children()[0], scene.get_children()[0]
+    assert isinstance(first_ad, AnimatedDrawing) and isinstance(ad, AnimatedDrawing)
+    assert ad.arap is first_ad.arap and ad.mesh is first_ad.mesh and ad.txtr is first_ad.txtr
+
+    # the shared character is posed just as a newly compiled one
+    compiled_ad = AnimatedDrawing(char_cfg, retarget_cfg, motion_cfg)
+    for each in [compiled_ad, ad]:
+        each.set_time(10 * each.retargeter.frame_time)
+        each.update()
+    assert np.array_equal(ad.vertices[:, [0, 1, 2, 6, 7]], compiled_ad.vertices[:, [0, 1, 2, 6, 7]])  # positions and uvs
+    assert np.array_equal(ad.indices, compiled_ad.indices)
@@ -0,0 +1,143 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from animated_drawings.annotation import annotate_images
+from animated_drawings.torchserve_client import TorchserveClient
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import numpy as np
+import pytest
+
+
+class _FakeTorchserveHandler(BaseHTTPRequestHandler):
+    """ Responds to predictions like the torchserve models do. The first request is rejected, as by a busy server. """
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        with server.lock:
+            server.requests.append((self.path, body))
+            reject = len(server.requests) == 1
+        if reject:
+            result, status = {'code': 503}, 503
+        elif self.path == '/predictions/drawn_humanoid_detector':
+            result, status = [{'bbox': [10, 20, 110, 180], 'score': 0.9}], 200
+        else:
+            result, status = [{'keypoints': [[50 + idx, 80 + idx, 1.0] for idx in range(17)]}], 200
+        data = json.dumps(result).encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_torchserve():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeTorchserveHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_annotate_images_with_client(fake_torchserve, tmp_path, monkeypatch):
+    monkeypatch.setenv('AD_PIPELINE_CACHE_DIR', str(tmp_path))
+    client = TorchserveClient(f'http://127.0.0.1:{fake_torchserve.server_address[1]}', retries=2, pool_size=4)
+
+    imgs = []
+    for idx in range(3):
+        img = np.full([200, 150, 3], 255, np.uint8)
+        img[60:140, 40 + idx:90 + idx] = 0
+        imgs.append(img)
+
+    annotations = annotate_images(imgs, client=client)
+    assert len(annotations) == 3
+    for annotation in annotations:
+        assert annotation['bounding_box'] == {'left': 10, 'top': 20, 'right': 110, 'bottom': 180}
+        assert annotation['texture'].shape == (160, 100, 4)
+        assert annotation['mask'].shape == (160, 100) and annotation['mask'].max() == 255
+        assert annotation['char_cfg']['skeleton'][0]['name'] == 'root'
+
+    # the rejected request was retried, and images were sent as JPEGs
+    paths = [path for path, _ in fake_torchserve.requests]
+    assert paths.count('/predictions/drawn_humanoid_detector') + paths.count('/predictions/drawn_humanoid_pose_estimator') == 7
+    assert all(b'\xff\xd8' in body for _, body in fake_torchserve.requests)
+
+    # the second time, everything comes from the pipeline cache
+    annotate_images(imgs, client=client)
+    assert len(fake_torchserve.requests) == 7
+
+
+def test_images_to_annotations_skips_failed_images(fake_torchserve, tmp_path, monkeypatch):
+    from animated_drawings.annotation import images_to_annotations
+    import cv2
+
+    monkeypatch.delenv('AD_PIPELINE_CACHE_DIR', raising=False)
+    client = TorchserveClient(f'http://127.0.0.1:{fake_torchserve.server_address[1]}', retries=2, pool_size=4)
+
+    img = np.full([200, 150, 3], 255, np.uint8)
+    img[60:140, 40:90] = 0
+    cv2.imwrite(str(tmp_path / 'good.png'), img)
+    cv2.imwrite(str(tmp_path / 'tiny.png'), img[:15, :15])  # entirely outside the detected bounding box
+    (tmp_path / 'broken.png').write_bytes(b'not an image')
+
+    img_fns = [str(tmp_path / fn) for fn in ['tiny.png', 'broken.png', 'good.png']]
+    out_dirs = [str(tmp_path / f'out_{idx}') for idx in range(len(img_fns))]
+    failed_fns = images_to_annotations(img_fns, out_dirs, client=client)
+
+    assert failed_fns == img_fns[:2]
+    assert (tmp_path / 'out_2' / 'char_cfg.yaml').exists()
+    with pytest.raises(Exception):
+        annotate_images([img, img[:15, :15]], client=client)
+
+
+def test_segmentation_overlaps_pose_estimation(fake_torchserve, monkeypatch):
+    from animated_drawings import annotation
+    import time
+
+    monkeypatch.delenv('AD_PIPELINE_CACHE_DIR', raising=False)
+    client = TorchserveClient(f'http://127.0.0.1:{fake_torchserve.server_address[1]}', retries=2)
+    segment = annotation.segment
+
+    imgs = []
+    for idx in range(3):
+        img = np.full([200, 150, 3], 255, np.uint8)
+        img[60:140, 40 + idx:90] = 0
+        imgs.append(img)
+
+    def segment_after_pose_requests(img):
+        # every character's pose estimator request is sent before the first segmentation finishes, rather than after the previous one
+        for _ in range(100):
+            if sum(path == '/predictions/drawn_humanoid_pose_estimator' for path, _ in fake_torchserve.requests) == len(imgs):
+                return segment(img)
+            time.sleep(0.05)
+        assert False, 'pose estimator requests were not sent while segmenting'
+
+    monkeypatch.setattr(annotation, 'segment', segment_after_pose_requests)
+    assert [a['mask'].shape for a in annotation.annotate_images(imgs, client=client)] == [(160, 100)] * len(imgs)
+
+
+def test_segment_keeps_largest_component_with_holes_filled():
+    from animated_drawings.annotation import segment
+    import cv2
+
+    img = np.full([300, 400, 3], 255, np.uint8)
+    cv2.circle(img, (120, 150), 80, (0, 0, 0), 6)  # the character's outline: its inside is a hole to fill
+    cv2.circle(img, (330, 60), 20, (0, 0, 0), -1)  # a smaller smudge, to discard
+    mask = segment(img)
+
+    assert mask.shape == (300, 400) and mask.dtype == np.uint8
+    assert mask[150, 120] == 255 and mask[150, 200] == 255
+    assert mask[60, 330] == 0 and mask[150, 300] == 0
+    assert set(np.unique(mask)) == {0, 255}
+
+    with pytest.raises(AssertionError):
+        segment(np.full([100, 100, 3], 255, np.uint8))
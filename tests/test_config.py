@@ -0,0 +1,52 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from animated_drawings.config import Config, RetargetConfig, MotionConfig, MAX_PARSED_CFGS, _parse_cfg_file
+from dataclasses import FrozenInstanceError
+from pkg_resources import resource_filename
+import pickle
+import shutil
+import os
+import pytest
+
+
+def test_configs_are_immutable():
+    _, retarget_cfg, motion_cfg = Config(resource_filename(__name__, 'test_animated_drawing_files/test_mvc.yaml')).scene.animated_characters[0]
+
+    with pytest.raises(FrozenInstanceError):
+        motion_cfg.scale = 2.0
+    with pytest.raises(TypeError):
+        del retarget_cfg.char_joint_bvh_joints_mapping['left_elbow']
+    with pytest.raises(AttributeError):
+        retarget_cfg.char_bvh_root_offset['char_joints'][0].pop(0)
+
+    modified_cfg = retarget_cfg.replace(char_joint_bvh_joints_mapping={})
+    assert modified_cfg.char_joint_bvh_joints_mapping == {}
+    assert 'left_elbow' in retarget_cfg.char_joint_bvh_joints_mapping
+
+    # must survive the trip to render worker processes
+    unpickled_cfg = pickle.loads(pickle.dumps(retarget_cfg))
+    assert unpickled_cfg.char_joint_bvh_joints_mapping == retarget_cfg.char_joint_bvh_joints_mapping
+    with pytest.raises(TypeError):
+        unpickled_cfg.char_joint_bvh_joints_mapping['left_elbow'] = ('a', 'b')
+
+
+def test_parsed_configs_are_cached(tmp_path):
+    retarget_cfg_fn = str(tmp_path / 'retarget.yaml')
+    shutil.copy(resource_filename(__name__, '../examples/config/retarget/cmu1_pfp.yaml'), retarget_cfg_fn)
+
+    retarget_cfg = RetargetConfig.from_file(retarget_cfg_fn)
+    assert RetargetConfig.from_file(retarget_cfg_fn) is retarget_cfg
+
+    # modified files are parsed again
+    stat = os.stat(retarget_cfg_fn)
+    os.utime(retarget_cfg_fn, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert RetargetConfig.from_file(retarget_cfg_fn) is not retarget_cfg
+
+    # configs of different types are cached separately
+    motion_cfg_fn = resource_filename(__name__, '../examples/config/motion/jumping_jacks.yaml')
+    assert isinstance(MotionConfig.from_file(motion_cfg_fn), MotionConfig)
+
+    # only the most recently used files are kept
+    assert _parse_cfg_file.cache_info().maxsize == MAX_PARSED_CFGS
@@ -0,0 +1,88 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from animated_drawings.content_store import ContentStore
+import os
+import time
+
+
+def test_put_get(tmp_path):
+    store = ContentStore(tmp_path, max_bytes=1024)
+    key = ContentStore.key('a', b'b')
+
+    assert store.get(key) is None
+    store.put(key, b'data')
+    assert key in store
+    assert store.get(key) == b'data'
+
+    # part boundaries are part of the key
+    assert ContentStore.key('ab') != ContentStore.key('a', 'b')
+
+
+def test_evicts_least_recently_used(tmp_path):
+    store = ContentStore(tmp_path, max_bytes=250)
+    keys = [ContentStore.key(str(idx)) for idx in range(3)]
+
+    now = time.time()
+    for idx, key in enumerate(keys[:2]):
+        store.put(key, bytes(100))
+        os.utime(store._get_path(key), (now - 100 + idx, now - 100 + idx))
+
+    # reading the oldest marks it as recently used, so the other is evicted instead
+    assert store.get(keys[0]) is not None
+    store.put(keys[2], bytes(100))
+
+    assert keys[0] in store
+    assert keys[1] not in store
+    assert keys[2] in store
+
+
+def test_only_scans_when_over_limit(tmp_path, monkeypatch):
+    from animated_drawings.content_store import get_content_store_from_env
+
+    store = ContentStore(tmp_path, max_bytes=250)
+    scans = []
+    scan = store._scan
+    monkeypatch.setattr(store, '_scan', lambda: scans.append(1) or scan())
+
+    # the size of the store is found once, then kept up to date as blobs are written
+    for idx in range(2):
+        store.put(ContentStore.key(str(idx)), bytes(100))
+    store.put(ContentStore.key('0'), bytes(100))  # replaces a blob of the same size
+    assert len(scans) == 1 and store._total_bytes == 200
+
+    # a write over the limit scans to evict
+    store.put(ContentStore.key('2'), bytes(100))
+    assert len(scans) == 2 and store._total_bytes == 200
+
+    # stores from the environment are shared, so each is only scanned once per process
+    monkeypatch.setenv('AD_TEST_CACHE_DIR', str(tmp_path))
+    assert get_content_store_from_env('TEST_CACHE', 250) is get_content_store_from_env('TEST_CACHE', 250)
+
+
+def test_pipeline_cache_stage_key_and_cached(tmp_path, monkeypatch):
+    from animated_drawings.pipeline_cache import cached, get_pipeline_cache, get_stage_key
+    import numpy as np
+
+    monkeypatch.delenv('AD_PIPELINE_CACHE_DIR', raising=False)
+    assert get_pipeline_cache() is None
+    monkeypatch.setenv('AD_PIPELINE_CACHE_DIR', str(tmp_path))
+    cache = get_pipeline_cache()
+
+    # arrays with the same bytes but different shapes are different inputs
+    img = np.zeros([4, 6, 3], np.uint8)
+    assert get_stage_key('segment', img) == get_stage_key('segment', img.copy())
+    assert get_stage_key('segment', img) != get_stage_key('segment', img.reshape([6, 4, 3]))
+    assert get_stage_key('segment', img) != get_stage_key('detect', img)
+
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return b'mask'
+
+    key = get_stage_key('segment', img)
+    assert cached(cache, key, compute) == b'mask'
+    assert cached(cache, key, compute) == b'mask'
+    assert len(calls) == 1
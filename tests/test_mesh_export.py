@@ -0,0 +1,65 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from animated_drawings.config import Config
+from animated_drawings.model.scene import Scene
+from animated_drawings.model.animated_drawing import AnimatedDrawing
+from animated_drawings.controller.controller import Controller
+from animated_drawings.mesh_export import load_mesh_archive
+from pkg_resources import resource_filename
+import numpy as np
+
+
+def test_mesh_export(tmp_path):
+    cfg = Config(resource_filename(__name__, 'test_animated_drawing_files/test_mvc.yaml'))
+    cfg.controller.mode = 'mesh_export'
+    cfg.controller.mesh_export_path = str(tmp_path / 'mesh.npz')
+    cfg.controller.render_workers = 2
+
+    scene = Scene(cfg.scene)
+    Controller.create_controller(cfg.controller, scene, None).run()
+
+    ad = scene.get_children()[0]
+    assert isinstance(ad, AnimatedDrawing)
+    char, = load_mesh_archive(tmp_path / 'mesh.npz')
+
+    frame_num = ad.retargeter.frame_max_num
+    vertex_num = len(ad.vertices)
+    assert char['positions'].shape == (frame_num, vertex_num, 2)
+    assert char['depths'].shape == (frame_num,)
+    assert char['uvs'].shape == (vertex_num, 2)
+    assert char['draw_orders'].shape[0] == frame_num
+    assert char['segment_offsets'][-1] == len(char['triangles'])
+
+    # drawing each frame's segments in order must reproduce what the renderer would draw
+    triangles, offsets = char['triangles'], char['segment_offsets']
+    for frame_idx in [0, frame_num // 2, frame_num - 1]:
+        ad._precomputed_vertices = ad._precomputed_indices = None
+        ad.set_time(frame_idx * ad.retargeter.frame_time)
+        ad.update()
+
+        assert np.allclose(char['positions'][frame_idx], ad.vertices[:, :2], atol=1e-5)
+        assert np.isclose(char['depths'][frame_idx], ad.vertices[0, 2])
+
+        indices = np.concatenate([triangles[offsets[s]:offsets[s + 1]].reshape(-1) for s in char['draw_orders'][frame_idx]])
+        assert np.array_equal(indices, ad.indices)
+
+
+def test_mesh_export_quantized(tmp_path):
+    cfg = Config(resource_filename(__name__, 'test_animated_drawing_files/test_mvc.yaml'))
+    cfg.controller.mode = 'mesh_export'
+    cfg.controller.mesh_export_path = str(tmp_path / 'mesh.npz')
+    cfg.controller.mesh_export_format = 'quantized'
+    cfg.controller.render_workers = 1
+
+    scene = Scene(cfg.scene)
+    Controller.create_controller(cfg.controller, scene, None).run()
+
+    ad = scene.get_children()[0]
+    assert isinstance(ad, AnimatedDrawing)
+    char, = load_mesh_archive(tmp_path / 'mesh.npz')
+
+    vertices, _, _ = ad.get_precomputed_frames()
+    assert char['positions'].shape == (ad.retargeter.frame_max_num, len(ad.vertices), 2)
+    assert np.allclose(char['positions'], vertices[:, :, :2], atol=1e-2)
@@ -0,0 +1,66 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from animated_drawings import profiling
+import pytest
+
+
+def test_span_is_noop_without_recorders():
+    assert not profiling.is_enabled()
+    assert profiling.span('a') is profiling.span('b')  # the shared null span
+    with profiling.span('a'):
+        pass
+
+
+def test_stage_timer_stats():
+    timer = profiling.StageTimer()
+    profiling.add_recorder(timer)
+    try:
+        for _ in range(10):
+            with profiling.span('stage/outer'):
+                with profiling.span('stage/inner'):
+                    pass
+        with profiling.span('other'):
+            pass
+    finally:
+        profiling.remove_recorder(timer)
+
+    assert not profiling.is_enabled()
+
+    stats = timer.get_all_stats('stage/')
+    assert set(stats.keys()) == {'outer', 'inner'}
+    assert stats['outer']['count'] == 10
+    assert 0 <= stats['inner']['p50_ms'] <= stats['inner']['p90_ms'] <= stats['inner']['p99_ms'] <= stats['inner']['max_ms']
+    assert stats['inner']['total_ms'] <= stats['outer']['total_ms']
+    assert timer.get_stats('missing') == {'count': 0}
+
+
+def test_chrome_tracer(tmp_path):
+    import json
+    import threading
+
+    tracer = profiling.ChromeTracer()
+    profiling.add_recorder(tracer)
+    try:
+        with profiling.span('outer'):
+            with profiling.span('inner'):
+                pass
+            thread = threading.Thread(target=lambda: profiling.span('background').__enter__().__exit__())
+            thread.start()
+            thread.join()
+    finally:
+        profiling.remove_recorder(tracer)
+    tracer.save(tmp_path / 'trace.json')
+
+    events = {e['name']: e for e in json.loads((tmp_path / 'trace.json').read_text())['traceEvents'] if e['ph'] == 'X'}
+    assert set(events.keys()) == {'outer', 'inner', 'background'}
+
+    outer, inner = events['outer'], events['inner']
+    assert outer['ts'] <= inner['ts'] and inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+    assert events['background']['tid'] != outer['tid']
+
+
+def test_recorder_is_abstract():
+    with pytest.raises(TypeError):
+        profiling.Recorder()  # type: ignore
@@ -65,3 +65,26 @@ def test_to_euler_angles():
 def test_multiply():
     # TODO add test coverage for quaternion multiplication
     pass
+
+
+def test_batched_rotation_matrices_match_single():
+    angles = np.array([[0.3], [1.2], [-2.5], [3.0]])
+    axes = Vectors(np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 1.0], [1.0, -2.0, 0.5], [0.0, 0.0, -1.0]]))
+    qs = Quaternions.from_angle_axis(angles, axes)
+
+    ms = qs.to_rotation_matrices()
+    assert ms.shape == (4, 4, 4)
+    for idx in range(4):
+        assert np.allclose(ms[idx], Quaternions(qs.qs[idx]).to_rotation_matrix())
+
+    # every branch of Mike Day's method should round trip, up to quaternion sign
+    q2s = Quaternions.from_rotation_matrices(ms)
+    assert q2s.qs.shape == (4, 4)
+    assert np.allclose(np.abs(np.sum(qs.qs * q2s.qs, axis=-1)), 1.0)
+
+
+def test_from_array_unchecked():
+    qs = np.array([[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0]])
+    q = Quaternions.from_array_unchecked(qs)
+    assert q.qs is qs
+    assert np.allclose(q.to_rotation_matrices()[1], np.diag([1.0, -1.0, -1.0, 1.0]))
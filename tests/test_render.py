@@ -30,3 +30,195 @@ def test_render_mp4():
     assert os.path.getsize('.tests/test_render_files/video.mp4') > 100
 
     os.remove('.tests/test_render_files/video.mp4')
+
+
+@pytest.mark.skipif(os.environ.get('IS_CI_RUNNER') == 'True', reason='skipping video rendering for CI/CD')
+def test_render_motions():
+    char_cfg_fn = resource_filename(__name__, 'test_render_files/char1/char_cfg.yaml')
+    motions = [
+        (resource_filename(__name__, 'test_render_files/zombie.yaml'), resource_filename(__name__, 'test_render_files/human_zombie.yaml')),
+        ('examples/config/motion/dab.yaml', 'examples/config/retarget/fair1_ppf.yaml'),
+    ]
+
+    videos = render.render_motions(char_cfg_fn, motions, controller={'OUTPUT_VIDEO_PATH': 'video.gif'})
+
+    assert len(videos) == 2
+    assert all(video[:6] == b'GIF89a' for video in videos)
+    assert videos[0] != videos[1]
+
+
+def test_pickled_scene_seek_matches_progress_time():
+    """ Render workers seek unpickled copies of the scene, so their frames must match those of the serially progressed scene. """
+    import pickle
+    import numpy as np
+    from animated_drawings.config import Config
+    from animated_drawings.model.scene import Scene
+    from animated_drawings.model.animated_drawing import AnimatedDrawing
+
+    cfg = Config(resource_filename(__name__, 'test_render_files/mvc_render_gif.yaml'))
+    cfg.scene.use_transform_store = True
+    scene = Scene(cfg.scene)
+    ad = scene.get_children()[0]
+    assert isinstance(ad, AnimatedDrawing)
+    delta_t = ad.retargeter.frame_time
+
+    scene_copy = pickle.loads(pickle.dumps(scene))
+    ad_copy = scene_copy.get_children()[0]
+    assert isinstance(ad_copy, AnimatedDrawing)
+
+    for _ in range(7):
+        scene.progress_time(delta_t)
+    scene.update_transforms()
+
+    scene_copy.seek(7 * delta_t)
+    scene_copy.update_transforms()
+
+    assert np.allclose(ad.vertices[:, :3], ad_copy.vertices[:, :3])
+    assert np.allclose(ad.rig.root_joint.get_world_transform(), ad_copy.rig.root_joint.get_world_transform())
+    assert np.allclose(ad.get_world_transform(), ad_copy.get_world_transform())
+
+    # seeking is random access, so the result does not depend upon previously seeked frames
+    scene_copy.seek(40 * delta_t)
+    scene_copy.seek(7 * delta_t)
+    scene_copy.update_transforms()
+    assert np.allclose(ad.vertices[:, :3], ad_copy.vertices[:, :3])
+
+
+@pytest.mark.skipif(os.environ.get('IS_CI_RUNNER') == 'True', reason='skipping video rendering for CI/CD')
+def test_benchmark(tmp_path):
+    import json
+    from animated_drawings import profiling
+    from animated_drawings.config import Config
+    from animated_drawings.view.view import View
+    from animated_drawings.model.scene import Scene
+    from animated_drawings.controller.controller import Controller
+
+    cfg = Config(resource_filename(__name__, 'test_render_files/mvc_render_gif.yaml'))
+    cfg.controller.mode = 'benchmark'
+    cfg.controller.benchmark_frames = 5
+    cfg.controller.benchmark_iterations = 2
+    cfg.controller.benchmark_output_path = str(tmp_path / 'benchmark.json')
+
+    view = View.create_view(cfg.view)
+    stage_timer = profiling.StageTimer()
+    profiling.add_recorder(stage_timer)
+    try:
+        scene = Scene(cfg.scene)
+        Controller.create_controller(cfg.controller, scene, view, stage_timer=stage_timer).run()
+    finally:
+        profiling.remove_recorder(stage_timer)
+
+    results = json.loads((tmp_path / 'benchmark.json').read_text())
+    assert results['frames_rendered'] == 10
+    assert results['stages']['frame']['count'] == 10
+    for stage in ['retarget_lookup', 'rig_fk', 'arap_solve', 'draw_order', 'buffer_upload', 'draw_calls', 'readback', 'encode']:
+        assert results['stages'][stage]['count'] > 0
+    for stage in ['mask_texture_load', 'mesh', 'joint_to_triangles_bfs', 'arap']:
+        assert results['character_init'][stage]['count'] == 1
+    assert not os.path.exists('.tests/test_render_files/video.gif')
+
+
+@pytest.mark.skipif(os.environ.get('IS_CI_RUNNER') == 'True', reason='skipping video rendering for CI/CD')
+def test_benchmarks_do_not_share_stage_timers(tmp_path):
+    import json
+    from animated_drawings import profiling
+    from animated_drawings.config import Config
+
+    cfg = Config(resource_filename(__name__, 'test_render_files/mvc_render_gif.yaml'))
+    cfg.controller.mode = 'benchmark'
+    cfg.controller.benchmark_frames = 2
+    cfg.controller.benchmark_iterations = 1
+    cfg.controller.benchmark_output_path = str(tmp_path / 'benchmark.json')
+
+    for _ in range(2):
+        render._run(cfg)
+        assert not profiling.is_enabled()
+
+        results = json.loads((tmp_path / 'benchmark.json').read_text())
+        assert results['character_init']['arap']['count'] == 1
+        assert results['stages']['frame']['count'] == 2
+
+
+def test_render_workers_stopped_when_rendering_fails(monkeypatch):
+    from concurrent.futures import ProcessPoolExecutor
+    import tempfile
+    from animated_drawings.config import Config
+    from animated_drawings.controller.controller import Controller
+    from animated_drawings.controller.video_render_controller import VideoRenderController
+
+    cfg = Config(resource_filename(__name__, 'test_render_files/mvc_render_gif.yaml'))
+    assert cfg.controller.render_workers == 1  # a single process unless more are asked for
+
+    def fail(self):
+        raise RuntimeError('render failed')
+    monkeypatch.setattr(Controller, 'run', fail)
+
+    executor = ProcessPoolExecutor(max_workers=1)
+    controller = VideoRenderController.__new__(VideoRenderController)
+    controller.shard_executor = executor
+    controller.shard_dir = tempfile.TemporaryDirectory()
+    controller.shards = [(1, 2, executor.submit(os.getpid))]
+    shard_dir_name = controller.shard_dir.name
+
+    with pytest.raises(RuntimeError):
+        controller.run()
+
+    assert controller.shard_executor is None and controller.shard_dir is None
+    assert not os.path.exists(shard_dir_name)
+    with pytest.raises(RuntimeError):
+        executor.submit(os.getpid)  # already shut down
+
+
+@pytest.mark.skipif(os.environ.get('IS_CI_RUNNER') == 'True', reason='skipping video rendering for CI/CD')
+def test_render_frames():
+    import numpy as np
+    from animated_drawings.config import Config
+    from animated_drawings.view.view import View
+    from animated_drawings.model.scene import Scene
+
+    cfg = Config(resource_filename(__name__, 'test_render_files/mvc_render_gif.yaml'))
+    view = View.create_view(cfg.view)
+    scene = Scene(cfg.scene)
+
+    frames = render.render_frames(scene, view, [5, 0, 5])
+
+    width, height = view.get_framebuffer_size()
+    assert frames.shape == (3, height, width, 4)
+    assert np.array_equal(frames[0], frames[2])
+    assert not np.array_equal(frames[0], frames[1])
+    view.cleanup()
+
+
+@pytest.mark.skipif(os.environ.get('IS_CI_RUNNER') == 'True', reason='skipping video rendering for CI/CD')
+def test_render_to_bytes():
+    scene = {'ANIMATED_CHARACTERS': [{
+        'character_cfg': 'tests/test_render_files/char1/char_cfg.yaml',
+        'motion_cfg': 'tests/test_render_files/zombie.yaml',
+        'retarget_cfg': 'tests/test_render_files/human_zombie.yaml',
+    }]}
+    gif = render.render_to_bytes(scene, controller={'OUTPUT_VIDEO_PATH': 'video.gif', 'RENDER_WORKERS': 1})
+    assert gif[:6] == b'GIF89a'
+    assert not os.path.exists('video.gif')
+
+
+@pytest.mark.skipif(os.environ.get('IS_CI_RUNNER') == 'True', reason='skipping video rendering for CI/CD')
+def test_render_worker():
+    from animated_drawings.render_worker import RenderWorker
+
+    scene = {'ANIMATED_CHARACTERS': [{
+        'character_cfg': 'tests/test_render_files/char1/char_cfg.yaml',
+        'motion_cfg': 'tests/test_render_files/zombie.yaml',
+        'retarget_cfg': 'tests/test_render_files/human_zombie.yaml',
+    }]}
+    controller = {'OUTPUT_VIDEO_PATH': 'video.gif'}
+
+    worker = RenderWorker()
+    gif1 = worker.render_to_bytes(scene, controller=controller)
+    gif2 = worker.render_to_bytes(scene, controller=controller)
+    gif3 = worker.render_to_bytes(scene, view={'WINDOW_DIMENSIONS': [300, 200]}, controller=controller)
+    worker.cleanup()
+
+    # the reused context must render exactly what a fresh one does
+    assert gif1 == gif2 == render.render_to_bytes(scene, controller={**controller, 'RENDER_WORKERS': 1})
+    assert len(worker.views) == 0 and worker.jobs_rendered == 3
+    assert gif3 != gif1
@@ -0,0 +1,207 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from animated_drawings.service import jobs
+from animated_drawings.service.server import RenderService
+import asyncio
+import json
+import multiprocessing
+import time
+import urllib.error
+import urllib.request
+import pytest
+
+
+def _init_fake_worker(torchserve_url: str) -> None:
+    pass
+
+
+def _annotate_fake_job(spec) -> bytes:
+    return b'character of ' + spec['image']
+
+
+def _annotate_must_not_run(spec) -> bytes:
+    assert False, 'annotation should have been resumed from the store'
+
+
+def _render_fake_job(spec, character) -> bytes:
+    time.sleep(1)
+    return f"{spec.get('character') or character.decode()} {spec['motion']}".encode('utf-8')
+
+
+def test_parse_job_spec():
+    spec = jobs.parse_job_spec('application/json', json.dumps({'character': 'char1', 'motion': 'zombie'}).encode(), {})
+    assert spec == {'character': 'char1', 'motion': 'zombie', 'retarget': jobs.DEFAULT_RETARGET, 'format': jobs.DEFAULT_FORMAT}
+
+    spec = jobs.parse_job_spec('image/png', b'png', {'format': 'mp4'})
+    assert spec['image'] == b'png' and spec['format'] == 'mp4'
+
+    # the default retarget depends upon the motion's skeleton
+    for motion, retarget in [('jesse_dance', 'mixamo_fff'), ('jumping_jacks', 'cmu1_pfp')]:
+        spec = jobs.parse_job_spec('application/json', json.dumps({'character': 'char1', 'motion': motion}).encode(), {})
+        assert spec['retarget'] == retarget
+
+    for content_type, body, query in [
+        ('application/json', json.dumps({'character': 'char1', 'motion': '../../secrets'}).encode(), {}),
+        ('application/json', json.dumps({'character': 'char1', 'motion': 'jesse_dance', 'retarget': 'fair1_ppf'}).encode(), {}),
+        ('image/png', b'png', {'motion': 'zombie', 'retarget': 'cmu1_pfp'}),
+        ('application/json', json.dumps({'character': 'char1', 'image': ''}).encode(), {}),
+        ('application/json', b'not json', {}),
+        ('image/png', b'png', {'format': 'avi'}),
+        ('text/plain', b'png', {}),
+    ]:
+        with pytest.raises(ValueError):
+            jobs.parse_job_spec(content_type, body, query)
+
+
+def _request(port: int, method: str, path: str, body=None, content_type='application/json'):
+    """ Returns status, headers, and body of the response. """
+    headers = {'Content-Type': content_type} if body is not None else {}
+    data = (body if isinstance(body, bytes) else json.dumps(body).encode()) if body is not None else None
+    req = urllib.request.Request(f'http://127.0.0.1:{port}{path}', data, headers, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_service_queues_jobs_with_backpressure():
+
+    async def _test():
+        service = RenderService(workers=1, max_queued_jobs=1, init_fn=_init_fake_worker, render_fn=_render_fake_job)
+        server = await service.start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        loop = asyncio.get_running_loop()
+
+        def request(*args):
+            return loop.run_in_executor(None, _request, port, *args)
+
+        try:
+            # the first job runs, the second waits in the queue, and there is no room for the third
+            responses = []
+            for motion in ['dab', 'zombie', 'jumping']:
+                responses.append(await request('POST', '/jobs', {'character': 'char1', 'motion': motion}))
+                await asyncio.sleep(0.1)  # let the dispatcher take the first job from the queue
+            assert [status for status, _, _ in responses] == [202, 202, 429]
+            assert int(responses[2][1]['Retry-After']) > 0
+
+            status, _, body = await request('POST', '/jobs', {'character': 'char1', 'motion': 'unknown'})
+            assert status == 400 and b'unknown motion' in body
+
+            status, _, body = await request('GET', '/jobs/unknown')
+            assert status == 404
+
+            # the result waits for the job to finish
+            job_id = json.loads(responses[1][2])['job_id']
+            status, headers, body = await request('GET', f'/jobs/{job_id}/result')
+            assert status == 200 and headers['Content-Type'] == 'image/gif'
+            assert body == b'char1 zombie'
+
+            status, _, body = await request('GET', f'/jobs/{job_id}')
+            assert status == 200 and json.loads(body)['status'] == jobs.DONE
+
+            status, _, body = await request('GET', '/ping')
+            assert status == 200 and json.loads(body)['status'] == 'Healthy'
+        finally:
+            await service.stop()
+
+    asyncio.run(_test())
+
+
+def test_job_store_resumes_jobs(tmp_path):
+    from animated_drawings.service.store import JobStore
+
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    job = jobs.Job({'image': b'png', 'motion': 'dab', 'retarget': 'fair1_ppf', 'format': 'gif'})
+    store.add(job)
+    job.status, job.stage = jobs.RUNNING, jobs.ANNOTATED
+    store.update(job, b'character')
+    store.close()
+
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'))
+    unfinished = store.unfinished()
+    assert [j.job_id for j in unfinished] == [job.job_id]
+    assert unfinished[0].spec == job.spec and unfinished[0].stage == jobs.ANNOTATED
+    assert store.get_output(job.job_id, jobs.ANNOTATED) == b'character'
+    assert store.find(jobs.spec_hash(job.spec)).job_id == job.job_id
+
+    # once done, only the rendered output is kept
+    job.status, job.stage = jobs.DONE, jobs.RENDERED
+    store.update(job, b'video')
+    assert store.unfinished() == []
+    assert store.get_output(job.job_id, jobs.ANNOTATED) is None
+    assert store.get_output(job.job_id, jobs.RENDERED) == b'video'
+
+    store.evict_finished(keep=0)
+    assert store.get(job.job_id) is None
+    store.close()
+
+
+def test_service_resumes_interrupted_jobs(tmp_path):
+    db_path = str(tmp_path / 'jobs.sqlite3')
+
+    async def _test():
+        loop = asyncio.get_running_loop()
+
+        # interrupt a job while it renders, after it's been annotated
+        service = RenderService(db_path=db_path, init_fn=_init_fake_worker, annotate_fn=_annotate_fake_job, render_fn=_render_fake_job)
+        server = await service.start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        status, _, body = await loop.run_in_executor(None, _request, port, 'POST', '/jobs?motion=zombie', b'png', 'image/png')
+        assert status == 202
+        job_id = json.loads(body)['job_id']
+        for _ in range(600):
+            if (await service._in_store(service.store.get, job_id)).stage == jobs.ANNOTATED:
+                break
+            await asyncio.sleep(0.05)
+
+        # only the service's own workers are terminated
+        other_process = multiprocessing.get_context('spawn').Process(target=time.sleep, args=(60,))
+        other_process.start()
+        try:
+            await service.stop()
+            other_process.join(1)
+            assert other_process.is_alive()
+        finally:
+            other_process.terminate()
+
+        # the next service resumes it with the stored annotations, and resubmissions return the same job
+        service = RenderService(db_path=db_path, init_fn=_init_fake_worker, annotate_fn=_annotate_must_not_run, render_fn=_render_fake_job)
+        server = await service.start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            status, _, body = await loop.run_in_executor(None, _request, port, 'GET', f'/jobs/{job_id}/result')
+            assert status == 200 and body == b'character of png zombie'
+
+            status, _, body = await loop.run_in_executor(None, _request, port, 'POST', '/jobs?motion=zombie', b'png', 'image/png')
+            assert status == 200 and json.loads(body)['job_id'] == job_id
+        finally:
+            await service.stop()
+
+    asyncio.run(_test())
+
+
+def test_load_generator_with_fake_torchserve(tmp_path, monkeypatch):
+    """ Offline end to end run: submitted images are annotated through the fake torchserve, then the load is reported. """
+    from animated_drawings.service import loadgen
+    from animated_drawings.service.fake_torchserve import detect
+    import cv2
+    import numpy as np
+
+    monkeypatch.delenv('AD_PIPELINE_CACHE_DIR', raising=False)
+    img = np.full([200, 150, 3], 255, np.uint8)
+    img[40:160, 50:100] = 0
+    cv2.imwrite(str(tmp_path / 'drawing.png'), img)
+
+    images = loadgen.make_images(str(tmp_path / 'drawing.png'), 4)
+    assert len(set(images)) == 4
+    # the images differ, but not in the character detected in them
+    assert all(detect(cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)) == detect(img) for image in images)
+
+    report = loadgen.run_local(images, ['dab', 'zombie'], concurrency=2, workers=2, detector_latency=0.05, pose_latency=0.05, skip_render=True)
+    assert report['succeeded'] == 4 and report['failed'] == 0, report
+    assert report['torchserve_requests'] == {'drawn_humanoid_detector': 4, 'drawn_humanoid_pose_estimator': 4}
+    assert 0 < report['latency_seconds']['p50'] <= report['latency_seconds']['p99']
+    assert report['throughput_jobs_per_second'] > 0 and report['peak_rss_mb'] > 0
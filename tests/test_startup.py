@@ -0,0 +1,38 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from pathlib import Path
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+REPO_ROOT = Path(__file__).parent.parent
+
+
+def test_heavy_modules_not_imported():
+    """ Importing the render entry point and model/controller modules should not pull in modules used only by specific code paths. """
+    script = '\n'.join([
+        'import sys',
+        'import animated_drawings.render',
+        'import animated_drawings.model.scene',
+        'import animated_drawings.controller.video_render_controller',
+        'deferred = ["sklearn", "pkg_resources", "cv2", "skimage", "shapely", "PIL", "tqdm", "scipy.spatial", "scipy.sparse"]',
+        'print(",".join(m for m in deferred if m in sys.modules))',
+    ])
+    result = subprocess.run([sys.executable, '-c', script], cwd=str(REPO_ROOT), capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ''
+
+
+@pytest.mark.skipif(os.environ.get('IS_CI_RUNNER') == 'True', reason='skipping video rendering for CI/CD')
+def test_cold_start_to_first_frame():
+    """ Time from importing animated_drawings.render to the first rendered frame, in a fresh process, must be within budget. """
+    budget_s = float(os.environ.get('AD_COLD_START_BUDGET_S', 30.0))
+
+    result = subprocess.run([sys.executable, '-m', 'tests.bench_cold_start'], cwd=str(REPO_ROOT), capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    print(f'cold start timings (s): {timings}')
+
+    assert timings['first_frame'] < budget_s
@@ -3,6 +3,7 @@
 # LICENSE file in the root directory of this source tree.
 
 from animated_drawings.model.transform import Transform
+from animated_drawings.model.transform_store import TransformStore
 from animated_drawings.model.quaternions import Quaternions
 import numpy as np
 
@@ -67,3 +68,52 @@ def test_look_at():
     m[0, 0] = -1.0
     m[2, 2] = -1.0
     assert np.isclose(t._local_transform, m).all()
+
+
+def _build_tree():
+    root = Transform(name='root')
+    a, b, c, d = Transform(name='a'), Transform(name='b'), Transform(name='c'), Transform(name='d')
+    root.add_child(a)
+    a.add_child(b)
+    a.add_child(c)
+    root.add_child(d)
+    for idx, t in enumerate([root, a, b, c, d]):
+        t.set_position(np.array([idx, 1.0, -idx], dtype=np.float32))
+        t.set_rotation(Quaternions.from_euler_angles('yz', np.array([10.0 * idx, -20.0 * idx])))
+    return root, [root, a, b, c, d]
+
+
+def test_transform_store_matches_recursive_update():
+    root1, ts1 = _build_tree()
+    root2, ts2 = _build_tree()
+    TransformStore(root2)
+
+    root1.update_transforms()
+    root2.update_transforms()
+    for t1, t2 in zip(ts1, ts2):
+        assert np.allclose(t1.get_world_transform(), t2.get_world_transform(), atol=1e-6)
+
+    # only a subtree is stale; its world matrices must be updated while the rest are untouched
+    for ts in [ts1, ts2]:
+        ts[1].set_rotation(Quaternions.from_euler_angles('x', np.array([45.0])))
+        ts[4].set_scale(2.0)
+    root1.update_transforms()
+    root2.update_transforms()
+    for t1, t2 in zip(ts1, ts2):
+        assert np.allclose(t1.get_world_transform(), t2.get_world_transform(), atol=1e-6)
+        assert not t2.dirty_bit
+
+
+def test_transform_store_structure_change():
+    root, ts = _build_tree()
+    TransformStore(root)
+
+    assert root.get_transform_by_name('c') is ts[3]
+    assert ts[1].get_transform_by_name('d') is None
+
+    e = Transform(name='e')
+    e.set_position(np.array([0.0, 0.0, 5.0], dtype=np.float32))
+    ts[3].add_child(e)
+
+    assert ts[1].get_transform_by_name('e') is e
+    assert np.allclose(e.get_world_position(), ts[3].get_world_transform()[:-1, :-1] @ np.array([0.0, 0.0, 5.0]) + ts[3].get_world_position(), atol=1e-5)
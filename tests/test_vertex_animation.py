@@ -0,0 +1,63 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# This source code is licensed under the MIT license found in the
+# LICENSE file in the root directory of this source tree.
+
+from animated_drawings.vertex_animation import encode_vertex_animation, VertexAnimation
+import numpy as np
+
+
+def _get_positions(frame_count: int, period: int) -> np.ndarray:
+    """ vertices moving smoothly along circles, repeating every period frames """
+    rng = np.random.default_rng(0)
+    centers = rng.uniform(-50.0, 50.0, size=[300, 2])
+    phases = rng.uniform(0, 2 * np.pi, size=[300])
+    angles = 2 * np.pi * np.arange(frame_count)[:, None] / period + phases
+    return (centers + 10.0 * np.stack([np.cos(angles), np.sin(angles)], axis=-1)).astype(np.float32)
+
+
+def test_round_trip():
+    positions = _get_positions(frame_count=50, period=1000)
+    encoded = encode_vertex_animation(positions, frame_time=1/30, chunk_frames=16)
+
+    anim = VertexAnimation(encoded)
+    assert anim.frame_count == anim.loop_frames == 50
+    assert anim.chunk_count == 4
+    assert np.isclose(anim.frame_time, 1/30)
+
+    decoded = anim.decode()
+    assert decoded.shape == positions.shape
+    step = (positions.max(axis=(0, 1)) - positions.min(axis=(0, 1))) / 65535
+    assert np.all(np.abs(decoded - positions) <= step * 0.5 + 1e-4)
+
+    # much smaller than float32
+    assert len(encoded) < positions.nbytes / 3
+
+    # chunks decode independently of each other
+    assert np.array_equal(anim.decode_chunk(2), decoded[32:48])
+    assert np.array_equal(anim.decode_chunk(3), decoded[48:])
+
+
+def test_loop_detection():
+    cycle = _get_positions(frame_count=20, period=20)
+    positions = np.concatenate([cycle, cycle, cycle, cycle[:5]])
+
+    anim = VertexAnimation(encode_vertex_animation(positions, frame_time=1/30))
+    assert anim.frame_count == 65
+    assert anim.loop_frames == 20
+
+    decoded = anim.decode()
+    assert decoded.shape == positions.shape
+    assert np.allclose(decoded, positions, atol=1e-2)
+
+    # a clip drifting by less than the tolerance per cycle, but more over the whole clip, is stored in full
+    cycle = _get_positions(frame_count=10, period=10)
+    step = (cycle.max(axis=(0, 1)) - cycle.min(axis=(0, 1))) / 65535
+    drifting = np.concatenate([cycle + 1.5 * idx * step for idx in range(20)])
+    anim = VertexAnimation(encode_vertex_animation(drifting, frame_time=1/30))
+    step = (drifting.max(axis=(0, 1)) - drifting.min(axis=(0, 1))) / 65535
+    assert np.all(np.abs(anim.decode() - drifting) <= step * 2.5 + 1e-4)
+
+    # with no tolerance, a single differing vertex prevents loop detection
+    positions[62, 0] += 1.0
+    anim = VertexAnimation(encode_vertex_animation(positions, frame_time=1/30, loop_tolerance=0))
+    assert anim.loop_frames == 65